@@ -1,5 +1,23 @@
 from django.contrib import admin
-from .models import Student, Course, Instructor, Enrollment, Fee, StudentFee, Payment, Schedule, Attendance, SentEmail
+from django.db.models import Count, F, Prefetch, Q
+from .models import ROSTER_PREVIEW_SIZE, AcademicStanding, Announcement, Student, Course, Instructor, Enrollment, Fee, StudentFee, Payment, Schedule, Attendance, AttendanceCourseRollup, SentEmail, OutboxEmail, StoredFile
+from .search import matching
+
+class FullTextSearchMixin:
+    """
+    Answer the changelist search box from the FTS5 indexes in search.py instead of LIKE '%term%'
+    over `search_fields` (which still switches the box on). `search_indexes` maps an index to the
+    field of this admin's model holding the indexed row's id; a row matches if any of them does.
+    """
+    search_indexes = {}
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        condition = Q()
+        for index, field in self.search_indexes.items():
+            condition |= matching(index, search_term, field)
+        return queryset.filter(condition), False
 
 class PaymentInline(admin.TabularInline):
     model = Payment
@@ -24,9 +42,10 @@ class ScheduleInline(admin.TabularInline):
     extra = 1
 
 @admin.register(Student)
-class StudentAdmin(admin.ModelAdmin):
+class StudentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('name', 'faculty', 'major', 'student_id', 'university_email', 'registration_date')
     search_fields = ('name', 'student_id', 'university_email')
+    search_indexes = {'students': 'pk'}
     list_filter = ('faculty', 'major')
     inlines = [EnrollmentInline, PaymentInline, StudentFeeInline]
     ordering = ('name',)
@@ -37,25 +56,39 @@ class StudentAdmin(admin.ModelAdmin):
         super().delete_model(request, obj)
 
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
-    list_display = ('name', 'code', 'credit_hours', 'instructor')
+class CourseAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ('name', 'code', 'faculty', 'credit_hours', 'instructor')
     search_fields = ('name', 'code')
-    list_filter = ('credit_hours',)
+    search_indexes = {'courses': 'pk'}
+    list_filter = ('faculty', 'credit_hours')
     inlines = [FeeInline, ScheduleInline]
     ordering = ('name',)
 
 @admin.register(Instructor)
-class InstructorAdmin(admin.ModelAdmin):
+class InstructorAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('full_name', 'email', 'department', 'enrolled_students')
     search_fields = ('full_name', 'email')
+    search_indexes = {'instructors': 'pk'}
     list_filter = ('department',)
     ordering = ('full_name',)
 
+    def get_queryset(self, request):
+        # Load a short roster preview for every instructor on the page in one query;
+        # enrolled_students() links to the full list when there are more.
+        preview = Enrollment.objects.select_related('student').order_by('student__name', 'pk')[:ROSTER_PREVIEW_SIZE]
+        return super().get_queryset(request).annotate(
+            roster_size=Count('enrollments'),
+        ).prefetch_related(
+            Prefetch('enrollments', queryset=preview, to_attr='roster_preview'),
+        )
+
 @admin.register(Enrollment)
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('get_student_name', 'get_course_name', 'get_instructor_name')
     search_fields = ('student__name', 'course__name', 'instructor__full_name')
+    search_indexes = {'students': 'student_id', 'courses': 'course_id', 'instructors': 'instructor_id'}
     list_filter = ('course', 'instructor')
+    list_select_related = ('student', 'course', 'instructor')
     ordering = ('student__name',)
 
     def delete_model(self, request, obj):
@@ -85,14 +118,91 @@ class FeeAdmin(admin.ModelAdmin):
     list_filter = ('amount',)
     ordering = ('course__name',)
 
+class OutstandingBalanceFilter(admin.SimpleListFilter):
+    title = 'outstanding balance'
+    parameter_name = 'balance'
+    # value -> (exclusive lower bound, inclusive upper bound)
+    ranges = {
+        'settled': (None, 0),
+        '0-500': (0, 500),
+        '500-2000': (500, 2000),
+        '2000+': (2000, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return (
+            ('settled', 'Settled'),
+            ('0-500', 'Up to 500'),
+            ('500-2000', '500 to 2,000'),
+            ('2000+', 'Over 2,000'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.ranges:
+            return queryset
+        low, high = self.ranges[self.value()]
+        if low is not None:
+            queryset = queryset.filter(balance__gt=low)
+        if high is not None:
+            queryset = queryset.filter(balance__lte=high)
+        return queryset
+
 @admin.register(StudentFee)
-class StudentFeeAdmin(admin.ModelAdmin):
+class StudentFeeAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('student', 'total_fee', 'total_paid', 'remaining_balance')
+    list_select_related = ('student',)
     readonly_fields = ('total_fee', 'total_paid', 'remaining_balance')
     search_fields = ('student__name', 'student__student_id', 'student__university_email')
-    list_filter = ('student__faculty', 'student__major')
+    search_indexes = {'students': 'student_id'}
+    list_filter = ('student__faculty', 'student__major', OutstandingBalanceFilter)
     ordering = ('student__name',)
 
+    def get_queryset(self, request):
+        # The ledger columns are stored, so sorting and filtering by balance never sums Fee or Payment rows.
+        return super().get_queryset(request).annotate(balance=F('fee_total') - F('paid_total'))
+
+    def total_fee(self, obj):
+        return obj.fee_total
+    total_fee.short_description = 'Total fee'
+    total_fee.admin_order_field = 'fee_total'
+
+    def total_paid(self, obj):
+        return obj.paid_total
+    total_paid.short_description = 'Total paid'
+    total_paid.admin_order_field = 'paid_total'
+
+    def remaining_balance(self, obj):
+        return obj.remaining_balance
+    remaining_balance.short_description = 'Remaining balance'
+    remaining_balance.admin_order_field = 'balance'
+
+class AcademicStandingFilter(admin.SimpleListFilter):
+    title = 'academic standing'
+    parameter_name = 'standing'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('honour_roll', 'Honour roll'),
+            ('probation', 'Probation'),
+        )
+
+    def queryset(self, request, queryset):
+        # Both lists are a range scan of the gpa index.
+        if self.value() == 'honour_roll':
+            return queryset & AcademicStanding.objects.honour_roll()
+        if self.value() == 'probation':
+            return queryset & AcademicStanding.objects.probation()
+        return queryset
+
+@admin.register(AcademicStanding)
+class AcademicStandingAdmin(admin.ModelAdmin):
+    list_display = ('student', 'gpa', 'credits', 'quality_points')
+    list_select_related = ('student',)
+    readonly_fields = ('student', 'gpa', 'credits', 'quality_points')
+    search_fields = ('student__name', 'student__student_id')
+    list_filter = (AcademicStandingFilter, 'student__faculty')
+    ordering = ('-gpa', 'student__name')
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('student', 'amount', 'date', 'transaction_id')
@@ -117,5 +227,50 @@ class ScheduleAdmin(admin.ModelAdmin):
     list_filter = ('day_of_week',)
     ordering = ('course__name',)
 
-admin.site.register(Attendance)
-admin.site.register(SentEmail)
\ No newline at end of file
+@admin.register(Attendance)
+class AttendanceAdmin(admin.ModelAdmin):
+    list_display = ('student', 'course', 'schedule', 'date', 'status')
+    list_select_related = ('student', 'course', 'schedule__course')
+    list_filter = ('status', 'date')
+    search_fields = ('student__name', 'course__name')
+    ordering = ('-date',)
+
+@admin.register(AttendanceCourseRollup)
+class AttendanceCourseRollupAdmin(admin.ModelAdmin):
+    list_display = ('student', 'course', 'present', 'absent')
+    list_select_related = ('student', 'course')
+    search_fields = ('student__name', 'course__name')
+    readonly_fields = ('student', 'course', 'present', 'absent')
+
+@admin.register(SentEmail)
+class SentEmailAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ('subject', 'recipient_email', 'sent_at')
+    search_fields = ('subject', 'recipient_email')
+    search_indexes = {'messages': 'pk'}
+    ordering = ('-sent_at',)
+
+@admin.register(Announcement)
+class AnnouncementAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ('title', 'instructor', 'created_at', 'deleted_at')
+    list_select_related = ('instructor',)
+    search_fields = ('title',)
+    search_indexes = {'announcements': 'pk'}
+    ordering = ('-created_at',)
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient', 'subject')
+    readonly_fields = ('sent_email', 'attempts', 'last_error', 'sent_at')
+    ordering = ('-created_at',)
+
+@admin.register(StoredFile)
+class StoredFileAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'ref_count', 'created_at')
+    search_fields = ('digest', 'name')
+    readonly_fields = ('name', 'digest', 'size', 'ref_count', 'created_at')
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,185 @@
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, Max, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from .dashboard import invalidate_student_snapshots
+from .models import Attendance, AttendanceCourseRollup, AttendanceSessionRollup
+
+
+#########################################################################################################
+                                        #ATTENDANCE CAPTURE#
+#########################################################################################################
+
+ATTENDANCE_BATCH_SIZE = 500
+# status -> (present delta, absent delta)
+STATUS_DELTAS = {'Present': (1, 0), 'Absent': (0, 1)}
+
+
+def record_attendance(course, schedule, date, statuses):
+    """
+    Save one session's attendance as a batched upsert on (student, schedule, date).
+
+    `statuses` maps student ids to 'Present'/'Absent'. Marking the same session again
+    overwrites the earlier status instead of adding duplicate rows. The rollups are
+    moved by the difference between the earlier and the new marks.
+    """
+    rows = [
+        Attendance(student_id=student_id, course=course, schedule=schedule, date=date, status=status)
+        for student_id, status in statuses.items()
+    ]
+    with transaction.atomic():
+        previous = {
+            student_id: (course_id, status)
+            for student_id, course_id, status in Attendance.objects.select_for_update().filter(
+                schedule=schedule, date=date, student_id__in=list(statuses),
+            ).values_list('student_id', 'course_id', 'status')
+        }
+        Attendance.objects.bulk_create(
+            rows,
+            batch_size=ATTENDANCE_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['student', 'schedule', 'date'],
+            update_fields=['course', 'status'],
+        )
+        changes = []
+        for row in rows:
+            old_course_id, old_status = previous.get(row.student_id, (None, None))
+            if old_status is not None:
+                changes.append((row.student_id, old_course_id, schedule.id, date, old_status, -1))
+            changes.append((row.student_id, course.id, schedule.id, date, row.status, 1))
+        apply_attendance_changes(changes)
+        invalidate_student_snapshots(statuses)
+    return len(rows)
+
+
+#########################################################################################################
+                                        #ATTENDANCE ROLLUPS#
+#########################################################################################################
+
+# AttendanceCourseRollup (per student per course) and AttendanceSessionRollup (per schedule per
+# date) hold present/absent counts so that rate reports never scan the Attendance table. They are
+# moved by deltas as marks are written; rebuild them with `manage.py rebuild_attendance_rollups`.
+
+
+def apply_attendance_changes(changes):
+    """
+    Apply (student_id, course_id, schedule_id, date, status, sign) changes to the rollups, where
+    sign is +1 for a mark that now counts and -1 for one that no longer does.
+    """
+    course_deltas = defaultdict(lambda: [0, 0])
+    session_deltas = defaultdict(lambda: [0, 0])
+    session_courses = {}
+    for student_id, course_id, schedule_id, date, status, sign in changes:
+        present, absent = STATUS_DELTAS.get(status, (0, 0))
+        for deltas, key in ((course_deltas, (course_id, student_id)), (session_deltas, (schedule_id, date))):
+            deltas[key][0] += sign * present
+            deltas[key][1] += sign * absent
+        session_courses.setdefault((schedule_id, date), course_id)
+
+    _bump(AttendanceCourseRollup, ('course_id', 'student_id'), course_deltas, group_field='student_id')
+    _bump(
+        AttendanceSessionRollup, ('schedule_id', 'date'), session_deltas,
+        extra_fields=lambda key: {'course_id': session_courses[key]},
+    )
+
+
+def _bump(model, key_fields, deltas, group_field=None, extra_fields=lambda key: {}):
+    deltas = {key: tuple(delta) for key, delta in deltas.items() if any(delta)}
+    # Only keys that gain marks can be new. Keys that only lose marks already have a row, and
+    # creating one during a cascade delete would point it at a row that is going away.
+    new_keys = [key for key, delta in deltas.items() if min(delta) >= 0]
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key)), **extra_fields(key)) for key in new_keys],
+        batch_size=ATTENDANCE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+    # One UPDATE per distinct delta (and, for the per-student table, per course) keeps a whole
+    # session's worth of marks to a handful of statements.
+    groups = defaultdict(list)
+    for key, delta in deltas.items():
+        fields = dict(zip(key_fields, key))
+        grouped_value = fields.pop(group_field) if group_field else None
+        groups[(tuple(sorted(fields.items())), delta)].append(grouped_value)
+    for (fields, (present, absent)), grouped_values in groups.items():
+        queryset = model.objects.filter(**dict(fields))
+        if group_field:
+            queryset = queryset.filter(**{f'{group_field}__in': grouped_values})
+        queryset.update(present=F('present') + present, absent=F('absent') + absent)
+
+
+def attendance_totals(queryset, *group_by):
+    """present/absent counts of an Attendance queryset grouped by the given fields, from the table itself."""
+    return queryset.values(*group_by).annotate(
+        present=Count('pk', filter=Q(status='Present')),
+        absent=Count('pk', filter=Q(status='Absent')),
+    ).order_by()
+
+
+def rebuild_attendance_rollups():
+    """Recompute both rollup tables from Attendance with two grouped aggregates; returns the row counts."""
+    marks = Attendance.objects.all()
+    course_rows = attendance_totals(marks, 'course_id', 'student_id')
+    session_rows = attendance_totals(marks, 'schedule_id', 'date').annotate(session_course=Max('course_id'))
+    with transaction.atomic():
+        AttendanceCourseRollup.objects.all().delete()
+        AttendanceSessionRollup.objects.all().delete()
+        AttendanceCourseRollup.objects.bulk_create(
+            (AttendanceCourseRollup(**row) for row in course_rows.iterator()),
+            batch_size=ATTENDANCE_BATCH_SIZE,
+        )
+        AttendanceSessionRollup.objects.bulk_create(
+            (
+                AttendanceSessionRollup(
+                    schedule_id=row['schedule_id'], date=row['date'], course_id=row['session_course'],
+                    present=row['present'], absent=row['absent'],
+                )
+                for row in session_rows.iterator()
+            ),
+            batch_size=ATTENDANCE_BATCH_SIZE,
+        )
+        return AttendanceCourseRollup.objects.count(), AttendanceSessionRollup.objects.count()
+
+
+#########################################################################################################
+                                        #ATTENDANCE ANALYTICS#
+#########################################################################################################
+
+def at_risk_threshold():
+    return getattr(settings, 'ATTENDANCE_AT_RISK_RATE', 0.75)
+
+
+def at_risk_min_sessions():
+    return getattr(settings, 'ATTENDANCE_AT_RISK_MIN_SESSIONS', 3)
+
+
+def at_risk_students(courses):
+    """Rollups of students whose attendance rate in one of `courses` is below ATTENDANCE_AT_RISK_RATE, worst first."""
+    threshold = ExpressionWrapper(F('total') * at_risk_threshold(), output_field=FloatField())
+    return AttendanceCourseRollup.objects.filter(course__in=courses).with_rates().filter(
+        total__gte=at_risk_min_sessions(), present__lt=threshold,
+    ).select_related('student', 'course').order_by('rate', 'course__code', 'student__name')
+
+
+def course_attendance_rates(courses):
+    """`courses` annotated with attendance_present, attendance_absent and attendance_rate, summed from the rollups."""
+    present = Coalesce(Sum('attendance_rollups__present'), 0)
+    absent = Coalesce(Sum('attendance_rollups__absent'), 0)
+    return courses.annotate(attendance_present=present, attendance_absent=absent).annotate(
+        attendance_rate=Case(
+            When(attendance_present=0, attendance_absent=0, then=Value(None)),
+            default=ExpressionWrapper(
+                Cast('attendance_present', FloatField()) / (F('attendance_present') + F('attendance_absent')),
+                output_field=FloatField(),
+            ),
+            output_field=FloatField(),
+        ),
+    ).order_by('code')
+
+
+def recent_sessions(courses, limit=10):
+    return list(
+        AttendanceSessionRollup.objects.filter(course__in=courses).with_rates()
+        .select_related('course', 'schedule__course').order_by('-date', 'course__code')[:limit]
+    )
@@ -0,0 +1,84 @@
+from bisect import bisect_right
+from collections import Counter
+from .models import Course, shared_cache
+from .pagination import PAGE_SIZE, decode_cursor, encode_cursor
+from .timetable import course_masks, window_mask
+
+
+#########################################################################################################
+                                        #COURSE CATALOG#
+#########################################################################################################
+
+# The whole catalog is one list of plain dicts sorted by course code, built with its facet counts
+# by one query (plus the cached timetable masks), kept in the shared cache and dropped by
+# signals.py whenever a course, schedule or instructor changes. Filtering, clash marking and cursor paging then run in
+# Python over that list, so browsing the catalog costs no database query at all.
+
+CATALOG_KEY = 'pro:catalog:courses'
+CATALOG_TIMEOUT = 60 * 60
+FACETS = ('faculty', 'department', 'credit_hours')
+
+
+def catalog():
+    """{'courses': [...], 'codes': [...], 'facets': {facet: {value: count}}} for every course."""
+    entry = shared_cache().get(CATALOG_KEY)
+    if entry is None:
+        masks = course_masks()
+        courses = [
+            {
+                'id': course.pk,
+                'code': course.code,
+                'name': course.name,
+                'credit_hours': course.credit_hours,
+                'faculty': course.faculty,
+                'instructor': course.instructor.full_name,
+                'department': course.instructor.department,
+                'mask': masks.get(course.pk, 0),
+            }
+            for course in Course.objects.select_related('instructor').order_by('code')
+        ]
+        entry = {
+            'courses': courses,
+            'codes': [course['code'] for course in courses],
+            'facets': {facet: dict(Counter(course[facet] for course in courses)) for facet in FACETS},
+        }
+        shared_cache().set(CATALOG_KEY, entry, CATALOG_TIMEOUT)
+    return entry
+
+
+def invalidate_catalog():
+    shared_cache().delete(CATALOG_KEY)
+
+
+def catalog_page(filters, cursor=None, busy=0, exclude_ids=(), size=PAGE_SIZE):
+    """
+    Return (courses, next_cursor, facets) for the page of the filtered catalog after `cursor`.
+
+    `filters` may hold 'faculty', 'department' and 'credit_hours' to match exactly, 'fits' to
+    leave out courses that overlap the `busy` bitmap, and 'day', 'start' and 'end' to keep only
+    courses meeting entirely within that free slot of the week. Every course is marked with
+    'clashes'. Raises ValueError for a cursor that was tampered with.
+    """
+    entry = catalog()
+    window = window_mask(filters.get('day'), filters.get('start'), filters.get('end'))
+    start = 0
+    if cursor:
+        code, = decode_cursor(cursor, Course, ['code'])
+        start = bisect_right(entry['codes'], code)
+
+    exclude_ids = set(exclude_ids)
+    page = []
+    for course in entry['courses'][start:]:
+        if course['id'] in exclude_ids:
+            continue
+        if any(filters.get(facet) not in (None, '') and course[facet] != filters[facet] for facet in FACETS):
+            continue
+        if window is not None and (not course['mask'] or course['mask'] & ~window):
+            continue
+        clashes = bool(course['mask'] & busy)
+        if clashes and filters.get('fits'):
+            continue
+        if len(page) == size:
+            return page, encode_cursor([page[-1]['code']]), entry['facets']
+        page.append({**{key: value for key, value in course.items() if key != 'mask'}, 'clashes': clashes})
+    return page, None, entry['facets']
@@ -0,0 +1,134 @@
+import threading
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from .models import Assignment, AssignmentSubmission, AttendanceCourseRollup, Enrollment, Grade, Notification, NotificationCounter, Payment, Schedule, SentEmail, Student, StudentFee, shared_cache
+from .timetable import busy_bitmap
+from .transcripts import academic_standing, transcript_rows
+
+
+#########################################################################################################
+                                        #STUDENT DASHBOARD SNAPSHOTS#
+#########################################################################################################
+
+# Everything student_dashboard renders is built once into a snapshot and kept in the
+# DASHBOARD_CACHE_ALIAS cache until signals.py drops it because a source row changed.
+
+HITS_KEY = 'pro:dashboard:hits'
+MISSES_KEY = 'pro:dashboard:misses'
+# Hits and misses are tallied in memory and added to the shared counters once a process has seen
+# this many lookups, so a cached dashboard costs one cache read rather than a read and a write
+# (a file read and rewrite with FileBasedCache). The shared counters lag each process by that much.
+STATS_FLUSH_EVERY = 100
+
+_pending_stats = Counter()
+_pending_lock = threading.Lock()
+
+
+def dashboard_cache():
+    return shared_cache()
+
+
+def snapshot_key(student_id):
+    return f'pro:dashboard:student:{student_id}'
+
+
+def build_student_snapshot(student):
+    enrollments = Enrollment.objects.filter(student=student).select_related('course__instructor')
+    courses = [enrollment.course for enrollment in enrollments]
+    course_ids = [course.id for course in courses]
+    instructors = list({course.instructor_id: course.instructor for course in courses}.values())
+    student_fee, created = StudentFee.objects.get_or_create(student=student)
+    schedules = list(Schedule.objects.filter(course_id__in=course_ids).select_related('course'))
+    grades = list(Grade.objects.filter(student=student).select_related('course').order_by('course__code'))
+
+    return {
+        'student': student,
+        'courses': courses,
+        'instructors': instructors,
+        'schedules': schedules,
+        'busy_bitmap': busy_bitmap(schedules),
+        'student_fee': student_fee,
+        'total_fee': student_fee.total_fee,
+        'total_paid': student_fee.total_paid,
+        'remaining_balance': student_fee.remaining_balance,
+        'payments': list(Payment.objects.filter(student=student)),
+        'grades': grades,
+        'transcript': transcript_rows(grades),
+        'academic_standing': academic_standing(student),
+        'attendance_rates': list(AttendanceCourseRollup.objects.filter(student=student).with_rates().select_related('course')),
+        'assignments': list(Assignment.objects.filter(course_id__in=course_ids).select_related('instructor', 'course')),
+        'submitted_assignment_ids': list(AssignmentSubmission.objects.filter(student=student).values_list('assignment_id', flat=True)),
+        # The most recent notifications only; the badge count covers the rest.
+        'notifications': list(
+            Notification.objects.filter(student=student).select_related('announcement')
+            .order_by('-created_at', '-id')[:getattr(settings, 'DASHBOARD_NOTIFICATIONS', 20)]
+        ),
+        'unread_notifications': NotificationCounter.objects.unread('student', student.pk),
+        'student_sent_emails': list(SentEmail.objects.filter(sender_student=student).order_by('-sent_at')),
+    }
+
+
+def get_student_snapshot(student_id):
+    cache = dashboard_cache()
+    key = snapshot_key(student_id)
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        _count(HITS_KEY)
+        return snapshot
+
+    _count(MISSES_KEY)
+    student = get_object_or_404(Student, id=student_id)
+    snapshot = build_student_snapshot(student)
+    cache.set(key, snapshot, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60 * 60))
+    return snapshot
+
+
+def invalidate_student_snapshots(student_ids):
+    keys = [snapshot_key(student_id) for student_id in student_ids if student_id is not None]
+    if not keys:
+        return
+    cache = dashboard_cache()
+    cache.delete_many(keys)
+    # Drop them again once the transaction commits, in case a concurrent request
+    # rebuilt a snapshot from the rows as they were before this write.
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def snapshot_stats():
+    """Hit/miss totals of every process, including this process's unflushed lookups."""
+    flush_snapshot_stats()
+    cache = dashboard_cache()
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+def reset_snapshot_stats():
+    with _pending_lock:
+        _pending_stats.clear()
+    dashboard_cache().delete_many([HITS_KEY, MISSES_KEY])
+
+
+def flush_snapshot_stats():
+    """Add this process's tallied lookups to the shared counters."""
+    with _pending_lock:
+        pending = dict(_pending_stats)
+        _pending_stats.clear()
+    cache = dashboard_cache()
+    for key, count in pending.items():
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key, count)
+
+
+def _count(key):
+    with _pending_lock:
+        _pending_stats[key] += 1
+        due = sum(_pending_stats.values()) >= STATS_FLUSH_EVERY
+    if due:
+        flush_snapshot_stats()
@@ -0,0 +1,211 @@
+import logging
+import mimetypes
+import os
+import re
+import zipfile
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils import timezone
+from django.utils.http import content_disposition_header, http_date, quote_etag
+from .roles import INSTRUCTOR, STUDENT, session_role
+from .storage import digest_from_name, is_content_addressed
+
+logger = logging.getLogger(__name__)
+
+#########################################################################################################
+                                        #PROTECTED DOWNLOADS#
+#########################################################################################################
+
+# Submissions and reference documents are only served through these helpers after an access check.
+# With MEDIA_SENDFILE_BACKEND set, the front-end server sends the bytes (nginx X-Accel-Redirect or
+# Apache/lighttpd X-Sendfile); otherwise Django streams the file itself with Range and ETag support.
+
+STREAM_CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def can_download_submission(request, submission):
+    """The submitting student, the instructor of the assignment's course, or staff."""
+    if request.user.is_staff:
+        return True
+    role, profile_id = session_role(request)
+    if role == STUDENT:
+        return submission.student_id == profile_id
+    if role == INSTRUCTOR:
+        return submission.assignment.course.instructor_id == profile_id
+    return False
+
+
+def can_download_reference(request, assignment):
+    """Students enrolled in the assignment's course, its instructor, or staff."""
+    if request.user.is_staff:
+        return True
+    role, profile_id = session_role(request)
+    if role == STUDENT:
+        return assignment.course.enrollment_set.filter(student_id=profile_id).exists()
+    if role == INSTRUCTOR:
+        return assignment.course.instructor_id == profile_id
+    return False
+
+
+def file_etag(name, stat):
+    # Content-addressed names are the SHA-256 of the bytes, the strongest validator there is.
+    if is_content_addressed(name):
+        return quote_etag(digest_from_name(name))
+    return quote_etag(f"{stat.st_size:x}-{int(stat.st_mtime):x}")
+
+
+def serve_file(request, storage, name, filename):
+    """Send a stored file as an attachment called `filename`."""
+    backend = getattr(settings, 'MEDIA_SENDFILE_BACKEND', None)
+    if backend:
+        response = HttpResponse()
+        if backend == 'x-accel-redirect':
+            location = getattr(settings, 'MEDIA_ACCEL_REDIRECT_LOCATION', '/protected-media/')
+            response['X-Accel-Redirect'] = f"{location.rstrip('/')}/{name}"
+        else:
+            response['X-Sendfile'] = storage.path(name)
+        # Let the front-end server pick the content type from the file it sends.
+        del response['Content-Type']
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        return response
+
+    path = storage.path(name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        logger.warning("Stored file %s is missing from disk.", name)
+        raise Http404("File not found.")
+    etag = file_etag(name, stat)
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if conditional is not None:
+        return conditional
+
+    byte_range = _requested_range(request, stat.st_size, etag)
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{stat.st_size}"
+    elif byte_range is None:
+        try:
+            source = open(path, 'rb')
+        except FileNotFoundError:
+            # Deleted since the stat above.
+            raise Http404("File not found.")
+        # FileResponse hands the open file to wsgi.file_wrapper, which can use sendfile().
+        response = FileResponse(source, as_attachment=True, filename=filename)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(path, start, end - start + 1), status=206)
+        response['Content-Range'] = f"bytes {start}-{end}/{stat.st_size}"
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Type'] = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _requested_range(request, size, etag):
+    """Return (start, end) of a single satisfiable byte range, 'unsatisfiable', or None for the whole file."""
+    header = request.META.get('HTTP_RANGE', '').replace(' ', '')
+    match = RANGE_RE.match(header)
+    if not match or match.groups() == ('', ''):
+        # Missing, malformed or multi-range requests get the whole file.
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag:
+        return None
+
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        start, end = max(0, size - length), size - 1
+    else:
+        start = int(first)
+        if start >= size:
+            return 'unsatisfiable'
+        if last and int(last) < start:
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            chunk = source.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+#########################################################################################################
+                                        #SUBMISSION ARCHIVES#
+#########################################################################################################
+
+class _ArchiveBuffer:
+    """A write-only, unseekable file for ZipFile; the bytes written so far are drained after each chunk."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def submission_entries(assignment):
+    """Yield (archive name, storage name, submitted_at) for every submission, named {student_id}_{late|ontime}."""
+    seen = {}
+    submissions = assignment.assignmentsubmission_set.order_by('student__student_id', 'submitted_at', 'pk').values_list(
+        'student__student_id', 'submission_file', 'submitted_at',
+    )
+    for student_id, name, submitted_at in submissions.iterator(chunk_size=500):
+        if not name:
+            continue
+        stem = f"{student_id}_{'late' if submitted_at > assignment.due_date else 'ontime'}"
+        # Resubmissions get _2, _3, ... in submission order.
+        seen[stem] = seen.get(stem, 0) + 1
+        suffix = f"_{seen[stem]}" if seen[stem] > 1 else ''
+        yield f"{stem}{suffix}{os.path.splitext(name)[1]}", name, submitted_at
+
+
+def stream_submission_archive(assignment, storage):
+    """
+    Yield a ZIP of the assignment's submissions a chunk at a time. Entries are stored rather
+    than deflated (submissions are mostly already-compressed PDFs and archives) and nothing is
+    staged on disk, so memory use is one file chunk however large the archive grows.
+    """
+    buffer = _ArchiveBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for entry_name, name, submitted_at in submission_entries(assignment):
+            try:
+                source = storage.open(name, 'rb')
+            except FileNotFoundError:
+                logger.warning("Submission file %s of assignment %s is missing; leaving it out of the archive.", name, assignment.pk)
+                continue
+            with source:
+                info = zipfile.ZipInfo(entry_name, date_time=timezone.localtime(submitted_at).timetuple()[:6])
+                info.file_size = source.size
+                with archive.open(info, mode='w') as entry:
+                    for chunk in source.chunks(STREAM_CHUNK_SIZE):
+                        entry.write(chunk)
+                        yield buffer.drain()
+            yield buffer.drain()
+    yield buffer.drain()
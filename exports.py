@@ -0,0 +1,94 @@
+import csv
+from .models import Attendance, Enrollment, Grade, Payment
+
+#########################################################################################################
+                                        #CSV EXPORTS#
+#########################################################################################################
+
+# Each export reads plain tuples from values_list() with every join done by the database, and writes
+# them through the csv module a chunk at a time, so even a full-university export holds one chunk of
+# rows in memory and never builds a model instance.
+
+EXPORT_CHUNK_SIZE = 2000
+
+# dataset -> model, (header, lookup) columns, and the lookups used by the course/faculty/date filters.
+EXPORTS = {
+    'grades': {
+        'model': Grade,
+        'columns': [
+            ('Student ID', 'student__student_id'), ('Student', 'student__name'), ('Faculty', 'student__faculty'),
+            ('Course code', 'course__code'), ('Course', 'course__name'), ('Grade', 'grade'),
+        ],
+        'course': 'course_id', 'faculty': 'student__faculty', 'date': None,
+    },
+    'attendance': {
+        'model': Attendance,
+        'columns': [
+            ('Date', 'date'), ('Course code', 'course__code'), ('Start time', 'schedule__start_time'),
+            ('Student ID', 'student__student_id'), ('Student', 'student__name'), ('Status', 'status'),
+        ],
+        'course': 'course_id', 'faculty': 'student__faculty', 'date': 'date',
+    },
+    'payments': {
+        'model': Payment,
+        'columns': [
+            ('Date', 'date'), ('Student ID', 'student__student_id'), ('Student', 'student__name'),
+            ('Amount', 'amount'), ('Transaction ID', 'transaction_id'),
+        ],
+        'course': 'student__enrollment__course_id', 'faculty': 'student__faculty', 'date': 'date__date',
+    },
+    'enrollments': {
+        'model': Enrollment,
+        'columns': [
+            ('Student ID', 'student__student_id'), ('Student', 'student__name'), ('Faculty', 'student__faculty'),
+            ('Major', 'student__major'), ('Course code', 'course__code'), ('Course', 'course__name'),
+            ('Instructor', 'instructor__full_name'),
+        ],
+        'course': 'course_id', 'faculty': 'student__faculty', 'date': None,
+    },
+}
+
+
+class Echo:
+    """A file-like object whose write() hands the formatted line straight back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def export_queryset(dataset, course_id=None, faculty=None, start=None, end=None):
+    """The filtered values_list() for a dataset; raises ValueError for a filter it does not support."""
+    spec = EXPORTS[dataset]
+    queryset = spec['model'].objects.all()
+    if course_id is not None:
+        queryset = queryset.filter(**{spec['course']: course_id})
+    if faculty:
+        queryset = queryset.filter(**{spec['faculty']: faculty})
+    if start is not None or end is not None:
+        if spec['date'] is None:
+            raise ValueError(f"The {dataset} export cannot be filtered by date.")
+        if start is not None:
+            queryset = queryset.filter(**{f"{spec['date']}__gte": start})
+        if end is not None:
+            queryset = queryset.filter(**{f"{spec['date']}__lte": end})
+    return queryset.order_by('pk').values_list(*(lookup for header, lookup in spec['columns']))
+
+
+def _cell(value):
+    # Keep spreadsheet programs from evaluating text that looks like a formula.
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+
+def stream_csv(dataset, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for header, lookup in EXPORTS[dataset]['columns']])
+    chunk = []
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        chunk.append(writer.writerow([_cell(value) for value in row]))
+        if len(chunk) >= EXPORT_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
@@ -0,0 +1,186 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+from .dashboard import dashboard_cache
+from .models import Schedule, Student
+
+
+#########################################################################################################
+                                        #TIMETABLE FEEDS#
+#########################################################################################################
+
+# A student's weekly timetable is served as JSON and as an iCalendar feed at URLs carrying a signed
+# token, so calendar apps need no session. Each student has a version number in the dashboard cache,
+# and the rendered bodies are cached under it. signals.py bumps the version when an enrollment,
+# schedule, course or instructor changes. A poll with a current ETag or date costs two cache reads
+# and no database query.
+
+FEED_SALT = 'pro.timetable.feed'
+# Tokens are only as secret as SECRET_KEY, so no feed is served while it is settings.py's fallback
+# or a key Django generated for development.
+PUBLIC_SECRET_KEYS = {'your-default-secret-key'}
+BODY_TIMEOUT = 24 * 60 * 60
+ICS_PRODID = '-//pro//Student Timetable//EN'
+DAY_NAMES = dict(Schedule.DAY_OF_WEEK_CHOICES)
+ICS_DAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+
+def feeds_enabled():
+    return settings.SECRET_KEY not in PUBLIC_SECRET_KEYS and not settings.SECRET_KEY.startswith('django-insecure-')
+
+
+def feed_token(student_id):
+    """The student's feed token, or None while feeds are disabled. Changing SECRET_KEY revokes every token."""
+    if not feeds_enabled():
+        return None
+    return signing.Signer(salt=FEED_SALT).sign(str(student_id))
+
+
+def student_for_token(token):
+    """The student id a feed token was signed for, or None for a forged or mangled token."""
+    if not feeds_enabled():
+        return None
+    try:
+        return int(signing.Signer(salt=FEED_SALT).unsign(token))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def version_key(student_id):
+    return f'pro:timetable:version:{student_id}'
+
+
+def body_key(student_id, version):
+    return f'pro:timetable:body:{student_id}:{version}'
+
+
+def timetable_version(student_id):
+    cache = dashboard_cache()
+    key = version_key(student_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock rather than 1, so a version lost from the cache is never reissued
+        # with different content behind it.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_timetable_versions(student_ids):
+    keys = [version_key(student_id) for student_id in student_ids if student_id is not None]
+    if not keys:
+        return
+    _bump(keys)
+    # Bump again on commit, in case a concurrent request cached a body from the rows as they
+    # were before this write under the version bumped above.
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def _bump(keys):
+    cache = dashboard_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Nothing cached for this student yet; the next read starts a fresh version.
+            pass
+
+
+def timetable_bodies(student_id):
+    """
+    (version, entry) for the student, where entry holds the rendered 'json' and 'ics' bodies and
+    their 'last_modified' timestamp; (version, None) if there is no such student.
+    """
+    cache = dashboard_cache()
+    version = timetable_version(student_id)
+    entry = cache.get(body_key(student_id, version))
+    if entry is None:
+        student = Student.objects.filter(pk=student_id).first()
+        if student is None:
+            return version, None
+        schedules = list(
+            Schedule.objects.filter(course__enrollment__student=student)
+            .select_related('course__instructor').order_by('day_of_week', 'start_time', 'course__code')
+        )
+        last_modified = int(time.time())
+        entry = {
+            'last_modified': last_modified,
+            'json': render_timetable_json(student, version, schedules),
+            'ics': render_timetable_ics(student, schedules, last_modified),
+        }
+        # Bodies of superseded versions are never read again, so let them expire.
+        cache.set(body_key(student_id, version), entry, timeout=BODY_TIMEOUT)
+    return version, entry
+
+
+def render_timetable_json(student, version, schedules):
+    days = {}
+    for schedule in schedules:
+        days.setdefault(schedule.day_of_week, []).append({
+            'course': schedule.course.code,
+            'name': schedule.course.name,
+            'instructor': schedule.course.instructor.full_name,
+            'start': f"{schedule.start_time:%H:%M}",
+            'end': f"{schedule.end_time:%H:%M}",
+        })
+    return json.dumps({
+        'student': student.student_id,
+        'version': version,
+        'days': [{'day': day, 'name': DAY_NAMES[day], 'slots': slots} for day, slots in sorted(days.items())],
+    })
+
+
+def _ics_text(value):
+    return str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold(line):
+    # Content lines are limited to 75 octets; continuation lines start with a space.
+    encoded = line.encode()
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # Do not split a multi-byte character.
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+    parts.append(encoded.decode())
+    return '\r\n '.join(parts)
+
+
+def render_timetable_ics(student, schedules, last_modified):
+    """
+    One weekly recurring VEVENT per Schedule row, in floating local time so the classes stay at the
+    same wall-clock time across daylight-saving changes. The recurrences start from the Monday of the
+    week the feed was rendered.
+    """
+    stamp = datetime.fromtimestamp(last_modified, tz=dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    today = timezone.localdate()
+    monday = today - timedelta(days=today.weekday())
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{ICS_PRODID}',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{_ics_text(f"Timetable - {student.name}")}',
+    ]
+    for schedule in schedules:
+        day = monday + timedelta(days=schedule.day_of_week)
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:schedule-{schedule.pk}-student-{student.pk}@pro',
+            f'DTSTAMP:{stamp}',
+            f'DTSTART:{datetime.combine(day, schedule.start_time):%Y%m%dT%H%M%S}',
+            f'DTEND:{datetime.combine(day, schedule.end_time):%Y%m%dT%H%M%S}',
+            f'RRULE:FREQ=WEEKLY;BYDAY={ICS_DAYS[schedule.day_of_week]}',
+            f'SUMMARY:{_ics_text(f"{schedule.course.code} {schedule.course.name}")}',
+            f'DESCRIPTION:{_ics_text(f"Instructor: {schedule.course.instructor.full_name}")}',
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
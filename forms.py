@@ -1,6 +1,10 @@
+import csv
+import io
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
+from .timetable import student_interval_index
+from .uploads import max_upload_size
 from .models import Student, Instructor, Announcement, Enrollment, SentEmail, Grade, Course, Payment, AssignmentSubmission, Assignment, Schedule, Attendance
 
 class RegistrationForm(UserCreationForm):
@@ -49,7 +53,8 @@ class AnnouncementForm(forms.ModelForm):
 
 
 class EnrollmentForm(forms.ModelForm):
-    course = forms.ModelChoiceField(queryset=Course.objects.all(), empty_label="Select a course")
+    # The course id comes from the catalog API (catalog.py); the form never renders the catalog itself.
+    course = forms.ModelChoiceField(queryset=Course.objects.all(), widget=forms.HiddenInput)
 
     class Meta:
         model = Enrollment
@@ -58,9 +63,23 @@ class EnrollmentForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         student = kwargs.pop('student', None)
         super().__init__(*args, **kwargs)
+        self.student = student
         if student:
             self.fields['course'].queryset = Course.objects.exclude(enrollment__student=student)
 
+    def clean_course(self):
+        course = self.cleaned_data['course']
+        if self.student:
+            index = student_interval_index(self.student)
+            clashes = index.clashes(course.schedule_set.all())
+            if clashes:
+                raise forms.ValidationError([
+                    f"{new.get_day_of_week_display()} {new.start_time:%H:%M}-{new.end_time:%H:%M} clashes with "
+                    f"{existing.course.name} ({existing.start_time:%H:%M}-{existing.end_time:%H:%M})."
+                    for new, existing in clashes
+                ])
+        return course
+
 
 GRADE_CHOICES = [
     ('None', 'None'),
@@ -104,12 +123,29 @@ class PaymentForm(forms.ModelForm):
             raise forms.ValidationError(f"Payment amount exceeds the total fee. You have {total_fee - paid_amount} remaining.")
         return amount
 
-class AssignmentForm(forms.ModelForm):
+class UploadLimitMixin:
+    """Reports the files SizeLimitedUploadHandler dropped mid-upload for exceeding MAX_UPLOAD_SIZE."""
+
+    def __init__(self, *args, oversized_uploads=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.oversized_uploads = set(oversized_uploads) & set(self.fields)
+        for name in self.oversized_uploads:
+            # The file never arrived, so report the size instead of "This field is required."
+            self.fields[name].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        limit = max_upload_size() // (1024 * 1024)
+        for name in self.oversized_uploads:
+            self.add_error(name, f"The file is larger than the {limit} MB upload limit.")
+        return cleaned_data
+
+class AssignmentForm(UploadLimitMixin, forms.ModelForm):
     class Meta:
         model = Assignment
         fields = ['title', 'description', 'due_date', 'course', 'reference_document']
 
-class AssignmentSubmissionForm(forms.ModelForm):
+class AssignmentSubmissionForm(UploadLimitMixin, forms.ModelForm):
     class Meta:
         model = AssignmentSubmission
         fields = ['submission_file']
@@ -149,5 +185,125 @@ class AttendanceForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         if instructor:
             self.fields['course'].queryset = Course.objects.filter(instructor=instructor)
-            self.fields['schedule'].queryset = Schedule.objects.filter(course__in=Course.objects.filter(instructor=instructor))
-            self.fields['students'].queryset = Student.objects.filter(enrollment__course__in=Course.objects.filter(instructor=instructor)).distinct()
\ No newline at end of file
+            self.fields['schedule'].queryset = Schedule.objects.filter(course__in=Course.objects.filter(instructor=instructor)).select_related('course')
+            self.fields['students'].queryset = Student.objects.filter(enrollment__course__in=Course.objects.filter(instructor=instructor)).distinct()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        course = cleaned_data.get('course')
+        schedule = cleaned_data.get('schedule')
+        if course and schedule and schedule.course_id != course.id:
+            raise forms.ValidationError("The selected schedule does not belong to this course.")
+        return cleaned_data
+
+class AttendanceSheetForm(forms.Form):
+    """
+    Marks a whole session in one submit. Each student's status comes from a `status_<student pk>`
+    field posted alongside the form, or from an uploaded CSV roster with `student_id` and `status`
+    columns for large lecture halls.
+    """
+    STATUS_FIELD_PREFIX = 'status_'
+
+    course = forms.ModelChoiceField(queryset=Course.objects.none())
+    schedule = forms.ModelChoiceField(queryset=Schedule.objects.none())
+    date = forms.DateField()
+    roster_file = forms.FileField(required=False, help_text="CSV with student_id and status columns.")
+
+    def __init__(self, *args, **kwargs):
+        instructor = kwargs.pop('instructor', None)
+        super().__init__(*args, **kwargs)
+        if instructor:
+            self.fields['course'].queryset = Course.objects.filter(instructor=instructor)
+            self.fields['schedule'].queryset = Schedule.objects.filter(course__instructor=instructor).select_related('course')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        course = cleaned_data.get('course')
+        schedule = cleaned_data.get('schedule')
+        if not course or not schedule:
+            return cleaned_data
+        if schedule.course_id != course.id:
+            raise forms.ValidationError("The selected schedule does not belong to this course.")
+
+        statuses = {}
+        for key, value in self.data.items():
+            if key.startswith(self.STATUS_FIELD_PREFIX) and value:
+                pk = key[len(self.STATUS_FIELD_PREFIX):]
+                if not pk.isdigit():
+                    raise forms.ValidationError("Invalid student in attendance sheet.")
+                statuses[int(pk)] = value
+        roster_file = cleaned_data.get('roster_file')
+        if roster_file:
+            statuses.update(self._read_roster(roster_file, course))
+        if not statuses:
+            raise forms.ValidationError("Mark at least one student.")
+
+        valid_statuses = {value for value, label in Attendance.STATUS_CHOICES}
+        if any(status not in valid_statuses for status in statuses.values()):
+            raise forms.ValidationError("Attendance status must be Present or Absent.")
+        enrolled = set(Enrollment.objects.filter(course=course, student_id__in=list(statuses)).values_list('student_id', flat=True))
+        if len(enrolled) != len(statuses):
+            raise forms.ValidationError(f"{len(statuses) - len(enrolled)} student(s) are not enrolled in {course}.")
+
+        cleaned_data['statuses'] = statuses
+        return cleaned_data
+
+    def _read_roster(self, roster_file, course):
+        reader = csv.DictReader(io.TextIOWrapper(roster_file.file, encoding='utf-8-sig'))
+        try:
+            if not reader.fieldnames or not {'student_id', 'status'} <= set(reader.fieldnames):
+                raise forms.ValidationError("The roster must have student_id and status columns.")
+            # A short row leaves its missing columns as None.
+            by_code = {
+                row['student_id'].strip(): (row.get('status') or '').strip().capitalize()
+                for row in reader if row.get('student_id')
+            }
+        except UnicodeDecodeError:
+            raise forms.ValidationError("The roster must be a UTF-8 CSV file.")
+        except csv.Error as error:
+            raise forms.ValidationError(f"The roster is not a valid CSV file: {error}")
+
+        pks = {}
+        codes = list(by_code)
+        for start in range(0, len(codes), 500):
+            pks.update(Student.objects.filter(student_id__in=codes[start:start + 500], enrollment__course=course).values_list('student_id', 'pk'))
+        unknown = [code for code in codes if code not in pks]
+        if unknown:
+            raise forms.ValidationError(f"Unknown student IDs for {course}: {', '.join(unknown[:10])}")
+        return {pks[code]: status for code, status in by_code.items()}
+
+
+class ExportFilterForm(forms.Form):
+    course = forms.IntegerField(required=False, min_value=1)
+    faculty = forms.CharField(required=False, max_length=100)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and start > end:
+            raise forms.ValidationError("The start date must not be after the end date.")
+        return cleaned_data
+
+
+class CatalogFilterForm(forms.Form):
+    faculty = forms.CharField(required=False, max_length=100)
+    department = forms.CharField(required=False, max_length=100)
+    credit_hours = forms.IntegerField(required=False, min_value=0)
+    # Only courses that fit around the student's current timetable.
+    fits = forms.BooleanField(required=False)
+    # Only courses meeting entirely within a free slot: a day, a time of day, or both.
+    day = forms.TypedChoiceField(
+        required=False, coerce=int, empty_value=None, choices=[('', 'Any day')] + Schedule.DAY_OF_WEEK_CHOICES,
+    )
+    start = forms.TimeField(required=False)
+    end = forms.TimeField(required=False)
+    after = forms.CharField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and end <= start:
+            raise forms.ValidationError("The free slot must end after it starts.")
+        return cleaned_data
@@ -0,0 +1,19 @@
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+class BackgroundStreamHandler(QueueHandler):
+    """
+    A StreamHandler whose writes happen on a listener thread.
+
+    Logging from a view only formats the record and puts it on an unbounded queue, so a slow
+    stdout or log collector never holds up a request.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.listener = QueueListener(self.queue, logging.StreamHandler(stream))
+        self.listener.start()
+        atexit.register(self.listener.stop)
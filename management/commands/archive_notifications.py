@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from pro.notifications import ARCHIVE_BATCH_SIZE, archive_notifications
+
+
+class Command(BaseCommand):
+    help = "Move read notifications past the retention period to the archive table, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90),
+            help="Archive read notifications created more than this many days ago.",
+        )
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help="Notifications moved per transaction.")
+
+    def handle(self, *args, **options):
+        moved = archive_notifications(options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} notifications older than {options['days']} days."))
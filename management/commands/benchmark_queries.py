@@ -0,0 +1,132 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from pro.models import AssignmentSubmission, Attendance, Enrollment, Grade, Notification, Payment, Schedule, SentEmail
+from pro.synthetic import SEMESTER_START, generate_university
+
+# The indexes and constraints that back the dashboard access paths. The "before" pass drops them.
+ACCESS_PATHS = [
+    (Notification, 'notification_stud_recent_idx'),
+    (Notification, 'notification_instr_recent_idx'),
+    (SentEmail, 'sentemail_student_recent_idx'),
+    (SentEmail, 'sentemail_instr_recent_idx'),
+    (Attendance, 'attendance_course_date_idx'),
+    (AssignmentSubmission, 'submission_assign_student_idx'),
+    (Grade, 'unique_grade_per_course'),
+    (Enrollment, 'unique_enrollment_per_course'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large throwaway dataset, then print the query plan and timing of every dashboard query "
+        "with and without the dashboard indexes. Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=2.5, help="Size of the synthetic university (1 = 2000 students).")
+        parser.add_argument('--weeks', type=int, default=10, help="Weeks of attendance to generate.")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per query; the median is reported.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        # The SQLite schema editor refuses to run inside a transaction unless foreign key
+        # checks were already off before it started.
+        connection.disable_constraint_checking()
+        try:
+            with transaction.atomic():
+                student, instructor = self.seed(options)
+                queries = self.dashboard_queries(student, instructor)
+                after = self.measure("with dashboard indexes", queries, options['repeat'])
+                self.drop_access_paths()
+                before = self.measure("without dashboard indexes", queries, options['repeat'])
+                self.summarise(before, after)
+                transaction.set_rollback(True)
+        finally:
+            connection.enable_constraint_checking()
+
+    def seed(self, options):
+        self.stdout.write(f"Generating a synthetic university at scale {options['scale']}...")
+        data = generate_university(scale=options['scale'], seed=options['seed'], weeks=options['weeks'], accounts=False)
+        self.stdout.write(
+            f"Seeded {len(data['students'])} students, {len(data['enrollments'])} enrollments "
+            f"and {len(data['attendance'])} attendance rows."
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        students, instructors = data['students'], data['instructors']
+        return students[len(students) // 2], instructors[len(instructors) // 2]
+
+    def dashboard_queries(self, student, instructor):
+        course_ids = list(Enrollment.objects.filter(student=student).values_list('course_id', flat=True))
+        course_id = course_ids[0]
+        return {
+            'student: enrollments': Enrollment.objects.filter(student=student).select_related('course__instructor'),
+            'student: schedules': Schedule.objects.filter(course_id__in=course_ids),
+            'student: payments': Payment.objects.filter(student=student),
+            'student: grades': Grade.objects.filter(student=student).select_related('course'),
+            'student: submissions': AssignmentSubmission.objects.filter(student=student).values_list('assignment_id', flat=True),
+            'student: notifications': Notification.objects.filter(student=student).order_by('-created_at'),
+            'student: sent emails': SentEmail.objects.filter(sender_student=student).order_by('-sent_at'),
+            'instructor: attendance page': Attendance.objects.filter(course__instructor=instructor).order_by('-date', '-id')[:26],
+            'instructor: attendance by session': Attendance.objects.filter(course_id=course_id, date=SEMESTER_START),
+            'instructor: grades page': Grade.objects.filter(course__instructor=instructor).order_by('-id')[:26],
+            'instructor: grade lookup': Grade.objects.filter(student=student, course_id=course_id),
+            'instructor: submissions page': AssignmentSubmission.objects.filter(assignment__instructor=instructor).order_by('-submitted_at', '-id')[:26],
+            'instructor: submission lookup': AssignmentSubmission.objects.filter(assignment__course_id=course_id, student=student),
+            'instructor: enrollments page': Enrollment.objects.filter(course__instructor=instructor).order_by('-id')[:26],
+            'instructor: notifications page': Notification.objects.filter(instructor=instructor).order_by('-created_at', '-id')[:26],
+            'instructor: sent emails page': SentEmail.objects.filter(sender_instructor=instructor).order_by('-sent_at', '-id')[:26],
+            'enrollment check': Enrollment.objects.filter(student=student, course_id=course_id),
+        }
+
+    def measure(self, label, queries, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {label} =="))
+        results = {}
+        for name, queryset in queries.items():
+            plan = queryset.explain()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            scans = [line.strip(' |-`') for line in plan.splitlines() if self.is_full_scan(line)]
+            results[name] = (statistics.median(timings), scans)
+
+            flag = self.style.ERROR("  FULL SCAN") if scans else ""
+            self.stdout.write(f"{name:<36} {results[name][0]:8.2f} ms{flag}")
+            for line in plan.splitlines():
+                self.stdout.write(f"    {line}")
+        return results
+
+    def is_full_scan(self, line):
+        # SQLite prints "SCAN <table>" for a full table scan and "SCAN <table> USING ... INDEX" for an index walk.
+        line = line.strip(' |-`')
+        return line.startswith('SCAN ') and 'USING' not in line and 'CONSTANT ROW' not in line
+
+    def drop_access_paths(self):
+        with connection.schema_editor(atomic=False) as editor:
+            for model, name in ACCESS_PATHS:
+                index = next((index for index in model._meta.indexes if index.name == name), None)
+                if index is not None:
+                    editor.remove_index(model, index)
+                    continue
+                # SQLite drops a unique constraint by rebuilding the table from the model's
+                # current constraints, so hide this one from the model while that happens.
+                constraints = model._meta.constraints
+                model._meta.constraints = [constraint for constraint in constraints if constraint.name != name]
+                try:
+                    editor.remove_constraint(model, next(constraint for constraint in constraints if constraint.name == name))
+                finally:
+                    model._meta.constraints = constraints
+
+    def summarise(self, before, after):
+        self.stdout.write(self.style.MIGRATE_HEADING("\n== summary (median ms) =="))
+        for name in after:
+            self.stdout.write(f"{name:<36} {before[name][0]:8.2f} -> {after[name][0]:8.2f}")
+        full_scans = [name for name, (elapsed, scans) in after.items() if scans]
+        if full_scans:
+            self.stdout.write(self.style.ERROR(f"Full table scans with indexes: {', '.join(full_scans)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No dashboard query does a full table scan."))
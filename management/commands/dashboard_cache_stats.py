@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from pro.dashboard import reset_snapshot_stats, snapshot_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters for the student dashboard snapshot cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Reset the counters after printing them.")
+
+    def handle(self, *args, **options):
+        stats = snapshot_stats()
+        self.stdout.write(f"hits={stats['hits']} misses={stats['misses']} hit_ratio={stats['hit_ratio']:.1%}")
+        if options['reset']:
+            reset_snapshot_stats()
+            self.stdout.write("Counters reset.")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from pro.models import Announcement
+from pro.notifications import fan_out_announcement
+
+
+class Command(BaseCommand):
+    help = "Deliver notifications for announcements whose fan-out has not completed."
+
+    def handle(self, *args, **options):
+        pending = Announcement.objects.filter(fanout_pending=True).order_by('created_at').values_list('pk', flat=True)
+        for announcement_id in list(pending):
+            notified = fan_out_announcement(announcement_id)
+            self.stdout.write(f"Announcement {announcement_id}: notified {notified} students.")
@@ -0,0 +1,83 @@
+import csv
+from collections import defaultdict
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from pro.models import Student, StudentIdSequence, format_student_id, student_id_prefix, university_email_for
+
+
+class Command(BaseCommand):
+    help = (
+        "Import an intake of students from a CSV with name, dob (YYYY-MM-DD), faculty and major columns "
+        "(registration_date optional). Rows are streamed and inserted in chunks with IDs reserved in blocks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Validate the file without inserting anything.")
+
+    def handle(self, *args, **options):
+        imported = skipped = 0
+        with open(options['csv_path'], newline='', encoding='utf-8-sig') as handle:
+            reader = csv.DictReader(handle)
+            missing = {'name', 'dob', 'faculty', 'major'} - set(reader.fieldnames or ())
+            if missing:
+                raise CommandError(f"Missing columns: {', '.join(sorted(missing))}")
+
+            chunk = []
+            for line, row in enumerate(reader, start=2):
+                try:
+                    chunk.append(self.build_student(row))
+                except ValueError as exc:
+                    skipped += 1
+                    self.stderr.write(f"Line {line}: {exc}")
+                    continue
+                if len(chunk) >= options['chunk_size']:
+                    imported += self.import_chunk(chunk, options['dry_run'])
+                    chunk = []
+            if chunk:
+                imported += self.import_chunk(chunk, options['dry_run'])
+
+        verb = "Validated" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {imported} students; skipped {skipped} rows."))
+
+    def build_student(self, row):
+        name = (row.get('name') or '').strip()
+        major = (row.get('major') or '').strip()
+        if not name or not major or not student_id_prefix(major):
+            raise ValueError("name and major are required.")
+        student = Student(
+            name=name,
+            dob=date.fromisoformat((row.get('dob') or '').strip()),
+            faculty=(row.get('faculty') or '').strip(),
+            major=major,
+        )
+        if row.get('registration_date'):
+            registered = parse_datetime(row['registration_date'].strip())
+            if registered is None:
+                raise ValueError("registration_date is not a valid date/time.")
+            if timezone.is_naive(registered):
+                registered = timezone.make_aware(registered)
+            student.registration_date = registered
+        return student
+
+    def import_chunk(self, students, dry_run):
+        if dry_run:
+            return len(students)
+
+        by_prefix = defaultdict(list)
+        for student in students:
+            by_prefix[student_id_prefix(student.major)].append(student)
+
+        with transaction.atomic():
+            # One reservation per major prefix covers every student of that prefix in the chunk.
+            for prefix, group in by_prefix.items():
+                first = StudentIdSequence.objects.reserve(prefix, len(group))
+                for offset, student in enumerate(group):
+                    student.student_id = format_student_id(prefix, first + offset)
+                    student.university_email = university_email_for(student.student_id)
+            Student.objects.bulk_create(students, batch_size=500)
+        return len(students)
@@ -0,0 +1,24 @@
+import time
+from importlib import import_module
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions, once or periodically with --loop."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running and purge every --interval seconds.")
+        parser.add_argument('--interval', type=float, default=15 * 60)
+
+    def handle(self, *args, **options):
+        engine = import_module(settings.SESSION_ENGINE)
+        while True:
+            try:
+                engine.SessionStore.clear_expired()
+            except NotImplementedError:
+                raise CommandError(f"{settings.SESSION_ENGINE} does not store sessions server-side; nothing to purge.")
+            self.stdout.write("Expired sessions purged.")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
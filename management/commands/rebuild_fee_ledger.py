@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from pro.models import Student, StudentFee, ZERO
+
+
+class Command(BaseCommand):
+    help = "Rebuild the StudentFee ledger totals from Fee and Payment rows and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only report drift; exit with an error if any is found.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = StudentFee.objects.compute_totals()
+            ledgers = {ledger.student_id: ledger for ledger in StudentFee.objects.select_for_update()}
+
+            missing = []
+            drifted = []
+            for student_id in Student.objects.values_list('id', flat=True).iterator():
+                fee_total, paid_total = expected.get(student_id, (ZERO, ZERO))
+                ledger = ledgers.get(student_id)
+                if ledger is None:
+                    missing.append(StudentFee(student_id=student_id, fee_total=fee_total, paid_total=paid_total))
+                elif (ledger.fee_total, ledger.paid_total) != (fee_total, paid_total):
+                    self.stdout.write(
+                        f"Drift for student {student_id}: stored {ledger.fee_total}/{ledger.paid_total}, "
+                        f"expected {fee_total}/{paid_total}"
+                    )
+                    ledger.fee_total, ledger.paid_total = fee_total, paid_total
+                    drifted.append(ledger)
+
+            if options['check']:
+                if drifted or missing:
+                    raise CommandError(f"{len(drifted)} drifted and {len(missing)} missing ledger rows.")
+                self.stdout.write(self.style.SUCCESS("Fee ledger is consistent."))
+                return
+
+            StudentFee.objects.bulk_update(drifted, ['fee_total', 'paid_total'], batch_size=500)
+            StudentFee.objects.bulk_create(missing, batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt fee ledger: {len(drifted)} corrected, {len(missing)} created."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from pro.models import NOTIFICATION_OWNERS, NotificationCounter
+
+
+class Command(BaseCommand):
+    help = "Recount every student's and instructor's unread notifications and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only report drift; exit with an error if any is found.")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = 0
+            for owner in NOTIFICATION_OWNERS:
+                expected = NotificationCounter.objects.compute_totals(owner)
+                stored = dict(
+                    NotificationCounter.objects.filter(**{f'{owner}__isnull': False})
+                    .values_list(f'{owner}_id', 'unread').iterator()
+                )
+                for owner_id in expected.keys() | stored.keys():
+                    if stored.get(owner_id, 0) != expected.get(owner_id, 0):
+                        self.stdout.write(f"Drift for {owner} {owner_id}: stored {stored.get(owner_id, 0)}, expected {expected.get(owner_id, 0)}")
+                        drift += 1
+            if drift:
+                raise CommandError(f"{drift} drifted notification counters.")
+            self.stdout.write(self.style.SUCCESS("Notification counters are consistent."))
+            return
+
+        with transaction.atomic():
+            refreshed = sum(NotificationCounter.objects.refresh(owner) for owner in NOTIFICATION_OWNERS)
+        self.stdout.write(self.style.SUCCESS(f"Recounted unread notifications for {refreshed} students and instructors."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from pro.search import SEARCH_INDEXES, check_search_index, create_search_indexes, search_enabled
+
+
+class Command(BaseCommand):
+    help = "Create the SQLite FTS5 search tables and triggers if missing, and reindex every row."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only report indexes that differ from their tables; exit with an error if any do.")
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            raise CommandError("Full-text search needs SQLite with FTS5; other databases fall back to icontains.")
+
+        if options['check']:
+            stale = [index for index in SEARCH_INDEXES if not check_search_index(index)]
+            for index in stale:
+                self.stdout.write(f"Search index {index} is missing or out of step with its table.")
+            if stale:
+                raise CommandError(f"{len(stale)} stale search indexes.")
+            self.stdout.write(self.style.SUCCESS("Search indexes are consistent."))
+            return
+
+        create_search_indexes(rebuild=True)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(SEARCH_INDEXES)} search indexes."))
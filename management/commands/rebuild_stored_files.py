@@ -0,0 +1,76 @@
+import os
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from pro.models import Assignment, AssignmentSubmission, StoredFile
+from pro.storage import CAS_PREFIX, digest_from_name, is_content_addressed, submission_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount StoredFile references from assignments and submissions, and delete content-addressed "
+        "files that nothing points at (for example uploads whose transaction rolled back)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only report problems; exit with an error if any are found.")
+        parser.add_argument(
+            '--grace', type=int, default=3600,
+            help="Leave unreferenced files younger than this many seconds alone; they may belong to an upload in flight.",
+        )
+
+    def handle(self, *args, **options):
+        storage = submission_storage()
+        with transaction.atomic():
+            expected = Counter()
+            for queryset, field in (
+                (Assignment.objects.all(), 'reference_document'),
+                (AssignmentSubmission.objects.all(), 'submission_file'),
+            ):
+                for name in queryset.values_list(field, flat=True).iterator(chunk_size=2000):
+                    if is_content_addressed(name):
+                        expected[name] += 1
+
+            stored = {stored_file.name: stored_file for stored_file in StoredFile.objects.select_for_update()}
+            drifted = []
+            for name, stored_file in stored.items():
+                if stored_file.ref_count != expected.get(name, 0):
+                    self.stdout.write(f"Drift for {name}: stored {stored_file.ref_count}, expected {expected.get(name, 0)}")
+                    stored_file.ref_count = expected.get(name, 0)
+                    drifted.append(stored_file)
+            missing = [name for name in expected if name not in stored]
+            for name in missing:
+                self.stdout.write(f"No StoredFile row for {name}")
+            orphans = self.find_orphans(storage, set(expected), options['grace'])
+
+            if options['check']:
+                if drifted or missing or orphans:
+                    raise CommandError(f"{len(drifted)} drifted, {len(missing)} missing and {len(orphans)} orphaned files.")
+                self.stdout.write(self.style.SUCCESS("Stored files are consistent."))
+                return
+
+            StoredFile.objects.bulk_update([stored_file for stored_file in drifted if stored_file.ref_count], ['ref_count'], batch_size=500)
+            StoredFile.objects.filter(pk__in=[stored_file.pk for stored_file in drifted if not stored_file.ref_count]).delete()
+            StoredFile.objects.bulk_create([
+                StoredFile(name=name, digest=digest_from_name(name), size=storage.size(name), ref_count=expected[name])
+                for name in missing if storage.exists(name)
+            ], batch_size=500)
+
+        for name in orphans:
+            storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stored files: {len(drifted)} recounted, {len(missing)} registered, {len(orphans)} orphaned files deleted."
+        ))
+
+    def find_orphans(self, storage, referenced, grace):
+        root = storage.path(CAS_PREFIX)
+        cutoff = time.time() - grace
+        orphans = []
+        for directory, subdirectories, files in os.walk(root):
+            for filename in files:
+                full_path = os.path.join(directory, filename)
+                name = os.path.relpath(full_path, storage.location).replace(os.sep, '/')
+                if name not in referenced and os.path.getmtime(full_path) < cutoff:
+                    orphans.append(name)
+        return orphans
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from pro.models import AcademicStanding, Student, ZERO, gpa_for
+
+
+class Command(BaseCommand):
+    help = "Recompute every student's credits, quality points and GPA from Grade rows and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only report drift; exit with an error if any is found.")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            expected = AcademicStanding.objects.compute_totals()
+            stored = {
+                student_id: (credits, quality_points, gpa)
+                for student_id, credits, quality_points, gpa in AcademicStanding.objects.values_list(
+                    'student_id', 'credits', 'quality_points', 'gpa',
+                ).iterator()
+            }
+            drift = 0
+            for student_id in Student.objects.values_list('id', flat=True).iterator():
+                credits, quality_points = expected.get(student_id, (0, ZERO))
+                wanted = (credits, quality_points, gpa_for(credits, quality_points))
+                if stored.get(student_id) != wanted:
+                    self.stdout.write(f"Drift for student {student_id}: stored {stored.get(student_id)}, expected {wanted}")
+                    drift += 1
+            if drift:
+                raise CommandError(f"{drift} drifted academic standing rows.")
+            self.stdout.write(self.style.SUCCESS("Academic standing is consistent."))
+            return
+
+        with transaction.atomic():
+            refreshed = AcademicStanding.objects.refresh()
+        self.stdout.write(self.style.SUCCESS(f"Recomputed academic standing for {refreshed} students."))
@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from pro.outbox import deliver_batch
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbox emails in batches, reusing one mail connection per batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--max-attempts', type=int, default=None, help="Defaults to settings.OUTBOX_MAX_ATTEMPTS.")
+        parser.add_argument('--loop', action='store_true', help="Keep running and poll for new messages.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep between polls when idle.")
+
+    def handle(self, *args, **options):
+        while True:
+            attempted = deliver_batch(options['batch_size'], options['max_attempts'])
+            if attempted:
+                self.stdout.write(f"Attempted {attempted} messages.")
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
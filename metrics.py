@@ -0,0 +1,177 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+
+#########################################################################################################
+                                        #REQUEST METRICS#
+#########################################################################################################
+
+# RequestMetricsMiddleware collects one RequestMetrics per request and records it here. Each URL
+# name keeps its last REQUEST_METRICS_WINDOW samples per metric; percentiles are computed from that
+# rolling window when they are read. The count and sum of every sample ever recorded are kept next
+# to it, because Prometheus expects a summary's _count and _sum to only go up. Both live in process
+# memory, so every worker reports its own traffic.
+
+QUANTILES = (0.5, 0.95, 0.99)
+# metric -> Prometheus help text
+METRICS = {
+    'total': "Total time spent handling the request, in milliseconds.",
+    'db': "Time spent in SQL queries, in milliseconds.",
+    'queries': "Number of SQL queries run.",
+    'duplicates': "Number of SQL queries that repeated an earlier identical query.",
+    'template': "Time spent rendering templates, in milliseconds.",
+}
+
+_current = ContextVar('request_metrics', default=None)
+_lock = threading.Lock()
+_samples = defaultdict(lambda: defaultdict(lambda: deque(maxlen=_window())))
+# url_name -> metric -> [count, sum] since the process started (or the last reset())
+_totals = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+
+
+def _window():
+    return getattr(settings, 'REQUEST_METRICS_WINDOW', 1000)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.db = 0.0
+        self.queries = 0
+        self.duplicates = 0
+        self.template = 0.0
+        self._seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook: time the query and spot repeats."""
+        key = (sql, repr(params))
+        if key in self._seen:
+            self.duplicates += 1
+        else:
+            self._seen.add(key)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += (time.perf_counter() - started) * 1000
+            self.queries += 1
+
+    def finish(self):
+        self.total = (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        return ', '.join([
+            f'total;dur={self.total:.1f}',
+            f'db;dur={self.db:.1f};desc="{self.queries} queries"',
+            f'dup;desc="{self.duplicates} repeated queries"',
+            f'tpl;dur={self.template:.1f}',
+        ])
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def record(url_name, metrics):
+    with _lock:
+        samples = _samples[url_name]
+        totals = _totals[url_name]
+        for metric in METRICS:
+            value = getattr(metrics, metric)
+            samples[metric].append(value)
+            totals[metric][0] += 1
+            totals[metric][1] += value
+
+
+def percentile(values, quantile):
+    """Nearest-rank percentile of an already sorted list."""
+    return values[max(0, math.ceil(quantile * len(values)) - 1)]
+
+
+def snapshot():
+    """
+    Return {url_name: {metric: {'count': n, 'sum': s, quantile: value, ...}}}. The count and sum
+    cover every recorded request; the quantiles only the rolling window.
+    """
+    with _lock:
+        copied = {url_name: {metric: sorted(values) for metric, values in samples.items()} for url_name, samples in _samples.items()}
+        totals = {url_name: {metric: tuple(total) for metric, total in metrics.items()} for url_name, metrics in _totals.items()}
+    summary = {}
+    for url_name, samples in copied.items():
+        summary[url_name] = {}
+        for metric, values in samples.items():
+            if not values:
+                continue
+            count, total = totals[url_name][metric]
+            stats = {'count': count, 'sum': total}
+            stats.update({quantile: percentile(values, quantile) for quantile in QUANTILES})
+            summary[url_name][metric] = stats
+    return summary
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus():
+    """Prometheus summaries, one per metric, labelled by URL name: cumulative _count and _sum, quantiles over the window."""
+    summary = snapshot()
+    lines = []
+    for metric, help_text in METRICS.items():
+        name = f'pro_request_{metric}'
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} summary')
+        for url_name, metrics in sorted(summary.items()):
+            stats = metrics.get(metric)
+            if stats is None:
+                continue
+            label = f'url_name="{_label(url_name)}"'
+            for quantile in QUANTILES:
+                lines.append(f'{name}{{{label},quantile="{quantile}"}} {stats[quantile]:g}')
+            lines.append(f'{name}_sum{{{label}}} {stats["sum"]:g}')
+            lines.append(f'{name}_count{{{label}}} {stats["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+#########################################################################################################
+                                        #TEMPLATE TIMING#
+#########################################################################################################
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template += (time.perf_counter() - started) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates that adds each top-level render to the current request's template time."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
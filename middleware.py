@@ -1,18 +1,77 @@
 import time
+from django.conf import settings
+from django.contrib.auth import logout
+from django.db import connection
 from django.shortcuts import redirect
 from django.utils.deprecation import MiddlewareMixin
+from . import metrics
+
+END_OF_STREAM = object()
 
 class InactivityTimeoutMiddleware(MiddlewareMixin):
     def process_request(self, request):
-        timeout_duration = 300  # 5 minutes in seconds
+        timeout_duration = getattr(settings, 'INACTIVITY_TIMEOUT', 300)
+        # The timestamp is only rewritten once it is this many seconds old, so most requests
+        # leave the session unmodified and cause no session write at all.
+        write_granularity = getattr(settings, 'INACTIVITY_WRITE_GRANULARITY', 60)
         current_time = time.time()
 
         if request.user.is_authenticated:
-            last_activity = request.session.get('last_activity', current_time)
-            time_since_last_activity = current_time - last_activity
+            last_activity = request.session.get('last_activity')
+            time_since_last_activity = current_time - last_activity if last_activity is not None else 0
 
             if time_since_last_activity > timeout_duration:
+                logout(request)
                 return redirect('register_or_login')
 
-            request.session['last_activity'] = current_time
+            if last_activity is None or time_since_last_activity >= write_granularity:
+                request.session['last_activity'] = current_time
         return None
+
+
+class RequestMetricsMiddleware:
+    """
+    Time each request and count its SQL queries, repeated queries and template rendering,
+    report them in a Server-Timing header and add them to the per-URL rolling windows in metrics.py.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics, token = metrics.start_request()
+        try:
+            with connection.execute_wrapper(request_metrics):
+                response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        request_metrics.finish()
+
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        # The header goes out before a streaming body is produced, so it can only describe the view.
+        response.headers['Server-Timing'] = request_metrics.server_timing()
+        if response.streaming and getattr(response, 'file_to_stream', None) is None:
+            response.streaming_content = self.measured_stream(response.streaming_content, view_name, request_metrics)
+        else:
+            metrics.record(view_name, request_metrics)
+        return response
+
+    @staticmethod
+    def measured_stream(chunks, view_name, request_metrics):
+        """
+        CSV exports and ZIP archives run their queries while the server iterates the body, after
+        this middleware has returned. Count the queries behind each chunk and record the sample
+        once the stream is exhausted or closed. FileResponse is left alone so it keeps sendfile().
+        """
+        chunks = iter(chunks)
+        try:
+            while True:
+                with connection.execute_wrapper(request_metrics):
+                    chunk = next(chunks, END_OF_STREAM)
+                if chunk is END_OF_STREAM:
+                    break
+                yield chunk
+        finally:
+            request_metrics.finish()
+            metrics.record(view_name, request_metrics)
@@ -1,13 +1,82 @@
-from django.db import models
-import uuid
-from django.utils.html import format_html
+from decimal import Decimal
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.core.cache import caches
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
 from django.utils import timezone
+from .storage import digest_from_name, is_content_addressed, submission_storage
 
 
+ZERO = Decimal('0.00')
+
+# Letter grade -> grade points. Letters missing here (such as 'None') carry no credit and no points.
+DEFAULT_GRADE_POINTS = {'A': 4.0, 'B': 3.0, 'C': 2.0, 'D': 1.0, 'F': 0.0}
+
+def shared_cache():
+    """
+    The cache every worker process shares (DASHBOARD_CACHE_ALIAS). Entries that signals.py drops on
+    writes must live here: dropping them from a per-process cache leaves the other workers stale.
+    """
+    return caches[getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')]
+
+
+# Rendered admin rosters are cached per instructor in shared_cache() and dropped by signals.py when
+# enrollments change.
+ROSTER_PREVIEW_SIZE = 10
+ROSTER_CACHE_TIMEOUT = 60 * 60
+
+
+def roster_cache_key(instructor_id):
+    return f'pro:instructor-roster:{instructor_id}'
+
 #########################################################################################################################################################
 #########################################################################################################################################################
 
 
+UNIVERSITY_EMAIL_DOMAIN = 'stu.uni.edu'
+
+
+def student_id_prefix(major):
+    return ''.join(e for e in major if e.isalnum())[:3].upper()
+
+
+def format_student_id(prefix, number):
+    return f"{prefix}{number:05d}"
+
+
+def university_email_for(student_id):
+    return f"{student_id}@{UNIVERSITY_EMAIL_DOMAIN}"
+
+
+class StudentIdSequenceManager(models.Manager):
+    def reserve(self, prefix, count=1):
+        """Reserve `count` consecutive numbers for `prefix` and return the first of them."""
+        with transaction.atomic():
+            # Bumping the counter before reading it takes the row (or, on SQLite, database)
+            # write lock, so concurrent callers can never be handed the same block.
+            if not self.filter(prefix=prefix).update(next_value=F('next_value') + count):
+                try:
+                    with transaction.atomic():
+                        self.create(prefix=prefix, next_value=1 + count)
+                    return 1
+                except IntegrityError:
+                    self.filter(prefix=prefix).update(next_value=F('next_value') + count)
+            next_value = self.filter(prefix=prefix).values_list('next_value', flat=True).get()
+        return next_value - count
+
+
+class StudentIdSequence(models.Model):
+    prefix = models.CharField(max_length=3, unique=True)
+    next_value = models.PositiveIntegerField(default=1)
+
+    objects = StudentIdSequenceManager()
+
+    def __str__(self):
+        return f"{self.prefix}: next {self.next_value}"
+
 class Student(models.Model):
     name = models.CharField(max_length=100)
     dob = models.DateField(verbose_name='Date of Birth')
@@ -17,20 +86,26 @@ class Student(models.Model):
     university_email = models.EmailField(blank=True, null=True, unique=True)
     registration_date = models.DateTimeField(default=timezone.now)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored major so save() can spot a change without re-fetching the row.
+        # A deferred major is not remembered, and save() then treats it as unchanged.
+        if 'major' in field_names:
+            instance._loaded_major = instance.major
+        return instance
+
     def save(self, *args, **kwargs):
-        if self.pk is not None:
-            orig = Student.objects.get(pk=self.pk)
-            major_changed = orig.major != self.major
-        else:
-            major_changed = True
+        major_changed = self._state.adding or (hasattr(self, '_loaded_major') and self.major != self._loaded_major)
 
         if major_changed and self.major:
-            random_part = str(uuid.uuid4())[:4]
-            major_part = ''.join(e for e in self.major if e.isalnum())[:3].upper()
-            self.student_id = f"{major_part}{random_part}"
-            self.university_email = f"{self.student_id}@stu.uni.edu"
+            prefix = student_id_prefix(self.major)
+            self.student_id = format_student_id(prefix, StudentIdSequence.objects.reserve(prefix))
+            self.university_email = university_email_for(self.student_id)
 
         super(Student, self).save(*args, **kwargs)
+        if 'major' in self.__dict__:
+            self._loaded_major = self.major
 
     def __str__(self):
         return self.name
@@ -44,23 +119,42 @@ class Instructor(models.Model):
         return self.full_name
 
     def enrolled_students(self):
-        enrollments = self.enrollments.all()
-        if not enrollments:
-            return "No students enrolled"
-        rows = ''.join(
-            f"<tr><td>{enrollment.student.name}</td><td>{enrollment.student.student_id}</td><td>{enrollment.student.university_email}</td></tr>"
-            for enrollment in enrollments
-        )
-        table = f"<table><thead><tr><th>Name</th><th>ID</th><th>Email</th></tr></thead><tbody>{rows}</tbody></table>"
-        return format_html(table)
+        key = roster_cache_key(self.pk)
+        roster = shared_cache().get(key)
+        if roster is None:
+            roster = self.render_roster()
+            shared_cache().set(key, roster, ROSTER_CACHE_TIMEOUT)
+        return roster
 
     enrolled_students.short_description = "Students Enrolled"
 
+    def render_roster(self):
+        # InstructorAdmin prefetches `roster_preview` and annotates `roster_size` for the whole page.
+        preview = getattr(self, 'roster_preview', None)
+        if preview is None:
+            preview = list(self.enrollments.select_related('student').order_by('student__name', 'pk')[:ROSTER_PREVIEW_SIZE])
+        size = getattr(self, 'roster_size', None)
+        if size is None:
+            size = len(preview) if len(preview) < ROSTER_PREVIEW_SIZE else self.enrollments.count()
+        if not size:
+            return "No students enrolled"
+
+        rows = format_html_join(
+            '', "<tr><td>{}</td><td>{}</td><td>{}</td></tr>",
+            ((enrollment.student.name, enrollment.student.student_id, enrollment.student.university_email) for enrollment in preview),
+        )
+        table = format_html("<table><thead><tr><th>Name</th><th>ID</th><th>Email</th></tr></thead><tbody>{}</tbody></table>", rows)
+        if size > len(preview):
+            url = reverse('admin:pro_enrollment_changelist') + f'?instructor__id__exact={self.pk}'
+            table = format_html('{}<a href="{}">View all {} enrolled students</a>', table, url, size)
+        return table
+
 class Course(models.Model):
     code = models.CharField(max_length=10, unique=True)
     name = models.CharField(max_length=100)
     credit_hours = models.IntegerField()
     instructor = models.ForeignKey(Instructor, on_delete=models.CASCADE)
+    faculty = models.CharField(max_length=100, blank=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -70,6 +164,16 @@ class Enrollment(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     instructor = models.ForeignKey(Instructor, on_delete=models.CASCADE, related_name='enrollments')
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'course'], name='unique_enrollment_per_course'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Keep the fee ledger update (see signals.py) in the same transaction as the row.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.student.name} enrolled in {self.course.name} under {self.instructor.full_name}"
 
@@ -77,37 +181,213 @@ class Fee(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Fee for {self.course.name}: {self.amount}"
 
+def _student_sum(queryset, field):
+    money = DecimalField(max_digits=12, decimal_places=2)
+    total = queryset.filter(student_id=OuterRef('student_id')).values('student_id').annotate(total=Sum(field)).values('total')
+    return Coalesce(Subquery(total, output_field=money), Value(ZERO), output_field=money)
+
+
+class StudentFeeManager(models.Manager):
+    def compute_totals(self, student_ids=None):
+        """Return {student_id: (fee_total, paid_total)} summed from the Fee and Payment rows."""
+        enrollments = Enrollment.objects.all()
+        payments = Payment.objects.all()
+        if student_ids is not None:
+            enrollments = enrollments.filter(student_id__in=student_ids)
+            payments = payments.filter(student_id__in=student_ids)
+
+        fees = dict(enrollments.values('student_id').annotate(total=Sum('course__fee__amount')).values_list('student_id', 'total'))
+        paid = dict(payments.values('student_id').annotate(total=Sum('amount')).values_list('student_id', 'total'))
+        return {
+            student_id: (fees.get(student_id) or ZERO, paid.get(student_id) or ZERO)
+            for student_id in set(fees) | set(paid)
+        }
+
+    def live_totals(self):
+        """Correlated Sum subqueries over Fee and Payment, for use in annotate() or update()."""
+        return {
+            'fee_total': _student_sum(Enrollment.objects.all(), 'course__fee__amount'),
+            'paid_total': _student_sum(Payment.objects.all(), 'amount'),
+        }
+
+    def refresh(self, student_ids):
+        """Recompute the stored totals of the given students with a single UPDATE."""
+        student_ids = {student_id for student_id in student_ids if student_id is not None}
+        if not student_ids:
+            return 0
+        return self.filter(student_id__in=student_ids).update(**self.live_totals())
+
+
 class StudentFee(models.Model):
     student = models.OneToOneField(Student, on_delete=models.CASCADE, related_name='student_fee')
+    # Running totals maintained by signals.py; rebuild with `manage.py rebuild_fee_ledger`.
+    fee_total = models.DecimalField(max_digits=12, decimal_places=2, default=ZERO, editable=False)
+    paid_total = models.DecimalField(max_digits=12, decimal_places=2, default=ZERO, editable=False)
+
+    objects = StudentFeeManager()
 
     def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.fee_total, self.paid_total = StudentFee.objects.compute_totals([self.student_id]).get(self.student_id, (ZERO, ZERO))
         super().save(*args, **kwargs)
 
     @property
     def total_fee(self):
-        return sum(fee.amount for fee in Fee.objects.filter(course__enrollment__student=self.student))
+        return self.fee_total
 
     @property
     def total_paid(self):
-        return sum(payment.amount for payment in Payment.objects.filter(student=self.student))
+        return self.paid_total
 
     @property
     def remaining_balance(self):
-        return self.total_fee - self.total_paid
+        return self.fee_total - self.paid_total
 
     def __str__(self):
         return f"Total fee for {self.student.name}"
 
+def grade_points():
+    return getattr(settings, 'GRADE_POINTS', DEFAULT_GRADE_POINTS)
+
+
+def grade_points_expression(field='grade'):
+    """The points of `field` as a SQL CASE over GRADE_POINTS; NULL for letters that do not count."""
+    return Case(
+        *(When(**{field: letter}, then=Value(Decimal(str(points)))) for letter, points in grade_points().items()),
+        default=Value(None),
+        output_field=DecimalField(max_digits=4, decimal_places=2),
+    )
+
+
+class AcademicStandingManager(models.Manager):
+    def compute_totals(self, student_ids=None):
+        """
+        Return {student_id: (credits, quality_points)} for students with graded courses, from one
+        grouped aggregate over Grade joined to Course.
+        """
+        grades = Grade.objects.filter(grade__in=list(grade_points()))
+        if student_ids is not None:
+            grades = grades.filter(student_id__in=student_ids)
+        totals = grades.values('student_id').annotate(
+            credits=Sum('course__credit_hours'),
+            quality_points=Sum(
+                ExpressionWrapper(F('course__credit_hours') * grade_points_expression(), output_field=DecimalField()),
+            ),
+        ).order_by().values_list('student_id', 'credits', 'quality_points')
+        return {
+            student_id: (credits or 0, Decimal(quality_points or 0).quantize(ZERO))
+            for student_id, credits, quality_points in totals
+        }
+
+    def refresh(self, student_ids=None, create=True):
+        """
+        Recompute and upsert the standing of the given students (everyone when None). With
+        create=False only existing rows are touched, which keeps a cascade delete of a student
+        from recreating the standing row it has just removed.
+        """
+        if student_ids is not None:
+            student_ids = {student_id for student_id in student_ids if student_id is not None}
+            if not create:
+                student_ids = set(self.filter(student_id__in=student_ids).values_list('student_id', flat=True))
+            if not student_ids:
+                return 0
+        totals = self.compute_totals(student_ids)
+        if student_ids is None:
+            student_ids = Student.objects.values_list('id', flat=True)
+        standings = [
+            AcademicStanding(student_id=student_id, credits=credits, quality_points=quality_points, gpa=gpa_for(credits, quality_points))
+            for student_id in student_ids
+            for credits, quality_points in [totals.get(student_id, (0, ZERO))]
+        ]
+        self.bulk_create(
+            standings,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['student'],
+            update_fields=['credits', 'quality_points', 'gpa'],
+        )
+        return len(standings)
+
+    def honour_roll(self):
+        return self.filter(gpa__gte=getattr(settings, 'HONOUR_ROLL_GPA', 3.5)).order_by('-gpa')
+
+    def probation(self):
+        return self.filter(gpa__lt=getattr(settings, 'PROBATION_GPA', 2.0)).order_by('gpa')
+
+
+def gpa_for(credits, quality_points):
+    if not credits:
+        return None
+    return (quality_points / credits).quantize(ZERO)
+
+
+class AcademicStanding(models.Model):
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, related_name='academic_standing')
+    # Maintained by signals.py from Grade rows; rebuild with `manage.py recompute_gpa`.
+    credits = models.PositiveIntegerField(default=0, editable=False)
+    quality_points = models.DecimalField(max_digits=8, decimal_places=2, default=ZERO, editable=False)
+    # Credit-weighted; None until the student has a graded course.
+    gpa = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True, editable=False, db_index=True)
+
+    objects = AcademicStandingManager()
+
+    def __str__(self):
+        return f"{self.student.name}: GPA {self.gpa if self.gpa is not None else '-'} over {self.credits} credits"
+
+class StoredFileManager(models.Manager):
+    def add_reference(self, name):
+        if not is_content_addressed(name):
+            return
+        with transaction.atomic():
+            if self.filter(name=name).update(ref_count=F('ref_count') + 1):
+                return
+            try:
+                with transaction.atomic():
+                    self.create(name=name, digest=digest_from_name(name), size=submission_storage().size(name), ref_count=1)
+            except IntegrityError:
+                self.filter(name=name).update(ref_count=F('ref_count') + 1)
+
+    def release(self, name):
+        """Drop one reference; the file itself is deleted once the last reference is committed away."""
+        if not is_content_addressed(name):
+            return
+        self.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        if self.filter(name=name, ref_count=0).delete()[0]:
+            transaction.on_commit(lambda: self.delete_if_unreferenced(name))
+
+    def delete_if_unreferenced(self, name):
+        # An identical upload may have claimed the file again since the release.
+        if not self.filter(name=name).exists():
+            submission_storage().delete(name)
+
+
+class StoredFile(models.Model):
+    """One file in the content-addressed store and the number of rows that point at it."""
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = StoredFileManager()
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
 class Assignment(models.Model):
     title = models.CharField(max_length=100)
     description = models.TextField()
     due_date = models.DateTimeField()
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     instructor = models.ForeignKey(Instructor, on_delete=models.CASCADE)
-    reference_document = models.FileField(upload_to='assignments/', null=True, blank=True)
+    reference_document = models.FileField(upload_to='assignments/', storage=submission_storage, null=True, blank=True)
 
     def __str__(self):
         return self.title
@@ -115,9 +395,14 @@ class Assignment(models.Model):
 class AssignmentSubmission(models.Model):
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE)
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
-    submission_file = models.FileField(upload_to='submissions/')
+    submission_file = models.FileField(upload_to='submissions/', storage=submission_storage)
     submitted_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['assignment', 'student'], name='submission_assign_student_idx'),
+        ]
+
     def __str__(self):
         return f"{self.student.name} - {self.assignment.title}"
 
@@ -126,6 +411,11 @@ class Announcement(models.Model):
     content = models.TextField()
     instructor = models.ForeignKey(Instructor, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the announcement is posted and cleared once notifications.fan_out_announcement has run.
+    fanout_pending = models.BooleanField(default=False, editable=False)
+    # Instructors delete announcements by setting this; the row stays so the notifications that
+    # reference it keep their text.
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.title
@@ -136,6 +426,10 @@ class Payment(models.Model):
     date = models.DateTimeField(auto_now_add=True)
     transaction_id = models.CharField(max_length=20, unique=True)
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Payment of {self.amount} by {self.student.name} on {self.date}"
 
@@ -144,6 +438,11 @@ class Grade(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     grade = models.CharField(max_length=2)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'course'], name='unique_grade_per_course'),
+        ]
+
     def __str__(self):
         return f'{self.student.name} - {self.course.name} - {self.grade}'
 
@@ -157,20 +456,159 @@ class SentEmail(models.Model):
     message = models.TextField()
     sent_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['sender_student', '-sent_at', '-id'], name='sentemail_student_recent_idx'),
+            models.Index(fields=['sender_instructor', '-sent_at', '-id'], name='sentemail_instr_recent_idx'),
+        ]
+
     def __str__(self):
         return f"{self.subject} - {self.sent_at}"
-    
+
+class OutboxEmail(models.Model):
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENDING, 'Sending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    sent_email = models.ForeignKey(SentEmail, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbox_messages')
+    from_email = models.CharField(max_length=255)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # While SENDING, next_attempt_at is when the claim lapses and another worker may retry the row.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.UUIDField(null=True, blank=True, editable=False)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipient} ({self.status})"
+
 class Notification(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
     instructor = models.ForeignKey(Instructor, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
+    announcement = models.ForeignKey(Announcement, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
     subject = models.CharField(max_length=255)
-    message = models.TextField()
+    message = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', '-created_at', '-id'], name='notification_stud_recent_idx'),
+            models.Index(fields=['instructor', '-created_at', '-id'], name='notification_instr_recent_idx'),
+            # Only read notifications are archived, so the retention job scans this partial index.
+            models.Index(fields=['created_at', 'id'], condition=Q(is_read=True), name='notification_read_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'announcement'], name='unique_announcement_notification'),
+        ]
+
+    @property
+    def body(self):
+        # Announcement notifications reference the announcement instead of copying its content.
+        return self.announcement.content if self.announcement_id else self.message
+
     def __str__(self):
         return f"{self.subject} - {self.created_at}"
 
+# A notification belongs to a student or to an instructor; counters are kept per owner field.
+NOTIFICATION_OWNERS = ('student', 'instructor')
+
+class NotificationCounterManager(models.Manager):
+    def compute_totals(self, owner, owner_ids=None):
+        """Return {owner_id: unread} for the students or instructors with unread notifications, from one grouped count."""
+        notifications = Notification.objects.filter(is_read=False, **{f'{owner}__isnull': False})
+        if owner_ids is not None:
+            notifications = notifications.filter(**{f'{owner}_id__in': owner_ids})
+        return dict(
+            notifications.values(f'{owner}_id').annotate(unread=Count('id')).order_by().values_list(f'{owner}_id', 'unread')
+        )
+
+    def refresh(self, owner, owner_ids=None, create=True):
+        """
+        Recount and upsert the counters of the given students or instructors (all of them when
+        None). With create=False only existing counters are touched, as for AcademicStanding.
+        """
+        if owner_ids is not None:
+            owner_ids = {owner_id for owner_id in owner_ids if owner_id is not None}
+            if not create:
+                owner_ids = set(self.filter(**{f'{owner}_id__in': owner_ids}).values_list(f'{owner}_id', flat=True))
+            if not owner_ids:
+                return 0
+        totals = self.compute_totals(owner, owner_ids)
+        if owner_ids is None:
+            owner_ids = self.model._meta.get_field(owner).related_model.objects.values_list('id', flat=True)
+        counters = [NotificationCounter(**{f'{owner}_id': owner_id, 'unread': totals.get(owner_id, 0)}) for owner_id in owner_ids]
+        self.bulk_create(counters, batch_size=500, update_conflicts=True, unique_fields=[owner], update_fields=['unread'])
+        return len(counters)
+
+    def adjust(self, owner, owner_id, delta):
+        """Add `delta` to one counter with a single UPDATE. A missing counter is created by recounting."""
+        if owner_id is None or not delta:
+            return
+        if self.filter(**{f'{owner}_id': owner_id}).update(unread=Greatest(F('unread') + delta, 0)) or delta < 0:
+            return
+        self.refresh(owner, [owner_id])
+
+    def unread(self, owner, owner_id):
+        return self.filter(**{f'{owner}_id': owner_id}).values_list('unread', flat=True).first() or 0
+
+
+class NotificationCounter(models.Model):
+    """The unread notifications of one student or one instructor, so a badge is one indexed read."""
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, null=True, blank=True, related_name='notification_counter')
+    instructor = models.OneToOneField(Instructor, on_delete=models.CASCADE, null=True, blank=True, related_name='notification_counter')
+    # Maintained by signals.py and notifications.py; rebuild with `manage.py rebuild_notification_counters`.
+    unread = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = NotificationCounterManager()
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(student__isnull=False, instructor__isnull=True) | Q(student__isnull=True, instructor__isnull=False),
+                name='notification_counter_one_owner',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.student or self.instructor}: {self.unread} unread"
+
+
+class ArchivedNotification(models.Model):
+    """A read notification moved out of Notification by `manage.py archive_notifications`."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, null=True, blank=True, related_name='archived_notifications')
+    instructor = models.ForeignKey(Instructor, on_delete=models.CASCADE, null=True, blank=True, related_name='archived_notifications')
+    announcement = models.ForeignKey(Announcement, on_delete=models.CASCADE, null=True, blank=True, related_name='archived_notifications')
+    subject = models.CharField(max_length=255)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', '-created_at', '-id'], name='archived_stud_recent_idx'),
+            models.Index(fields=['instructor', '-created_at', '-id'], name='archived_instr_recent_idx'),
+        ]
+
+    @property
+    def body(self):
+        return self.announcement.content if self.announcement_id else self.message
+
+    def __str__(self):
+        return f"{self.subject} - {self.created_at} (archived)"
+
 
 class Schedule(models.Model):
     DAY_OF_WEEK_CHOICES = [
@@ -192,11 +630,82 @@ class Schedule(models.Model):
         return f"{self.course.name} on {self.get_day_of_week_display()} from {self.start_time} to {self.end_time}"
     
 class Attendance(models.Model):
+    STATUS_CHOICES = [('Present', 'Present'), ('Absent', 'Absent')]
+
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE)
     date = models.DateField()
-    status = models.CharField(max_length=10, choices=[('Present', 'Present'), ('Absent', 'Absent')])
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', 'date'], name='attendance_course_date_idx'),
+        ]
+        constraints = [
+            # One mark per student per session; attendance.record_attendance upserts on this key.
+            models.UniqueConstraint(fields=['student', 'schedule', 'date'], name='unique_attendance_per_session'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Keep the rollup update (see signals.py) in the same transaction as the row.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.student} - {self.course} - {self.schedule} - {self.date} - {self.status}"
+
+
+class AttendanceRollupQuerySet(models.QuerySet):
+    def with_rates(self):
+        """Annotate `total` and `rate` (present / total, 0 to 1; None before the first session)."""
+        total = F('present') + F('absent')
+        return self.annotate(
+            total=total,
+            rate=Case(
+                When(present=0, absent=0, then=Value(None)),
+                default=ExpressionWrapper(Cast('present', FloatField()) / total, output_field=FloatField()),
+                output_field=FloatField(),
+            ),
+        )
+
+
+class AttendanceCourseRollup(models.Model):
+    """Present/absent counts per student per course, kept current by attendance.py and signals.py."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='attendance_rollups')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='attendance_rollups')
+    present = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+
+    objects = AttendanceRollupQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Leading with course also serves the per-course at-risk lookups.
+            models.UniqueConstraint(fields=['course', 'student'], name='unique_attendance_course_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.student} in {self.course}: {self.present} present, {self.absent} absent"
+
+
+class AttendanceSessionRollup(models.Model):
+    """Present/absent counts per scheduled session (schedule and date)."""
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, related_name='attendance_rollups')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='session_rollups')
+    date = models.DateField()
+    present = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+
+    objects = AttendanceRollupQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', '-date'], name='session_rollup_course_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['schedule', 'date'], name='unique_attendance_session_rollup'),
+        ]
 
     def __str__(self):
-        return f"{self.student} - {self.course} - {self.schedule} - {self.date} - {self.status}"
\ No newline at end of file
+        return f"{self.schedule} on {self.date}: {self.present} present, {self.absent} absent"
@@ -0,0 +1,147 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .dashboard import invalidate_student_snapshots
+from .models import Announcement, ArchivedNotification, Enrollment, Notification, NotificationCounter, Student
+
+logger = logging.getLogger(__name__)
+
+
+#########################################################################################################
+                                        #ANNOUNCEMENT FAN-OUT#
+#########################################################################################################
+
+FANOUT_CHUNK_SIZE = 500
+
+_fanout_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='announcement-fanout')
+
+
+def schedule_announcement_fanout(announcement):
+    """
+    Notify the announcement's audience once the current transaction commits.
+
+    With ANNOUNCEMENT_FANOUT_ASYNC (the default) the work runs on a background thread so the
+    instructor's request returns immediately; `manage.py fanout_announcements` picks up
+    anything a restarted process left pending.
+    """
+    announcement_id = announcement.pk
+    if getattr(settings, 'ANNOUNCEMENT_FANOUT_ASYNC', True):
+        transaction.on_commit(lambda: _fanout_executor.submit(_fan_out_in_background, announcement_id))
+    else:
+        transaction.on_commit(lambda: fan_out_announcement(announcement_id))
+
+
+def _fan_out_in_background(announcement_id):
+    try:
+        fan_out_announcement(announcement_id)
+    except Exception:
+        logger.exception("Fan-out of announcement %s failed; it stays pending.", announcement_id)
+    finally:
+        connection.close()
+
+
+def fan_out_announcement(announcement_id):
+    """Create one notification per enrolled student, in chunks. Safe to run more than once."""
+    announcement = Announcement.objects.filter(pk=announcement_id, fanout_pending=True).first()
+    if announcement is None:
+        return 0
+
+    # A student taking several of the instructor's courses still gets a single notification.
+    student_ids = list(
+        Enrollment.objects.filter(course__instructor_id=announcement.instructor_id)
+        .values_list('student_id', flat=True).distinct().order_by('student_id')
+    )
+    for start in range(0, len(student_ids), FANOUT_CHUNK_SIZE):
+        chunk = student_ids[start:start + FANOUT_CHUNK_SIZE]
+        with transaction.atomic():
+            Notification.objects.bulk_create(
+                [Notification(student_id=student_id, announcement=announcement, subject='New Announcement') for student_id in chunk],
+                ignore_conflicts=True,
+            )
+            # bulk_create sends no signals and skips conflicts silently, so recount the chunk's
+            # unread counters rather than adding to them; a rerun then cannot count twice.
+            NotificationCounter.objects.refresh('student', chunk)
+        # Nor does it drop the affected dashboard snapshots.
+        invalidate_student_snapshots(chunk)
+
+    Announcement.objects.filter(pk=announcement.pk).update(fanout_pending=False)
+    return len(student_ids)
+
+
+#########################################################################################################
+                                        #READ, DELETE AND ARCHIVE#
+#########################################################################################################
+
+# NotificationCounter holds each owner's unread count. signals.py keeps it current for saves and
+# deletes, including QuerySet.delete(), which sends post_delete for every row. Marking read is one
+# update(), which sends no signals, so mark_notifications_read adjusts the counter and snapshot itself.
+
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVED_FIELDS = ('student_id', 'instructor_id', 'announcement_id', 'subject', 'message', 'created_at')
+
+
+def owner_field(owner):
+    """'student' or 'instructor': the Notification field pointing at `owner`."""
+    return 'student' if isinstance(owner, Student) else 'instructor'
+
+
+def unread_count(owner):
+    return NotificationCounter.objects.unread(owner_field(owner), owner.pk)
+
+
+def mark_notifications_read(owner, ids=None):
+    """Mark the owner's unread notifications (only those in `ids`, if given) read with one UPDATE. Returns how many changed."""
+    field = owner_field(owner)
+    notifications = Notification.objects.filter(**{field: owner}, is_read=False)
+    if ids is not None:
+        notifications = notifications.filter(pk__in=ids)
+    with transaction.atomic():
+        marked = notifications.update(is_read=True)
+        NotificationCounter.objects.adjust(field, owner.pk, -marked)
+    if marked and field == 'student':
+        invalidate_student_snapshots([owner.pk])
+    return marked
+
+
+def delete_notifications(owner, ids):
+    """
+    Delete the owner's notifications in `ids` and return how many went. The post_delete receivers
+    in signals.py keep the unread counter and dashboard snapshot current.
+    """
+    field = owner_field(owner)
+    notifications = Notification.objects.filter(**{field: owner}, pk__in=ids)
+    deleted, _ = notifications.delete()
+    return deleted
+
+
+def archive_notifications(older_than_days=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move read notifications created more than `older_than_days` (NOTIFICATION_RETENTION_DAYS by
+    default) ago to ArchivedNotification, one batch per transaction so the live table is never
+    locked for long. Unread notifications stay whatever their age. Returns how many were moved.
+    """
+    if older_than_days is None:
+        older_than_days = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+                .order_by('created_at', 'id').values('id', *ARCHIVED_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+            ArchivedNotification.objects.bulk_create([
+                ArchivedNotification(**{field: row[field] for field in ARCHIVED_FIELDS}) for row in rows
+            ])
+            # The post_delete receivers drop the affected dashboard snapshots row by row; read
+            # notifications are in no unread counter.
+            Notification.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
+        if len(rows) < batch_size:
+            break
+    return moved
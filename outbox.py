@@ -0,0 +1,107 @@
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+from .models import OutboxEmail
+
+
+#########################################################################################################
+                                        #EMAIL OUTBOX#
+#########################################################################################################
+
+# Requests only write OutboxEmail rows; `manage.py send_outbox` delivers them in batches over
+# one mail connection per batch. A worker claims its batch with one conditional UPDATE before
+# sending and settles each message as soon as it is attempted, so several workers can run and a
+# crash resends at most the message that was in flight once its claim lapses.
+
+def queue_email(subject, body, from_email, recipient, sent_email=None):
+    """
+    Queue a message for `manage.py send_outbox`. Call it in the same transaction as the rows that
+    record the message (SentEmail, Notification), so they all commit or none do.
+    """
+    return OutboxEmail.objects.create(
+        sent_email=sent_email,
+        from_email=from_email,
+        recipient=recipient,
+        subject=subject,
+        body=body,
+    )
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'OUTBOX_RETRY_BASE_SECONDS', 30)
+    ceiling = getattr(settings, 'OUTBOX_RETRY_MAX_SECONDS', 60 * 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), ceiling))
+
+
+def claim_batch(batch_size=50):
+    """
+    Claim up to `batch_size` due messages for this worker and return them. Rows another worker
+    claimed in the meantime no longer match the UPDATE, so no message is claimed twice; a claim
+    not settled within OUTBOX_CLAIM_SECONDS makes its message due again.
+    """
+    now = timezone.now()
+    due = OutboxEmail.objects.filter(status__in=[OutboxEmail.PENDING, OutboxEmail.SENDING], next_attempt_at__lte=now)
+    ids = list(due.order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4()
+    lapses_at = now + timedelta(seconds=getattr(settings, 'OUTBOX_CLAIM_SECONDS', 10 * 60))
+    due.filter(pk__in=ids).update(status=OutboxEmail.SENDING, claimed_by=token, next_attempt_at=lapses_at)
+    return list(OutboxEmail.objects.filter(claimed_by=token).order_by('id'))
+
+
+def deliver_batch(batch_size=50, max_attempts=None):
+    """Claim and send up to `batch_size` due messages; return how many were attempted."""
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        for message in batch:
+            _record_failure(message, exc, max_attempts)
+    else:
+        try:
+            for message in batch:
+                try:
+                    EmailMessage(message.subject, message.body, message.from_email, [message.recipient], connection=connection).send()
+                except Exception as exc:
+                    _record_failure(message, exc, max_attempts)
+                else:
+                    message.attempts += 1
+                    message.status = OutboxEmail.SENT
+                    message.sent_at = timezone.now()
+                    message.last_error = ''
+                    _settle(message)
+        finally:
+            connection.close()
+    return len(batch)
+
+
+def _record_failure(message, exc, max_attempts):
+    message.attempts += 1
+    message.last_error = f"{type(exc).__name__}: {exc}"
+    if message.attempts >= max_attempts:
+        message.status = OutboxEmail.FAILED
+    else:
+        message.status = OutboxEmail.PENDING
+        message.next_attempt_at = timezone.now() + retry_delay(message.attempts)
+    _settle(message)
+
+
+def _settle(message):
+    """Save the outcome of one attempt and release the claim, unless the claim lapsed and was taken over."""
+    OutboxEmail.objects.filter(pk=message.pk, claimed_by=message.claimed_by).update(
+        status=message.status,
+        attempts=message.attempts,
+        next_attempt_at=message.next_attempt_at,
+        last_error=message.last_error,
+        sent_at=message.sent_at,
+        claimed_by=None,
+    )
@@ -0,0 +1,66 @@
+import base64
+import json
+from django.db.models import Q
+
+
+#########################################################################################################
+                                        #KEYSET PAGINATION#
+#########################################################################################################
+
+# Pages are addressed by the sort key of the last row already shown instead of an OFFSET,
+# so page N costs one index seek however deep into the table it is.
+
+PAGE_SIZE = 25
+
+
+def encode_cursor(values):
+    raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, fields):
+    """Turn a cursor back into field values; raises ValueError if it was tampered with."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor.") from exc
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise ValueError("Invalid cursor.")
+    try:
+        return [model._meta.get_field(field).to_python(value) for field, value in zip(fields, values)]
+    except Exception as exc:
+        raise ValueError("Invalid cursor.") from exc
+
+
+def keyset_page(queryset, ordering, cursor=None, size=PAGE_SIZE):
+    """
+    Return (rows, next_cursor) for the page after `cursor`.
+
+    `ordering` is a tuple of model fields that all sort in the same direction and
+    end with a unique column, e.g. ('-date', '-id').
+    """
+    fields = [field.lstrip('-') for field in ordering]
+    descending = ordering[0].startswith('-')
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor, queryset.model, fields)
+        queryset = queryset.filter(_seek(fields, values, descending))
+
+    rows = list(queryset[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_cursor([getattr(rows[-1], field) for field in fields])
+
+
+def _seek(fields, values, descending):
+    # (a, b) < (x, y)  <=>  a < x OR (a = x AND b < y)
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for position, field in enumerate(fields):
+        clause = Q(**{f'{field}__{lookup}': values[position]})
+        for equal_field, equal_value in zip(fields[:position], values[:position]):
+            clause &= Q(**{equal_field: equal_value})
+        condition |= clause
+    return condition
@@ -0,0 +1,43 @@
+from django.db.models import CharField, Value
+from .models import Instructor, Student
+
+
+#########################################################################################################
+                                        #ROLE RESOLUTION#
+#########################################################################################################
+
+# The user's profile is looked up once at login and kept in the session as [role, pk],
+# so the dashboards never have to search the Student/Instructor tables by email again.
+
+STUDENT = 'student'
+INSTRUCTOR = 'instructor'
+SESSION_ROLE_KEY = 'profile_role'
+
+
+def resolve_role(email):
+    """Return (role, pk) of the Student or Instructor with this email in one query, or None."""
+    if not email:
+        return None
+    students = Student.objects.filter(university_email=email).annotate(
+        role=Value(STUDENT, output_field=CharField()),
+    ).values_list('role', 'pk')
+    instructors = Instructor.objects.filter(email=email).annotate(
+        role=Value(INSTRUCTOR, output_field=CharField()),
+    ).values_list('role', 'pk')
+    # 'student' sorts after 'instructor': descending keeps the old student-first precedence.
+    match = students.union(instructors, all=True).order_by('-role').first()
+    return tuple(match) if match else None
+
+
+def remember_role(request, role):
+    request.session[SESSION_ROLE_KEY] = list(role)
+
+
+def session_role(request):
+    """Return (role, pk) for the logged-in user, resolving it once for sessions that predate login caching."""
+    role = request.session.get(SESSION_ROLE_KEY)
+    if role is None and request.user.is_authenticated:
+        role = resolve_role(request.user.email)
+        if role is not None:
+            remember_role(request, role)
+    return tuple(role) if role else (None, None)
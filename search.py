@@ -0,0 +1,185 @@
+import re
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import Announcement, Course, Enrollment, Instructor, SentEmail, Student
+from .roles import INSTRUCTOR, STUDENT
+
+
+#########################################################################################################
+                                        #FULL-TEXT SEARCH#
+#########################################################################################################
+
+# Each index is an SQLite FTS5 table over the model's own table (external content, so the text is
+# not stored twice). Triggers on the model table keep it in step with every write, including
+# bulk_create() and update(), which skip signals. The tables and triggers are created after migrate
+# (see signals.py) and rebuilt from scratch by `manage.py rebuild_search_index`. On other databases
+# search falls back to icontains over the same columns.
+
+# index -> model, indexed columns, and the columns a search result shows.
+SEARCH_INDEXES = {
+    'students': {
+        'model': Student,
+        'columns': ('name', 'student_id', 'university_email', 'faculty', 'major'),
+        'label': ('name', 'student_id'),
+    },
+    'instructors': {'model': Instructor, 'columns': ('full_name', 'email', 'department'), 'label': ('full_name', 'department')},
+    'courses': {'model': Course, 'columns': ('code', 'name', 'faculty'), 'label': ('code', 'name')},
+    'announcements': {'model': Announcement, 'columns': ('title', 'content'), 'label': ('title',)},
+    'messages': {
+        'model': SentEmail,
+        'columns': ('subject', 'message', 'recipient_email'),
+        'label': ('subject', 'recipient_email'),
+    },
+}
+# bm25() weights per column, in the order above; unlisted columns weigh 1.
+COLUMN_WEIGHTS = {'name': 10.0, 'full_name': 10.0, 'code': 10.0, 'student_id': 10.0, 'title': 5.0, 'subject': 5.0}
+TERM_RE = re.compile(r'\w+')
+MAX_TERMS = 8
+SEARCH_RESULTS_LIMIT = 20
+
+
+def index_table(index):
+    return f'pro_search_{index}'
+
+
+def search_enabled(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def match_expression(query):
+    """
+    An FTS5 MATCH string in which every word of `query` must appear as a prefix of some token,
+    or '' if `query` has no words. Punctuation is dropped, so user input cannot reach FTS5 syntax.
+    """
+    terms = TERM_RE.findall(query.lower())[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_schema(index):
+    """The CREATE statements for an index table and the triggers that keep it in sync."""
+    spec = SEARCH_INDEXES[index]
+    table, columns = index_table(index), spec['columns']
+    source = spec['model']._meta.db_table
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    delete_old = f"INSERT INTO {table}({table}, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f"INSERT INTO {table}(rowid, {names}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        f"{names}, content='{source}', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {source} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {source} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {names} ON {source} BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def create_search_indexes(using='default', rebuild=False):
+    """Create any missing index tables and triggers; with `rebuild`, reindex every row."""
+    if not search_enabled(using):
+        return
+    with connections[using].cursor() as cursor:
+        for index in SEARCH_INDEXES:
+            created = not _table_exists(cursor, index_table(index))
+            for statement in search_schema(index):
+                cursor.execute(statement)
+            if created or rebuild:
+                cursor.execute(f"INSERT INTO {index_table(index)}({index_table(index)}) VALUES ('rebuild')")
+
+
+def check_search_index(index, using='default'):
+    """True if the index matches its model table row for row."""
+    table = index_table(index)
+    with connections[using].cursor() as cursor:
+        if not _table_exists(cursor, table):
+            return False
+        try:
+            cursor.execute(f"INSERT INTO {table}({table}, rank) VALUES ('integrity-check', 1)")
+        except DatabaseError:
+            return False
+    return True
+
+
+def _table_exists(cursor, table):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [table])
+    return cursor.fetchone() is not None
+
+
+def matching(index, query, field='pk', using='default'):
+    """A Q() for rows whose `field` (a key into the index's model) matches `query`; matches nothing for an empty query."""
+    expression = match_expression(query)
+    if not expression:
+        return Q(pk__in=[])
+    if not search_enabled(using):
+        return _icontains(index, query, field)
+    table = index_table(index)
+    return Q(**{f'{field}__in': RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [expression])})
+
+
+def ranked(queryset, index, query, using='default'):
+    """`queryset` narrowed to rows matching `query`, best match first (bm25), with a search_rank attribute."""
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not search_enabled(using):
+        return queryset.filter(_icontains(index, query, 'pk'))
+    spec = SEARCH_INDEXES[index]
+    table, source = index_table(index), spec['model']._meta.db_table
+    weights = ', '.join(str(COLUMN_WEIGHTS.get(column, 1.0)) for column in spec['columns'])
+    # A join with the virtual table is the one place the ORM cannot express; extra() keeps the
+    # ranking in the same query as the caller's filters.
+    return queryset.extra(
+        tables=[table],
+        where=[f"{table}.rowid = {source}.id", f"{table} MATCH %s"],
+        params=[expression],
+        select={'search_rank': f"bm25({table}, {weights})"},
+        order_by=['search_rank'],
+    )
+
+
+def _icontains(index, query, field):
+    prefix = '' if field == 'pk' else field.rsplit('_id', 1)[0] + '__'
+    condition = Q()
+    for term in TERM_RE.findall(query)[:MAX_TERMS]:
+        term_condition = Q()
+        for column in SEARCH_INDEXES[index]['columns']:
+            term_condition |= Q(**{f'{prefix}{column}__icontains': term})
+        condition &= term_condition
+    return condition
+
+
+def search_scopes(role, profile_id, is_staff=False):
+    """index -> the rows of it this user may find. Students never search other students."""
+    if is_staff:
+        return {index: spec['model'].objects.all() for index, spec in SEARCH_INDEXES.items()}
+    if role == STUDENT:
+        return {
+            'courses': Course.objects.all(),
+            'instructors': Instructor.objects.all(),
+            'announcements': Announcement.objects.filter(
+                instructor__in=Course.objects.filter(enrollment__student_id=profile_id).values('instructor_id'),
+                deleted_at__isnull=True,
+            ),
+            'messages': SentEmail.objects.filter(Q(sender_student_id=profile_id) | Q(recipient_student_id=profile_id)),
+        }
+    if role == INSTRUCTOR:
+        return {
+            'students': Student.objects.filter(
+                pk__in=Enrollment.objects.filter(course__instructor_id=profile_id).values('student_id'),
+            ),
+            'courses': Course.objects.all(),
+            'instructors': Instructor.objects.all(),
+            'announcements': Announcement.objects.filter(instructor_id=profile_id, deleted_at__isnull=True),
+            'messages': SentEmail.objects.filter(Q(sender_instructor_id=profile_id) | Q(recipient_instructor_id=profile_id)),
+        }
+    return {}
+
+
+def search_results(scopes, query, limit=SEARCH_RESULTS_LIMIT):
+    """index -> up to `limit` best matches within each scope, as dicts of the label columns."""
+    results = {}
+    for index, queryset in scopes.items():
+        rows = ranked(queryset, index, query)[:limit].values('pk', *SEARCH_INDEXES[index]['label'])
+        results[index] = [{'id': row.pop('pk'), **row} for row in rows]
+    return results
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'pro.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,7 +66,8 @@ ROOT_URLCONF = 'fyp.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Times template rendering for RequestMetricsMiddleware's Server-Timing header.
+        'BACKEND': 'pro.metrics.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -91,6 +93,13 @@ DEFAULT_FROM_EMAIL = 'your_email@gmail.com'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'webmaster@localhost'
 
+# Outgoing mail is queued in pro.OutboxEmail and sent by `manage.py send_outbox --loop`.
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_MAX_SECONDS = 60 * 60
+# A worker's claim on a batch lapses after this long, so messages of a crashed worker are retried.
+OUTBOX_CLAIM_SECONDS = 10 * 60
+
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
@@ -102,6 +111,61 @@ DATABASES = {
 }
 
 
+# Caches
+# The student dashboard keeps one precomputed snapshot per student (see pro/dashboard.py); the
+# course catalog is cached in the same alias. Use a cache shared by all worker processes
+# (file-based, Redis, Memcached) in production, since writes drop these entries for every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'dashboard': {
+        'BACKEND': os.getenv('DASHBOARD_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('DASHBOARD_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache', 'dashboard')),
+        'TIMEOUT': None,
+    },
+}
+
+DASHBOARD_CACHE_ALIAS = 'dashboard'
+DASHBOARD_CACHE_TIMEOUT = 60 * 60
+
+# Announcement notifications are created on a background thread after the POST commits.
+ANNOUNCEMENT_FANOUT_ASYNC = True
+
+# Notifications shown on the student dashboard; the unread badge counts all of them.
+DASHBOARD_NOTIFICATIONS = 20
+# Read notifications older than this are moved to the archive by `manage.py archive_notifications`.
+NOTIFICATION_RETENTION_DAYS = 90
+
+# Samples kept per URL name and metric for the percentiles served at /metrics/.
+REQUEST_METRICS_WINDOW = 1000
+
+# Records are handed to a background thread (pro.logging_handlers), so logging never blocks a request.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {
+            'format': '{asctime} {levelname} {name} {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'background_console': {
+            'class': 'pro.logging_handlers.BackgroundStreamHandler',
+            'formatter': 'verbose',
+        },
+    },
+    'loggers': {
+        'pro': {
+            'handlers': ['background_console'],
+            'level': os.getenv('PRO_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -146,6 +210,37 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Assignment documents and submissions are stored once per unique content (see pro/storage.py).
+    'submissions': {'BACKEND': 'pro.storage.ContentAddressedStorage'},
+}
+
+# Uploads larger than MAX_UPLOAD_SIZE are dropped while they stream in, before they reach disk.
+MAX_UPLOAD_SIZE = 25 * 1024 * 1024
+
+# Protected downloads: None streams files from Django; 'x-accel-redirect' (nginx, serving
+# MEDIA_ACCEL_REDIRECT_LOCATION as an internal location aliased to MEDIA_ROOT) or 'x-sendfile'
+# (Apache mod_xsendfile, lighttpd) hands the transfer to the front-end server.
+MEDIA_SENDFILE_BACKEND = os.getenv('MEDIA_SENDFILE_BACKEND') or None
+MEDIA_ACCEL_REDIRECT_LOCATION = '/protected-media/'
+FILE_UPLOAD_HANDLERS = [
+    'pro.uploads.SizeLimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Students attending less than this share of at least ATTENDANCE_AT_RISK_MIN_SESSIONS sessions of
+# a course are listed as at risk on the instructor dashboard.
+ATTENDANCE_AT_RISK_RATE = 0.75
+ATTENDANCE_AT_RISK_MIN_SESSIONS = 3
+
+# Letter grade -> grade points for the credit-weighted GPA; other letters (such as 'None') do not count.
+GRADE_POINTS = {'A': 4.0, 'B': 3.0, 'C': 2.0, 'D': 1.0, 'F': 0.0}
+HONOUR_ROLL_GPA = 3.5
+PROBATION_GPA = 2.0
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -153,7 +248,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 SESSION_COOKIE_AGE = 300
-SESSION_SAVE_EVERY_REQUEST = True
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Sessions are only saved when modified; InactivityTimeoutMiddleware refreshes `last_activity`
+# (and with it the session expiry) at most once per INACTIVITY_WRITE_GRANULARITY seconds.
+SESSION_SAVE_EVERY_REQUEST = False
+# Sessions live in the database by default. cached_db serves reads from a cache, which is only safe
+# when every worker shares it: with the per-process 'default' LocMemCache a logout in one worker
+# leaves the others serving the old session. Set SESSION_CACHE_BACKEND and SESSION_CACHE_LOCATION
+# to a Redis or Memcached server to enable it.
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+if os.getenv('SESSION_CACHE_BACKEND'):
+    CACHES['sessions'] = {
+        'BACKEND': os.getenv('SESSION_CACHE_BACKEND'),
+        'LOCATION': os.getenv('SESSION_CACHE_LOCATION'),
+    }
+    SESSION_CACHE_ALIAS = 'sessions'
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+INACTIVITY_TIMEOUT = SESSION_COOKIE_AGE
+INACTIVITY_WRITE_GRANULARITY = 60
 CSRF_COOKIE_HTTPONLY = True
 
@@ -0,0 +1,292 @@
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+from .attendance import apply_attendance_changes
+from .catalog import invalidate_catalog
+from .dashboard import invalidate_student_snapshots
+from .feeds import bump_timetable_versions
+from .search import create_search_indexes
+from .timetable import invalidate_course_masks
+from .models import (
+    NOTIFICATION_OWNERS, AcademicStanding, Assignment, AssignmentSubmission, Attendance, Course, Enrollment, Fee, Grade,
+    Instructor, Notification, NotificationCounter, Payment, Schedule, SentEmail, StoredFile, Student, StudentFee,
+    roster_cache_key, shared_cache,
+)
+
+
+# Fields whose previous values the post_save handlers need when a row is edited.
+TRACKED_FIELDS = {
+    Enrollment: ('student_id', 'instructor_id'),
+    Payment: ('student_id',),
+    Fee: ('course_id',),
+    Assignment: ('reference_document',),
+    AssignmentSubmission: ('submission_file',),
+    Attendance: ('student_id', 'course_id', 'schedule_id', 'date', 'status'),
+    Grade: ('student_id',),
+    Course: ('credit_hours',),
+    Notification: ('student_id', 'instructor_id', 'is_read'),
+    Schedule: ('course_id',),
+}
+
+
+def _current_and_previous(instance, field):
+    return {getattr(instance, field), getattr(instance, '_previous_values', {}).get(field)}
+
+
+@receiver(pre_save, sender=Enrollment)
+@receiver(pre_save, sender=Payment)
+@receiver(pre_save, sender=Fee)
+@receiver(pre_save, sender=Assignment)
+@receiver(pre_save, sender=AssignmentSubmission)
+@receiver(pre_save, sender=Attendance)
+@receiver(pre_save, sender=Grade)
+@receiver(pre_save, sender=Course)
+@receiver(pre_save, sender=Notification)
+@receiver(pre_save, sender=Schedule)
+def remember_previous_values(sender, instance, raw=False, **kwargs):
+    # Only updates can move a row to another student/course, so creates skip the lookup.
+    if raw or instance._state.adding:
+        return
+    instance._previous_values = sender.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS[sender]).first() or {}
+
+
+#########################################################################################################
+                                        #STORED FILES#
+#########################################################################################################
+
+# Model -> its FileField on the content-addressed storage.
+STORED_FILE_FIELDS = {
+    Assignment: 'reference_document',
+    AssignmentSubmission: 'submission_file',
+}
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_save, sender=AssignmentSubmission)
+def count_file_references(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    field = STORED_FILE_FIELDS[sender]
+    current = getattr(instance, field).name or None
+    previous = None if created else getattr(instance, '_previous_values', {}).get(field) or None
+    if current != previous:
+        StoredFile.objects.add_reference(current)
+        StoredFile.objects.release(previous)
+
+
+@receiver(post_delete, sender=Assignment)
+@receiver(post_delete, sender=AssignmentSubmission)
+def release_file_references(sender, instance, **kwargs):
+    StoredFile.objects.release(getattr(instance, STORED_FILE_FIELDS[sender]).name or None)
+
+
+#########################################################################################################
+                                        #ATTENDANCE ROLLUPS#
+#########################################################################################################
+
+# record_attendance() moves the rollups itself; these cover rows saved or deleted one at a time.
+
+def _attendance_change(values, sign):
+    return (values['student_id'], values['course_id'], values['schedule_id'], values['date'], values['status'], sign)
+
+
+@receiver(post_save, sender=Attendance)
+def count_attendance(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    changes = [_attendance_change({field: getattr(instance, field) for field in TRACKED_FIELDS[Attendance]}, 1)]
+    previous = getattr(instance, '_previous_values', {})
+    if not created and previous:
+        changes.append(_attendance_change(previous, -1))
+    apply_attendance_changes(changes)
+
+
+@receiver(post_delete, sender=Attendance)
+def uncount_attendance(sender, instance, **kwargs):
+    apply_attendance_changes([_attendance_change({field: getattr(instance, field) for field in TRACKED_FIELDS[Attendance]}, -1)])
+
+
+#########################################################################################################
+                                        #FEE LEDGER#
+#########################################################################################################
+
+# Model -> the foreign key that decides which students' ledgers a row contributes to.
+LEDGER_OWNER_FIELDS = {
+    Enrollment: 'student_id',
+    Payment: 'student_id',
+    Fee: 'course_id',
+}
+
+
+def _ledger_students(sender, owner_ids):
+    owner_ids = {owner_id for owner_id in owner_ids if owner_id is not None}
+    if sender is Fee:
+        return set(Enrollment.objects.filter(course_id__in=owner_ids).values_list('student_id', flat=True))
+    return owner_ids
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=Fee)
+@receiver(post_delete, sender=Enrollment)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=Fee)
+def update_fee_ledger(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    owners = _current_and_previous(instance, LEDGER_OWNER_FIELDS[sender])
+    StudentFee.objects.refresh(_ledger_students(sender, owners))
+
+
+#########################################################################################################
+                                        #ACADEMIC STANDING#
+#########################################################################################################
+
+@receiver(post_save, sender=Grade)
+def update_academic_standing(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    AcademicStanding.objects.refresh(_current_and_previous(instance, 'student_id'))
+
+
+@receiver(post_delete, sender=Grade)
+def remove_from_academic_standing(sender, instance, **kwargs):
+    AcademicStanding.objects.refresh({instance.student_id}, create=False)
+
+
+@receiver(post_save, sender=Course)
+def update_course_standings(sender, instance, created=False, raw=False, **kwargs):
+    # Credit hours weight every grade in the course, so a change moves each graded student's GPA.
+    if created or raw or _current_and_previous(instance, 'credit_hours') == {instance.credit_hours}:
+        return
+    AcademicStanding.objects.refresh(Grade.objects.filter(course=instance).values_list('student_id', flat=True))
+
+
+#########################################################################################################
+                                        #TIMETABLES AND CATALOG#
+#########################################################################################################
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+def invalidate_timetable_masks(sender, instance, raw=False, **kwargs):
+    invalidate_course_masks()
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Instructor)
+@receiver(post_delete, sender=Instructor)
+def invalidate_course_catalog(sender, instance, raw=False, **kwargs):
+    invalidate_catalog()
+
+
+#########################################################################################################
+                                        #NOTIFICATION COUNTERS#
+#########################################################################################################
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = {} if created else getattr(instance, '_previous_values', {})
+    for owner in NOTIFICATION_OWNERS:
+        field = f'{owner}_id'
+        before = previous.get(field) if previous and not previous['is_read'] else None
+        after = getattr(instance, field) if not instance.is_read else None
+        if before != after:
+            NotificationCounter.objects.adjust(owner, before, -1)
+            NotificationCounter.objects.adjust(owner, after, 1)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_unread_notification(sender, instance, **kwargs):
+    # A negative adjustment never creates a counter, so a cascade delete of the owner is safe.
+    if not instance.is_read:
+        for owner in NOTIFICATION_OWNERS:
+            NotificationCounter.objects.adjust(owner, getattr(instance, f'{owner}_id'), -1)
+
+
+#########################################################################################################
+                                        #INSTRUCTOR ROSTERS#
+#########################################################################################################
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_enrollment_rosters(sender, instance, **kwargs):
+    instructor_ids = _current_and_previous(instance, 'instructor_id') - {None}
+    shared_cache().delete_many([roster_cache_key(instructor_id) for instructor_id in instructor_ids])
+
+
+@receiver(post_save, sender=Student)
+def invalidate_student_rosters(sender, instance, created=False, raw=False, **kwargs):
+    # A new student has no enrollments yet; an edited one may appear on several rosters.
+    if created or raw:
+        return
+    instructor_ids = Enrollment.objects.filter(student=instance).values_list('instructor_id', flat=True).distinct()
+    shared_cache().delete_many([roster_cache_key(instructor_id) for instructor_id in instructor_ids])
+
+
+#########################################################################################################
+                                        #STUDENT DASHBOARD SNAPSHOTS#
+#########################################################################################################
+
+def _students_of_courses(course_ids):
+    return set(Enrollment.objects.filter(course_id__in=course_ids).values_list('student_id', flat=True))
+
+
+# Source model -> the students whose dashboard snapshot a saved/deleted row appears in.
+DASHBOARD_STUDENTS = {
+    Student: lambda instance: {instance.pk},
+    Enrollment: lambda instance: _current_and_previous(instance, 'student_id'),
+    StudentFee: lambda instance: {instance.student_id},
+    Payment: lambda instance: _current_and_previous(instance, 'student_id'),
+    Grade: lambda instance: {instance.student_id},
+    AssignmentSubmission: lambda instance: {instance.student_id},
+    Notification: lambda instance: {instance.student_id},
+    SentEmail: lambda instance: {instance.sender_student_id},
+    Attendance: lambda instance: _current_and_previous(instance, 'student_id'),
+    Fee: lambda instance: _students_of_courses(_current_and_previous(instance, 'course_id')),
+    Schedule: lambda instance: _students_of_courses(_current_and_previous(instance, 'course_id')),
+    Assignment: lambda instance: _students_of_courses({instance.course_id}),
+    Course: lambda instance: _students_of_courses({instance.pk}),
+    Instructor: lambda instance: set(Enrollment.objects.filter(course__instructor=instance).values_list('student_id', flat=True)),
+}
+
+
+def invalidate_student_dashboards(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_student_snapshots(DASHBOARD_STUDENTS[sender](instance))
+
+
+for model in DASHBOARD_STUDENTS:
+    post_save.connect(invalidate_student_dashboards, sender=model, dispatch_uid=f'dashboard-save-{model.__name__}')
+    post_delete.connect(invalidate_student_dashboards, sender=model, dispatch_uid=f'dashboard-delete-{model.__name__}')
+
+
+# Models whose rows appear in the timetable feeds (see feeds.py); the affected students are the same
+# as for the dashboard snapshot.
+TIMETABLE_SOURCES = (Student, Enrollment, Schedule, Course, Instructor)
+
+
+def bump_student_timetables(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    bump_timetable_versions(DASHBOARD_STUDENTS[sender](instance))
+
+
+for model in TIMETABLE_SOURCES:
+    post_save.connect(bump_student_timetables, sender=model, dispatch_uid=f'timetable-save-{model.__name__}')
+    post_delete.connect(bump_student_timetables, sender=model, dispatch_uid=f'timetable-delete-{model.__name__}')
+
+
+#########################################################################################################
+                                        #FULL-TEXT SEARCH#
+#########################################################################################################
+
+@receiver(post_migrate)
+def install_search_indexes(sender, using='default', **kwargs):
+    # The FTS5 tables and their triggers are not Django models, so they are created here once the
+    # app's own tables exist. Triggers keep them in sync from then on.
+    if sender.label == 'pro':
+        create_search_indexes(using)
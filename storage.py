@@ -0,0 +1,93 @@
+import hashlib
+import os
+import tempfile
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+
+
+#########################################################################################################
+                                        #CONTENT-ADDRESSED STORAGE#
+#########################################################################################################
+
+# Files are stored once per unique content under cas/<aa>/<bb>/<sha256><ext>, so a resubmission or a
+# starter file shared by many assignments costs no extra disk. StoredFile (models.py) counts the rows
+# that point at each file and signals.py deletes the file when the last one goes.
+
+CAS_PREFIX = 'cas/'
+HASH_CHUNK_SIZE = 64 * 1024
+MAX_EXTENSION_LENGTH = 10
+
+
+def content_name(digest, extension=''):
+    return f"{CAS_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def is_content_addressed(name):
+    return bool(name) and name.startswith(CAS_PREFIX)
+
+
+def digest_from_name(name):
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def submission_storage():
+    """Storage for assignment documents and submissions; configured as STORAGES['submissions']."""
+    return storages['submissions']
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The name is replaced by the content digest in _save(), and identical content
+        # is meant to land on the same file, so there is nothing to make unique here.
+        return name
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        if len(extension) > MAX_EXTENSION_LENGTH:
+            extension = ''
+
+        if hasattr(content, 'temporary_file_path'):
+            # Large uploads are already on disk: hash them in place and move them only if new.
+            temporary_path = content.temporary_file_path()
+            name = content_name(self._hash_file(temporary_path), extension)
+            if not self.exists(name):
+                self._store(temporary_path, name, move=file_move_safe)
+            return name
+
+        # Anything else is streamed to a scratch file while it is hashed, then kept only if new.
+        scratch_dir = self.path(f"{CAS_PREFIX}tmp")
+        os.makedirs(scratch_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, scratch_path = tempfile.mkstemp(dir=scratch_dir)
+        try:
+            with os.fdopen(fd, 'wb') as scratch:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    scratch.write(chunk)
+            name = content_name(digest.hexdigest(), extension)
+            if self.exists(name):
+                os.unlink(scratch_path)
+            else:
+                self._store(scratch_path, name, move=os.replace)
+        except BaseException:
+            if os.path.exists(scratch_path):
+                os.unlink(scratch_path)
+            raise
+        return name
+
+    def _store(self, source_path, name, move):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+        move(source_path, full_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+    def _hash_file(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as source:
+            for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
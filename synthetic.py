@@ -0,0 +1,206 @@
+import random
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from .attendance import rebuild_attendance_rollups
+from .catalog import invalidate_catalog
+from .models import (
+    NOTIFICATION_OWNERS, AcademicStanding, Announcement, Assignment, AssignmentSubmission, Attendance, Course, Enrollment,
+    Fee, Grade, Instructor, Notification, NotificationCounter, Payment, Schedule, SentEmail, Student, StudentFee,
+    StudentIdSequence, format_student_id, student_id_prefix, university_email_for,
+)
+from .timetable import invalidate_course_masks
+
+
+#########################################################################################################
+                                        #SYNTHETIC UNIVERSITY#
+#########################################################################################################
+
+# Seeded, deterministic test data: the same seed and scale always produce the same rows.
+# Sizes are given for scale=1 and multiplied by the scale factor; every count stays at least 1.
+
+BASE_SIZES = {
+    'students': 2000,
+    'courses': 200,
+    'instructors': 50,
+}
+COURSES_PER_STUDENT = 5
+SESSIONS_PER_WEEK = 2
+SEMESTER_START = date(2026, 1, 5)
+SYNTHETIC_PASSWORD = 'synthetic-pass'
+BATCH_SIZE = 500
+
+FACULTIES = {
+    'Engineering': ['Computing', 'Electrical Engineering', 'Mechanical Engineering'],
+    'Science': ['Mathematics', 'Physics', 'Chemistry'],
+    'Business': ['Accounting', 'Finance', 'Marketing'],
+    'Arts': ['History', 'Linguistics', 'Philosophy'],
+}
+FIRST_NAMES = ['Amina', 'Bilal', 'Chen', 'Dana', 'Elif', 'Farah', 'Goran', 'Hana', 'Ivan', 'Jia', 'Kofi', 'Lena', 'Omar', 'Priya', 'Sara', 'Yusuf']
+LAST_NAMES = ['Ahmed', 'Brown', 'Costa', 'Dubois', 'Evans', 'Fischer', 'Garcia', 'Haddad', 'Ito', 'Khan', 'Lopez', 'Nguyen', 'Okafor', 'Silva']
+GRADES = ['A', 'A', 'B', 'B', 'B', 'C', 'C', 'D', 'F']
+
+
+def scaled(name, scale):
+    return max(1, round(BASE_SIZES[name] * scale))
+
+
+def generate_university(scale=1.0, seed=0, weeks=10, notifications_per_student=10, emails_per_student=3, accounts=True):
+    """
+    Fill the database with a synthetic university and return its rows by kind.
+
+    With `accounts` every student and instructor also gets a login whose username is their
+    email and whose password is SYNTHETIC_PASSWORD.
+    """
+    rng = random.Random(seed)
+    with transaction.atomic():
+        instructors = Instructor.objects.bulk_create([
+            Instructor(
+                full_name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                email=f"instructor{n}@staff.uni.edu",
+                department=list(FACULTIES)[n % len(FACULTIES)],
+            )
+            for n in range(scaled('instructors', scale))
+        ])
+        courses = Course.objects.bulk_create([
+            Course(
+                code=f"SYN{n:04d}", name=f"Course {n}", credit_hours=rng.choice([2, 3, 3, 4]),
+                instructor=instructors[n % len(instructors)], faculty=list(FACULTIES)[n // 3 % len(FACULTIES)],
+            )
+            for n in range(scaled('courses', scale))
+        ])
+        Fee.objects.bulk_create([Fee(course=course, amount=Decimal(rng.randrange(200, 900, 50))) for course in courses])
+        schedules = Schedule.objects.bulk_create([
+            Schedule(
+                course=course, day_of_week=(n + 2 * slot) % 5,
+                start_time=time(8 + n % 9), end_time=time(9 + n % 9),
+            )
+            for n, course in enumerate(courses) for slot in range(SESSIONS_PER_WEEK)
+        ])
+        invalidate_course_masks()
+        invalidate_catalog()
+        schedules_by_course = defaultdict(list)
+        for schedule in schedules:
+            schedules_by_course[schedule.course_id].append(schedule)
+
+        students = _create_students(rng, scaled('students', scale))
+        assignments = Assignment.objects.bulk_create([
+            Assignment(
+                title=f"Assignment {n}", description="Synthetic assignment.",
+                due_date=timezone.make_aware(datetime.combine(SEMESTER_START + timedelta(weeks=4), time(23, 59))),
+                course=course, instructor=course.instructor,
+            )
+            for n, course in enumerate(courses)
+        ])
+        assignment_by_course = {assignment.course_id: assignment for assignment in assignments}
+
+        enrollments, grades, submissions, attendance = [], [], [], []
+        for student in students:
+            for course in rng.sample(courses, min(COURSES_PER_STUDENT, len(courses))):
+                enrollments.append(Enrollment(student=student, course=course, instructor=course.instructor))
+                grades.append(Grade(student=student, course=course, grade=rng.choice(GRADES)))
+                if rng.random() < 0.8:
+                    submissions.append(AssignmentSubmission(
+                        assignment=assignment_by_course[course.id], student=student,
+                        submission_file=f"submissions/synthetic-{student.pk}-{course.pk}.pdf",
+                    ))
+                for week in range(weeks):
+                    for schedule in schedules_by_course[course.id]:
+                        attendance.append(Attendance(
+                            student=student, course=course, schedule=schedule,
+                            date=SEMESTER_START + timedelta(weeks=week, days=schedule.day_of_week),
+                            status='Present' if rng.random() < 0.85 else 'Absent',
+                        ))
+        Enrollment.objects.bulk_create(enrollments, batch_size=BATCH_SIZE)
+        Grade.objects.bulk_create(grades, batch_size=BATCH_SIZE)
+        AcademicStanding.objects.refresh(student.pk for student in students)
+        AssignmentSubmission.objects.bulk_create(submissions, batch_size=BATCH_SIZE)
+        Attendance.objects.bulk_create(attendance, batch_size=BATCH_SIZE)
+        # bulk_create skips the rollup signals too.
+        rebuild_attendance_rollups()
+
+        payments = Payment.objects.bulk_create([
+            Payment(student=student, amount=Decimal(rng.randrange(100, 1500, 50)), transaction_id=f"SYN-{seed}-{student.pk}")
+            for student in students if rng.random() < 0.7
+        ], batch_size=BATCH_SIZE)
+        # bulk_create skips the ledger signals, so build the fee ledger in one pass.
+        StudentFee.objects.bulk_create([StudentFee(student=student) for student in students], batch_size=BATCH_SIZE)
+        StudentFee.objects.refresh(student.pk for student in students)
+
+        announcements = Announcement.objects.bulk_create([
+            Announcement(title=f"Welcome to {course.name}", content="Synthetic announcement.", instructor=course.instructor)
+            for course in courses
+        ])
+        announcement_by_instructor = {announcement.instructor_id: announcement for announcement in announcements}
+        notifications = Notification.objects.bulk_create([
+            Notification(student=student, subject=f"Reminder {n}", message="Synthetic notification.", is_read=rng.random() < 0.5)
+            for student in students for n in range(notifications_per_student)
+        ] + [
+            Notification(student=enrollment.student, announcement=announcement_by_instructor[enrollment.instructor_id], subject='New Announcement')
+            for enrollment in enrollments if enrollment.instructor_id in announcement_by_instructor
+        ] + [
+            Notification(instructor=instructor, subject=f"Reminder {n}", message="Synthetic notification.")
+            for instructor in instructors for n in range(notifications_per_student)
+        ], batch_size=BATCH_SIZE, ignore_conflicts=True)
+        for owner in NOTIFICATION_OWNERS:
+            NotificationCounter.objects.refresh(owner)
+        sent_emails = SentEmail.objects.bulk_create([
+            SentEmail(
+                sender_student=student, recipient_instructor=instructors[n % len(instructors)],
+                recipient_email=instructors[n % len(instructors)].email, subject="Question", message="Synthetic email.",
+            )
+            for student in students for n in range(emails_per_student)
+        ], batch_size=BATCH_SIZE)
+
+        users = []
+        if accounts:
+            # Hashing is deliberately slow, so every synthetic account shares one hash.
+            password = make_password(SYNTHETIC_PASSWORD)
+            users = User.objects.bulk_create([
+                User(username=email, email=email, password=password)
+                for email in [student.university_email for student in students] + [instructor.email for instructor in instructors]
+            ], batch_size=BATCH_SIZE)
+
+    return {
+        'instructors': instructors,
+        'courses': courses,
+        'schedules': schedules,
+        'students': students,
+        'assignments': assignments,
+        'enrollments': enrollments,
+        'grades': grades,
+        'submissions': submissions,
+        'attendance': attendance,
+        'payments': payments,
+        'announcements': announcements,
+        'notifications': notifications,
+        'sent_emails': sent_emails,
+        'users': users,
+    }
+
+
+def _create_students(rng, count):
+    students = []
+    for n in range(count):
+        faculty = rng.choice(list(FACULTIES))
+        students.append(Student(
+            name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            dob=date(1998, 1, 1) + timedelta(days=rng.randrange(6 * 365)),
+            faculty=faculty,
+            major=rng.choice(FACULTIES[faculty]),
+        ))
+
+    # Reserve IDs in one block per major prefix, as import_students does.
+    by_prefix = defaultdict(list)
+    for student in students:
+        by_prefix[student_id_prefix(student.major)].append(student)
+    for prefix, group in by_prefix.items():
+        first = StudentIdSequence.objects.reserve(prefix, len(group))
+        for offset, student in enumerate(group):
+            student.student_id = format_student_id(prefix, first + offset)
+            student.university_email = university_email_for(student.student_id)
+    return Student.objects.bulk_create(students, batch_size=BATCH_SIZE)
@@ -1,3 +1,1301 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import shutil
+import smtplib
+import tempfile
+import time
+import zipfile
+from contextlib import contextmanager
+from datetime import time as clock, timedelta
+from decimal import Decimal
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from . import metrics
+from .attendance import at_risk_students, record_attendance
+from .catalog import CATALOG_KEY, catalog_page
+from .dashboard import (
+    HITS_KEY, STATS_FLUSH_EVERY, dashboard_cache, get_student_snapshot, reset_snapshot_stats, snapshot_stats,
+)
+from .exports import EXPORTS
+from .feeds import feed_token
+from .forms import AssignmentSubmissionForm, AttendanceSheetForm, EnrollmentForm
+from .notifications import archive_notifications, delete_notifications, fan_out_announcement, mark_notifications_read
+from .models import (
+    AcademicStanding, Announcement, ArchivedNotification, AssignmentSubmission, Attendance, AttendanceCourseRollup,
+    AttendanceSessionRollup, Course, Enrollment, Fee, Grade, Instructor, Notification, NotificationCounter, OutboxEmail,
+    Payment, Schedule, SentEmail, StoredFile, Student, StudentFee, StudentIdSequence, format_student_id, roster_cache_key,
+)
+from .outbox import claim_batch, deliver_batch, queue_email, retry_delay
+from .roles import INSTRUCTOR, SESSION_ROLE_KEY, STUDENT, resolve_role
+from .search import SEARCH_INDEXES, check_search_index, ranked
+from .storage import submission_storage
+from .synthetic import SEMESTER_START, SYNTHETIC_PASSWORD, generate_university
+from .timetable import COURSE_MASKS_KEY, busy_bitmap, course_masks, student_interval_index
+from .transcripts import honour_roll, probation, transcript
+from .uploads import oversized_uploads
+from .views import INSTRUCTOR_SECTIONS
 
-# Create your tests here.
+# Every page is measured against two synthetic universities of different sizes. A page whose
+# query count differs between them runs a query per row (an N+1) and fails the suite.
+SCALES = (0.01, 0.03)
+SEED = 1234
+WEEKS = 3
+
+# Queries allowed per request. Raise a budget only together with the change that needs it.
+QUERY_BUDGETS = {
+    'login': 11,
+    'student_dashboard (cold)': 17,
+    'student_dashboard (cached)': 1,
+    'instructor_dashboard': 19,
+    'instructor_dashboard_section': 6,
+    'admin changelist': 9,
+}
+# Wall-time ceiling per request in seconds; generous so only a real regression trips it.
+WALL_TIME_CEILING = 1.5
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'dashboard': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-dashboard', 'TIMEOUT': None},
+}
+
+
+@contextmanager
+def synthetic_university(scale):
+    """Generate a university for the duration of the block, then roll it back and empty the caches."""
+    try:
+        with transaction.atomic():
+            yield generate_university(scale=scale, seed=SEED, weeks=WEEKS)
+            transaction.set_rollback(True)
+    finally:
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+
+@override_settings(CACHES=TEST_CACHES, ANNOUNCEMENT_FANOUT_ASYNC=False)
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        reset_snapshot_stats()
+
+    def measure(self, request):
+        """Run `request()` and return (response, captured queries, elapsed seconds)."""
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = request()
+            elapsed = time.perf_counter() - started
+        return response, queries.captured_queries, elapsed
+
+    def assertWithinBudget(self, name, prepare, expected_status=200):
+        """
+        At every scale, call `prepare(data)` to log in and warm up, then measure the request it
+        returns. Checks the status, the query budget, that the query count does not grow with
+        the data, and the wall-time ceiling.
+        """
+        counts = {}
+        for scale in SCALES:
+            with synthetic_university(scale) as data:
+                response, queries, elapsed = self.measure(prepare(data))
+            self.assertEqual(response.status_code, expected_status, f"{name} at scale {scale}")
+            self.assertLessEqual(
+                len(queries), QUERY_BUDGETS[name],
+                f"{name} ran {len(queries)} queries at scale {scale}:\n" + "\n".join(query['sql'] for query in queries),
+            )
+            self.assertLess(elapsed, WALL_TIME_CEILING, f"{name} took {elapsed:.2f}s at scale {scale}")
+            counts[scale] = [query['sql'] for query in queries]
+        small, large = (counts[scale] for scale in SCALES)
+        self.assertEqual(
+            len(small), len(large),
+            f"{name} runs more queries on more data (N+1?):\n" + "\n".join(sql for sql in large if sql not in small),
+        )
+
+    def log_in(self, user):
+        # Mirror register_or_login, which stores the resolved role in the session.
+        self.client.force_login(user)
+        role = resolve_role(user.email)
+        if role is not None:
+            session = self.client.session
+            session[SESSION_ROLE_KEY] = list(role)
+            session.save()
+
+    def student_of(self, data):
+        student = data['students'][len(data['students']) // 2]
+        return student, User.objects.get(username=student.university_email)
+
+    def instructor_of(self, data):
+        instructor = data['instructors'][0]
+        return instructor, User.objects.get(username=instructor.email)
+
+    def test_login(self):
+        def prepare(data):
+            student, user = self.student_of(data)
+            self.client.logout()
+            return lambda: self.client.post(reverse('register_or_login'), {
+                'action': 'login', 'username': user.username, 'password': SYNTHETIC_PASSWORD,
+            })
+        self.assertWithinBudget('login', prepare, expected_status=302)
+
+    def test_login_stores_role(self):
+        with synthetic_university(SCALES[0]) as data:
+            student, user = self.student_of(data)
+            response = self.client.post(reverse('register_or_login'), {
+                'action': 'login', 'username': user.username, 'password': SYNTHETIC_PASSWORD,
+            })
+            self.assertRedirects(response, reverse('student_dashboard', args=[student.pk]), fetch_redirect_response=False)
+            self.assertEqual(self.client.session[SESSION_ROLE_KEY], [STUDENT, student.pk])
+
+            instructor, user = self.instructor_of(data)
+            self.client.post(reverse('register_or_login'), {
+                'action': 'login', 'username': user.username, 'password': SYNTHETIC_PASSWORD,
+            })
+            self.assertEqual(self.client.session[SESSION_ROLE_KEY], [INSTRUCTOR, instructor.pk])
+
+    def test_student_dashboard_cold(self):
+        def prepare(data):
+            student, user = self.student_of(data)
+            self.log_in(user)
+            url = reverse('student_dashboard', args=[student.pk])
+            return lambda: self.client.get(url)
+        self.assertWithinBudget('student_dashboard (cold)', prepare)
+
+    def test_student_dashboard_cached(self):
+        def prepare(data):
+            student, user = self.student_of(data)
+            self.log_in(user)
+            url = reverse('student_dashboard', args=[student.pk])
+            self.client.get(url)
+            return lambda: self.client.get(url)
+        self.assertWithinBudget('student_dashboard (cached)', prepare)
+
+    def test_instructor_dashboard(self):
+        def prepare(data):
+            instructor, user = self.instructor_of(data)
+            self.log_in(user)
+            return lambda: self.client.get(reverse('instructor_dashboard'))
+        self.assertWithinBudget('instructor_dashboard', prepare)
+
+    def test_instructor_dashboard_sections(self):
+        for section in INSTRUCTOR_SECTIONS:
+            with self.subTest(section=section):
+                def prepare(data):
+                    instructor, user = self.instructor_of(data)
+                    self.log_in(user)
+                    return lambda: self.client.get(reverse('instructor_dashboard_section', args=[section]))
+                self.assertWithinBudget('instructor_dashboard_section', prepare)
+
+    def test_admin_changelists(self):
+        superuser = User.objects.create_superuser('budget-admin', 'budget-admin@uni.edu', SYNTHETIC_PASSWORD)
+        for model, model_admin in admin.site._registry.items():
+            if model._meta.app_label != 'pro':
+                continue
+            with self.subTest(model=model.__name__):
+                url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+
+                def prepare(data):
+                    self.log_in(superuser)
+                    return lambda: self.client.get(url)
+                self.assertWithinBudget('admin changelist', prepare)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SnapshotStatsTests(TestCase):
+    def tearDown(self):
+        reset_snapshot_stats()
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+    def test_lookups_are_tallied_in_memory_and_flushed_in_batches(self):
+        student = generate_university(scale=0.005, seed=SEED, weeks=1, accounts=False)['students'][0]
+        reset_snapshot_stats()
+        get_student_snapshot(student.pk)
+        for _ in range(9):
+            get_student_snapshot(student.pk)
+        self.assertIsNone(dashboard_cache().get(HITS_KEY))
+        self.assertEqual(snapshot_stats(), {'hits': 9, 'misses': 1, 'hit_ratio': 0.9})
+        for _ in range(STATS_FLUSH_EVERY):
+            get_student_snapshot(student.pk)
+        self.assertEqual(dashboard_cache().get(HITS_KEY), 9 + STATS_FLUSH_EVERY)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_server_timing_and_prometheus_endpoint(self):
+        with synthetic_university(SCALES[0]) as data:
+            instructor = data['instructors'][0]
+            self.client.force_login(User.objects.get(username=instructor.email))
+            response = self.client.get(reverse('instructor_dashboard'))
+        timing = dict(entry.split(';', 1) for entry in response.headers['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'total', 'db', 'dup', 'tpl'})
+        self.assertRegex(timing['db'], r'dur=[\d.]+;desc="\d+ queries"')
+
+        staff = User.objects.create_user('metrics-staff', 'metrics-staff@uni.edu', SYNTHETIC_PASSWORD, is_staff=True)
+        self.client.force_login(staff)
+        body = self.client.get(reverse('request_metrics')).content.decode()
+        self.assertIn('# TYPE pro_request_total summary', body)
+        self.assertIn('pro_request_queries_count{url_name="instructor_dashboard"} 1', body)
+        self.assertIn('pro_request_db{url_name="instructor_dashboard",quantile="0.99"}', body)
+
+    def test_streaming_responses_are_recorded_when_the_stream_closes(self):
+        generate_university(scale=0.01, seed=SEED, weeks=1, accounts=False)
+        self.client.force_login(User.objects.create_user('metrics-registrar', 'metrics-registrar@uni.edu', SYNTHETIC_PASSWORD, is_staff=True))
+        response = self.client.get(reverse('export_csv', args=['attendance']))
+        self.assertNotIn('export_csv', metrics.snapshot())
+        with CaptureQueriesContext(connection) as queries:
+            b''.join(response.streaming_content)
+        stream_queries = len(queries.captured_queries)
+        self.assertGreater(stream_queries, 0)
+        self.assertGreaterEqual(metrics.snapshot()['export_csv']['queries']['sum'], stream_queries)
+        self.assertFalse(any(isinstance(wrapper, metrics.RequestMetrics) for wrapper in connection.execute_wrappers))
+
+    @override_settings(REQUEST_METRICS_WINDOW=2)
+    def test_summary_count_and_sum_are_cumulative(self):
+        for queries in (1, 2, 3, 4, 5):
+            sample = metrics.RequestMetrics()
+            sample.queries = queries
+            metrics.record('window', sample)
+        stats = metrics.snapshot()['window']['queries']
+        self.assertEqual((stats['count'], stats['sum']), (5, 15))
+        self.assertEqual((stats[0.5], stats[0.99]), (4, 5))
+        body = metrics.render_prometheus()
+        self.assertIn('pro_request_queries_count{url_name="window"} 5', body)
+        self.assertIn('pro_request_queries_sum{url_name="window"} 15', body)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        user = User.objects.create_user('metrics-user', 'metrics-user@uni.edu', SYNTHETIC_PASSWORD)
+        self.client.force_login(user)
+        response = self.client.get(reverse('request_metrics'))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(CACHES=TEST_CACHES, INACTIVITY_TIMEOUT=300, INACTIVITY_WRITE_GRANULARITY=60)
+class SessionTimeoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('idle@uni.edu', 'idle@uni.edu', SYNTHETIC_PASSWORD)
+        self.client.force_login(self.user)
+        self.url = reverse('notification_badge')
+
+    def last_active(self, seconds_ago):
+        session = self.client.session
+        session['last_activity'] = time.time() - seconds_ago
+        session.save()
+        return session['last_activity']
+
+    def test_activity_is_only_written_once_it_is_stale(self):
+        self.client.get(self.url)
+        self.assertIn('last_activity', self.client.session)
+        recent = self.last_active(10)
+        self.client.get(self.url)
+        self.assertEqual(self.client.session['last_activity'], recent)
+        stale = self.last_active(120)
+        self.client.get(self.url)
+        self.assertGreater(self.client.session['last_activity'], stale + 100)
+
+    def test_idle_sessions_are_logged_out(self):
+        self.last_active(301)
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('register_or_login'), fetch_redirect_response=False)
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_purge_sessions_deletes_expired_rows_only(self):
+        Session.objects.all().delete()
+        Session.objects.create(session_key='expired', session_data='', expire_date=timezone.now() - timedelta(minutes=1))
+        Session.objects.create(session_key='current', session_data='', expire_date=timezone.now() + timedelta(minutes=1))
+        call_command('purge_sessions', stdout=io.StringIO())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['current'])
+
+
+class StudentIdTests(TestCase):
+    def create_student(self, name, major):
+        return Student.objects.create(name=name, dob='2000-01-01', faculty='Science', major=major)
+
+    def test_reserved_blocks_never_overlap(self):
+        self.assertEqual(StudentIdSequence.objects.reserve('COM'), 1)
+        self.assertEqual(StudentIdSequence.objects.reserve('COM', 5), 2)
+        self.assertEqual(StudentIdSequence.objects.reserve('COM'), 7)
+        self.assertEqual(StudentIdSequence.objects.reserve('MAT'), 1)
+        self.assertEqual(format_student_id('COM', 7), 'COM00007')
+
+    def test_ids_follow_the_major(self):
+        student = self.create_student('Ada', 'Computer Science')
+        self.assertEqual((student.student_id, student.university_email), ('COM00001', 'COM00001@stu.uni.edu'))
+        student.name = 'Ada Lovelace'
+        student.save()
+        self.assertEqual(student.student_id, 'COM00001')
+        student.major = 'Mathematics'
+        student.save()
+        self.assertEqual(Student.objects.get(pk=student.pk).student_id, 'MAT00001')
+
+    def test_deferred_major_is_not_a_change(self):
+        student = self.create_student('Ada', 'Computer Science')
+        deferred = Student.objects.only('name').get(pk=student.pk)
+        deferred.name = 'Ada Lovelace'
+        deferred.save()
+        stored = Student.objects.get(pk=student.pk)
+        self.assertEqual((stored.name, stored.student_id, stored.university_email), ('Ada Lovelace', 'COM00001', 'COM00001@stu.uni.edu'))
+
+    def test_import_students_reserves_ids_per_prefix(self):
+        self.create_student('Existing', 'Computer Science')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(
+                "name,dob,faculty,major\n"
+                "Ada,2000-01-01,Science,Computer Science\n"
+                "Emmy,2000-02-02,Science,Mathematics\n"
+                "Nameless,2000-03-03,Science,\n"
+                "Alan,2000-04-04,Science,Computer Science\n"
+            )
+        self.addCleanup(os.remove, handle.name)
+        call_command('import_students', handle.name, chunk_size=2, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(
+            dict(Student.objects.values_list('name', 'student_id')),
+            {'Existing': 'COM00001', 'Ada': 'COM00002', 'Emmy': 'MAT00001', 'Alan': 'COM00003'},
+        )
+        self.assertEqual(Student.objects.get(name='Alan').university_email, 'COM00003@stu.uni.edu')
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+
+
+class CrashingEmailBackend(BaseEmailBackend):
+    """Sends the first message, then dies the way a killed worker would."""
+
+    def send_messages(self, email_messages):
+        if len(mail.outbox) >= 1:
+            raise SystemExit
+        mail.outbox.extend(email_messages)
+        return len(email_messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    OUTBOX_MAX_ATTEMPTS=3, OUTBOX_RETRY_BASE_SECONDS=30, OUTBOX_RETRY_MAX_SECONDS=100,
+)
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.message = queue_email('Hello', 'Body', 'from@uni.edu', 'to@uni.edu')
+
+    def test_due_messages_are_sent_once(self):
+        self.assertEqual(deliver_batch(), 1)
+        self.message.refresh_from_db()
+        self.assertEqual((self.message.status, self.message.attempts), (OutboxEmail.SENT, 1))
+        self.assertEqual([email.to for email in mail.outbox], [['to@uni.edu']])
+        self.assertEqual(deliver_batch(), 0)
+
+    def test_retry_delay_doubles_up_to_the_ceiling(self):
+        self.assertEqual([retry_delay(n).total_seconds() for n in (1, 2, 3, 4)], [30, 60, 100, 100])
+
+    @override_settings(EMAIL_BACKEND='pro.tests.FailingEmailBackend')
+    def test_failures_back_off_then_give_up(self):
+        before = timezone.now()
+        deliver_batch()
+        self.message.refresh_from_db()
+        self.assertEqual((self.message.status, self.message.attempts), (OutboxEmail.PENDING, 1))
+        self.assertIn('SMTPServerDisconnected', self.message.last_error)
+        self.assertGreaterEqual(self.message.next_attempt_at, before + timedelta(seconds=30))
+        # Not due yet, so not retried.
+        self.assertEqual(deliver_batch(), 0)
+
+        for retry in range(2):
+            OutboxEmail.objects.filter(pk=self.message.pk).update(next_attempt_at=timezone.now())
+            deliver_batch()
+        self.message.refresh_from_db()
+        self.assertEqual((self.message.status, self.message.attempts), (OutboxEmail.FAILED, 3))
+        OutboxEmail.objects.filter(pk=self.message.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_batch(), 0)
+
+    def test_batches_are_claimed_by_one_worker(self):
+        second = queue_email('Hello', 'Body', 'from@uni.edu', 'other@uni.edu')
+        claimed = claim_batch()
+        self.assertEqual({message.pk for message in claimed}, {self.message.pk, second.pk})
+        self.assertEqual(claim_batch(), [])
+        self.assertEqual(deliver_batch(), 0)
+        self.assertFalse(mail.outbox)
+
+    @override_settings(EMAIL_BACKEND='pro.tests.CrashingEmailBackend', OUTBOX_CLAIM_SECONDS=60)
+    def test_sent_messages_are_settled_before_a_crash(self):
+        second = queue_email('Hello', 'Body', 'from@uni.edu', 'other@uni.edu')
+        with self.assertRaises(SystemExit):
+            deliver_batch()
+        self.message.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(self.message.status, OutboxEmail.SENT)
+        self.assertEqual(second.status, OutboxEmail.SENDING)
+        # Once the crashed worker's claim lapses, only the unsent message is retried.
+        OutboxEmail.objects.filter(pk=second.pk).update(next_attempt_at=timezone.now())
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            mail.outbox = []
+            self.assertEqual(deliver_batch(), 1)
+        self.assertEqual([email.to for email in mail.outbox], [['other@uni.edu']])
+
+
+class MediaTestCase(TestCase):
+    """A small synthetic university with MEDIA_ROOT in a scratch directory."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, CACHES=TEST_CACHES)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.data = generate_university(scale=0.005, seed=SEED, weeks=1)
+        self.assignment = self.data['assignments'][0]
+
+    def submit(self, student, filename, content):
+        return AssignmentSubmission.objects.create(
+            assignment=self.assignment, student=student, submission_file=SimpleUploadedFile(filename, content),
+        )
+
+    def log_in(self, email):
+        self.client.post(reverse('register_or_login'), {'action': 'login', 'username': email, 'password': SYNTHETIC_PASSWORD})
+
+
+class ContentAddressedStorageTests(MediaTestCase):
+
+    def test_identical_uploads_share_one_counted_file(self):
+        first, second = self.data['students'][:2]
+        with self.captureOnCommitCallbacks(execute=True):
+            one = self.submit(first, 'essay.pdf', b'same bytes' * 1000)
+            two = self.submit(second, 'copy.pdf', b'same bytes' * 1000)
+        self.assertEqual(one.submission_file.name, two.submission_file.name)
+        self.assertEqual(StoredFile.objects.get(name=one.submission_file.name).ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            one.delete()
+        self.assertTrue(submission_storage().exists(two.submission_file.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            two.delete()
+        self.assertFalse(StoredFile.objects.filter(name=two.submission_file.name).exists())
+        self.assertFalse(submission_storage().exists(two.submission_file.name))
+
+    @override_settings(MAX_UPLOAD_SIZE=1024)
+    def test_oversized_upload_is_dropped_while_streaming(self):
+        student = self.data['students'][0]
+        request = RequestFactory().post('/', {'submission_file': SimpleUploadedFile('big.pdf', b'x' * 4096)})
+        form = AssignmentSubmissionForm(request.POST, request.FILES, oversized_uploads=oversized_uploads(request))
+        self.assertNotIn('submission_file', request.FILES)
+        self.assertFalse(form.is_valid())
+        self.assertIn('upload limit', form.errors['submission_file'][0])
+
+
+class DownloadTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner, self.other = self.data['students'][:2]
+        self.submission = self.submit(self.owner, 'essay.pdf', bytes(range(256)) * 40)
+        self.url = reverse('download_submission', args=[self.submission.pk])
+
+    def test_only_owner_and_course_instructor_can_download(self):
+        self.log_in(self.other.university_email)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.log_in(self.assignment.course.instructor.email)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.log_in(self.owner.university_email)
+        response = self.client.get(self.url)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(256)) * 40)
+        self.assertIn(self.owner.student_id, response['Content-Disposition'])
+
+    def test_range_and_conditional_requests(self):
+        self.log_in(self.owner.university_email)
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=256-511')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 256-511/10240')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(256)))
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=20000-').status_code, 416)
+
+    def test_missing_file_is_not_found(self):
+        AssignmentSubmission.objects.filter(pk=self.submission.pk).update(submission_file='submissions/nope.pdf')
+        self.log_in(self.owner.university_email)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='x-accel-redirect')
+    def test_front_end_server_sends_the_file(self):
+        self.log_in(self.owner.university_email)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f"/protected-media/{self.submission.submission_file.name}")
+        self.assertEqual(response.content, b'')
+
+
+class SubmissionArchiveTests(MediaTestCase):
+    def test_archive_names_entries_by_student_and_lateness(self):
+        AssignmentSubmission.objects.filter(assignment=self.assignment).delete()
+        first, second = self.data['students'][:2]
+        on_time = self.submit(first, 'essay.pdf', b'first draft')
+        late = self.submit(second, 'essay.pdf', b'x' * 200000)
+        resubmitted = self.submit(first, 'essay.pdf', b'second draft')
+        AssignmentSubmission.objects.filter(pk=on_time.pk).update(submitted_at=self.assignment.due_date - timedelta(days=1))
+        AssignmentSubmission.objects.filter(pk=resubmitted.pk).update(submitted_at=self.assignment.due_date - timedelta(hours=1))
+        AssignmentSubmission.objects.filter(pk=late.pk).update(submitted_at=self.assignment.due_date + timedelta(hours=1))
+
+        self.log_in(self.assignment.course.instructor.email)
+        response = self.client.get(reverse('download_assignment_submissions', args=[self.assignment.pk]))
+        self.assertTrue(response.streaming)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(
+            {name: archive.read(name) for name in archive.namelist()},
+            {
+                f"{first.student_id}_ontime.pdf": b'first draft',
+                f"{first.student_id}_ontime_2.pdf": b'second draft',
+                f"{second.student_id}_late.pdf": b'x' * 200000,
+            },
+        )
+
+        self.log_in(first.university_email)
+        self.assertEqual(self.client.get(reverse('download_assignment_submissions', args=[self.assignment.pk])).status_code, 404)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FeeLedgerTests(TestCase):
+    def setUp(self):
+        self.data = generate_university(scale=0.01, seed=SEED, weeks=1, accounts=False)
+
+    def tearDown(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+    def assertLedgerCurrent(self, *students):
+        expected = StudentFee.objects.compute_totals([student.pk for student in students])
+        for student in students:
+            ledger = StudentFee.objects.get(student=student)
+            self.assertEqual((ledger.fee_total, ledger.paid_total), expected.get(student.pk, (Decimal('0.00'), Decimal('0.00'))))
+
+    def test_fee_payment_and_enrollment_writes_update_the_ledger(self):
+        student, other = self.data['students'][:2]
+        before = StudentFee.objects.get(student=student)
+
+        payment = Payment.objects.create(student=student, amount=Decimal('250.00'), transaction_id='LEDGER-1')
+        self.assertEqual(StudentFee.objects.get(student=student).paid_total, before.paid_total + Decimal('250.00'))
+        payment.student = other
+        payment.save()
+        self.assertLedgerCurrent(student, other)
+
+        enrollment = Enrollment.objects.filter(student=student).select_related('course').first()
+        fee = Fee.objects.filter(course=enrollment.course).first()
+        fee.amount += Decimal('100.00')
+        fee.save()
+        self.assertEqual(StudentFee.objects.get(student=student).fee_total, before.fee_total + Decimal('100.00'))
+        enrollment.delete()
+        payment.delete()
+        self.assertLedgerCurrent(student, other)
+
+    def test_rebuild_fee_ledger_reports_and_repairs_drift(self):
+        drifted, missing = self.data['students'][:2]
+        StudentFee.objects.filter(student=drifted).update(fee_total=Decimal('1.00'))
+        StudentFee.objects.filter(student=missing).delete()
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '1 drifted and 1 missing ledger rows.'):
+            call_command('rebuild_fee_ledger', '--check', stdout=out)
+        self.assertIn(f'Drift for student {drifted.pk}', out.getvalue())
+        self.assertEqual(StudentFee.objects.get(student=drifted).fee_total, Decimal('1.00'))
+
+        call_command('rebuild_fee_ledger', stdout=io.StringIO())
+        self.assertLedgerCurrent(drifted, missing)
+        call_command('rebuild_fee_ledger', '--check', stdout=io.StringIO())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class InstructorRosterTests(TestCase):
+    def setUp(self):
+        self.data = generate_university(scale=0.01, seed=SEED, weeks=1, accounts=False)
+        self.course = self.data['courses'][0]
+        self.students = [
+            Student.objects.create(name=name, dob='2000-01-01', faculty='Science', major='Physics')
+            for name in ('Aaron Roster', 'Abby Roster')
+        ]
+        self.instructor = Instructor.objects.create(full_name='Roster Owner', email='roster-owner@uni.edu', department='Science')
+        self.other = Instructor.objects.create(full_name='Roster Other', email='roster-other@uni.edu', department='Science')
+
+    def tearDown(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+    def roster(self, instructor):
+        return Instructor.objects.get(pk=instructor.pk).enrolled_students()
+
+    def test_roster_is_cached_until_enrollments_change(self):
+        first, second = self.students
+        self.assertEqual(self.roster(self.instructor), "No students enrolled")
+        enrollment = Enrollment.objects.create(course=self.course, student=first, instructor=self.instructor)
+        self.assertIn(first.name, self.roster(self.instructor))
+        with self.assertNumQueries(1):
+            self.roster(self.instructor)
+        self.assertIsNotNone(caches['dashboard'].get(roster_cache_key(self.instructor.pk)))
+
+        Enrollment.objects.create(course=self.course, student=second, instructor=self.instructor)
+        self.assertIn(second.name, self.roster(self.instructor))
+
+        self.roster(self.other)
+        enrollment.instructor = self.other
+        enrollment.save()
+        self.assertNotIn(first.name, self.roster(self.instructor))
+        self.assertIn(first.name, self.roster(self.other))
+        enrollment.delete()
+        self.assertEqual(self.roster(self.other), "No students enrolled")
+
+    def test_student_edits_refresh_their_rosters(self):
+        student = self.students[0]
+        Enrollment.objects.create(course=self.course, student=student, instructor=self.instructor)
+        self.roster(self.instructor)
+        student.name = 'Renamed Rostered Student'
+        student.save()
+        self.assertIn('Renamed Rostered Student', self.roster(self.instructor))
+
+    def test_admin_changelist_query_count_does_not_grow_with_instructors(self):
+        self.client.force_login(User.objects.create_superuser('roster-admin', 'roster-admin@uni.edu', SYNTHETIC_PASSWORD))
+        url = reverse('admin:pro_instructor_changelist')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(url)
+        for student in self.students:
+            Enrollment.objects.create(course=self.course, student=student, instructor=self.other)
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(url)
+        self.assertEqual(len(after), len(before))
+        self.assertContains(response, 'Aaron Roster')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StudentFeeAdminTests(TestCase):
+    def setUp(self):
+        generate_university(scale=0.01, seed=SEED, weeks=1, accounts=False)
+        superuser = User.objects.create_superuser('fee-admin', 'fee-admin@uni.edu', SYNTHETIC_PASSWORD)
+        self.client.force_login(superuser)
+
+    def tearDown(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+    def test_balance_filter_and_sort_use_the_stored_ledger(self):
+        url = reverse('admin:pro_studentfee_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'balance': '0-500', 'o': '-4'})
+        self.assertEqual(response.status_code, 200)
+        shown = list(response.context['cl'].result_list)
+        expected = [fee for fee in StudentFee.objects.all() if 0 < fee.remaining_balance <= 500]
+        self.assertTrue(expected)
+        self.assertEqual(len(shown), min(len(expected), 100))
+        self.assertEqual([fee.remaining_balance for fee in shown], sorted((fee.remaining_balance for fee in shown), reverse=True))
+        self.assertFalse([query['sql'] for query in queries.captured_queries if '"pro_payment"' in query['sql']])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CsvExportTests(TestCase):
+    def setUp(self):
+        self.data = generate_university(scale=0.01, seed=SEED, weeks=2, accounts=False)
+        self.client.force_login(User.objects.create_user('registrar', 'registrar@uni.edu', SYNTHETIC_PASSWORD, is_staff=True))
+
+    def export(self, dataset, **filters):
+        response = self.client.get(reverse('export_csv', args=[dataset]), filters)
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_attendance_export_filters_and_query_count(self):
+        course = self.data['courses'][0]
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.export('attendance', course=course.pk, start='2026-01-01', end='2026-01-09')
+        expected = Attendance.objects.filter(course=course, date__range=('2026-01-01', '2026-01-09')).count()
+        self.assertEqual(rows[0], ['Date', 'Course code', 'Start time', 'Student ID', 'Student', 'Status'])
+        self.assertEqual(len(rows) - 1, expected)
+        self.assertTrue(all(row[1] == course.code for row in rows[1:]))
+        export_queries = [query for query in queries.captured_queries if 'pro_attendance' in query['sql']]
+        self.assertEqual(len(export_queries), 1)
+
+    def test_every_dataset_exports_with_faculty_filter(self):
+        faculty = self.data['students'][0].faculty
+        for dataset in EXPORTS:
+            with self.subTest(dataset=dataset):
+                rows = self.export(dataset, faculty=faculty)
+                self.assertGreater(len(rows), 1)
+
+    def test_invalid_filters_are_rejected(self):
+        self.assertEqual(self.client.get(reverse('export_csv', args=['grades']), {'start': '2026-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_csv', args=['attendance']), {'start': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_csv', args=['salaries'])).status_code, 404)
+
+
+class AttendanceRollupTests(TestCase):
+    def setUp(self):
+        self.data = generate_university(scale=0.01, seed=SEED, weeks=2, accounts=False)
+        self.schedule = self.data['schedules'][0]
+        self.course = self.schedule.course
+        self.roster = list(Enrollment.objects.filter(course=self.course).values_list('student_id', flat=True))
+        self.session_date = SEMESTER_START + timedelta(weeks=5, days=self.schedule.day_of_week)
+
+    def assertRollupsConsistent(self):
+        call_command('rebuild_attendance_rollups', check=True, stdout=io.StringIO())
+
+    def test_generator_and_rebuild_agree(self):
+        self.assertTrue(AttendanceCourseRollup.objects.exists())
+        self.assertRollupsConsistent()
+
+    def test_remarking_a_session_moves_counts_with_constant_queries(self):
+        record_attendance(self.course, self.schedule, self.session_date, {pk: 'Present' for pk in self.roster})
+        with CaptureQueriesContext(connection) as queries:
+            record_attendance(self.course, self.schedule, self.session_date, {pk: 'Absent' for pk in self.roster})
+        session = AttendanceSessionRollup.objects.get(schedule=self.schedule, date=self.session_date)
+        self.assertEqual((session.present, session.absent), (0, len(self.roster)))
+        self.assertRollupsConsistent()
+        # Everyone moved by the same delta: one UPDATE per rollup table, whatever the roster size.
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE "pro_attendance')]
+        self.assertEqual(len(updates), 2)
+
+    def test_single_row_saves_and_deletes_are_counted(self):
+        mark = Attendance.objects.create(
+            student_id=self.roster[0], course=self.course, schedule=self.schedule, date=self.session_date, status='Present',
+        )
+        mark.status = 'Absent'
+        mark.save()
+        self.assertRollupsConsistent()
+        mark.delete()
+        self.assertRollupsConsistent()
+        Student.objects.get(pk=self.roster[1]).delete()
+        Schedule.objects.filter(pk=self.schedule.pk).delete()
+        self.assertRollupsConsistent()
+
+    @override_settings(ATTENDANCE_AT_RISK_RATE=0.75, ATTENDANCE_AT_RISK_MIN_SESSIONS=3)
+    def test_at_risk_students_reads_rollups_only(self):
+        AttendanceCourseRollup.objects.filter(course=self.course).update(present=4, absent=0)
+        AttendanceCourseRollup.objects.filter(course=self.course, student_id=self.roster[0]).update(present=2, absent=2)
+        AttendanceCourseRollup.objects.filter(course=self.course, student_id=self.roster[1]).update(present=0, absent=2)
+        with CaptureQueriesContext(connection) as queries:
+            at_risk = list(at_risk_students([self.course.pk]))
+        self.assertEqual([(row.student_id, row.rate) for row in at_risk], [(self.roster[0], 0.5)])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"pro_attendance"', queries.captured_queries[0]['sql'])
+
+
+class AttendanceSheetTests(TestCase):
+    def setUp(self):
+        self.data = generate_university(scale=0.01, seed=SEED, weeks=1, accounts=False)
+        self.schedule = self.data['schedules'][0]
+        self.course = self.schedule.course
+        self.roster = list(Student.objects.filter(enrollment__course=self.course).order_by('pk'))
+        self.session_date = SEMESTER_START + timedelta(weeks=5, days=self.schedule.day_of_week)
+
+    def sheet(self, content):
+        data = {'course': self.course.pk, 'schedule': self.schedule.pk, 'date': self.session_date.isoformat()}
+        files = {'roster_file': SimpleUploadedFile('roster.csv', content, content_type='text/csv')}
+        return AttendanceSheetForm(data, files, instructor=self.course.instructor)
+
+    def test_remarking_a_session_overwrites_instead_of_duplicating(self):
+        statuses = {student.pk: 'Present' for student in self.roster}
+        self.assertEqual(record_attendance(self.course, self.schedule, self.session_date, statuses), len(self.roster))
+        record_attendance(self.course, self.schedule, self.session_date, {self.roster[0].pk: 'Absent'})
+        marks = Attendance.objects.filter(schedule=self.schedule, date=self.session_date)
+        self.assertEqual(marks.count(), len(self.roster))
+        self.assertEqual(marks.get(student=self.roster[0]).status, 'Absent')
+
+    def test_csv_roster_is_read_by_student_id(self):
+        rows = ''.join(f"{student.student_id},{'present' if n % 2 else 'absent'}\n" for n, student in enumerate(self.roster))
+        form = self.sheet(f"student_id,status\n{rows}".encode())
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['statuses'][self.roster[1].pk], 'Present')
+        self.assertEqual(len(form.cleaned_data['statuses']), len(self.roster))
+
+    def test_malformed_rosters_fail_validation(self):
+        student_id = self.roster[0].student_id
+        for content in [
+            f"student_id,status\n{student_id}\n".encode(),
+            f"student_id,status\n{student_id},Pr\xe9sent\n".encode('latin-1'),
+            b"name,status\nAda,Present\n",
+            b"student_id,status\nNOPE0001,Present\n",
+        ]:
+            with self.subTest(content=content):
+                form = self.sheet(content)
+                self.assertFalse(form.is_valid())
+                self.assertTrue(form.non_field_errors())
+
+
+@override_settings(GRADE_POINTS={'A': 4.0, 'B': 3.0, 'C': 2.0, 'D': 1.0, 'F': 0.0}, HONOUR_ROLL_GPA=3.5, PROBATION_GPA=2.0)
+class AcademicStandingTests(TestCase):
+    def setUp(self):
+        self.data = generate_university(scale=0.01, seed=SEED, weeks=1, accounts=False)
+        self.student = self.data['students'][0]
+        self.grades = list(Grade.objects.filter(student=self.student).select_related('course'))
+
+    def assertStandingConsistent(self):
+        call_command('recompute_gpa', check=True, stdout=io.StringIO())
+
+    def test_gpa_is_credit_weighted(self):
+        first, second = self.grades[:2]
+        for grade, credit_hours in ((first, 4), (second, 2)):
+            grade.course.credit_hours = credit_hours
+            grade.course.save()
+        Grade.objects.filter(student=self.student).exclude(pk__in=[first.pk, second.pk]).delete()
+        first.grade, second.grade = 'A', 'C'
+        first.save()
+        second.save()
+        standing = AcademicStanding.objects.get(student=self.student)
+        self.assertEqual((standing.credits, standing.quality_points, standing.gpa), (6, Decimal('20.00'), Decimal('3.33')))
+        # An ungraded course is listed on the transcript but does not count.
+        second.grade = 'None'
+        second.save()
+        self.assertEqual(transcript(self.student)['gpa'], Decimal('4.00'))
+        self.assertStandingConsistent()
+
+    def test_credit_hour_changes_and_deletes_keep_standing_current(self):
+        course = self.grades[0].course
+        course.credit_hours += 2
+        course.save()
+        self.assertStandingConsistent()
+        self.grades[0].delete()
+        self.assertStandingConsistent()
+        self.student.delete()
+        self.assertFalse(AcademicStanding.objects.filter(student_id=self.student.pk).exists())
+        self.assertStandingConsistent()
+
+    def test_recompute_uses_one_aggregate_and_lists_are_single_queries(self):
+        AcademicStanding.objects.update(gpa=None)
+        with self.assertRaises(CommandError):
+            self.assertStandingConsistent()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('recompute_gpa', stdout=io.StringIO())
+        self.assertEqual(len([query for query in queries.captured_queries if 'pro_grade' in query['sql']]), 1)
+        self.assertStandingConsistent()
+        with self.assertNumQueries(1):
+            honours = list(honour_roll())
+        with self.assertNumQueries(1):
+            on_probation = list(probation())
+        self.assertTrue(honours or on_probation)
+        self.assertTrue(all(standing.gpa >= Decimal('3.5') for standing in honours))
+        self.assertTrue(all(standing.gpa < Decimal('2.0') for standing in on_probation))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TimetableClashTests(TestCase):
+    def setUp(self):
+        self.data = generate_university(scale=0.01, seed=SEED, weeks=1, accounts=False)
+        self.student = self.data['students'][0]
+        self.instructor = self.data['instructors'][0]
+        Enrollment.objects.filter(student=self.student).delete()
+        self.taken = self.course_at('TT100', (0, clock(9), clock(10, 30)), (2, clock(14), clock(15)))
+        Enrollment.objects.create(student=self.student, course=self.taken, instructor=self.instructor)
+
+    def tearDown(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+    def course_at(self, code, *slots):
+        course = Course.objects.create(code=code, name=code, credit_hours=3, instructor=self.instructor)
+        for day_of_week, start_time, end_time in slots:
+            Schedule.objects.create(course=course, day_of_week=day_of_week, start_time=start_time, end_time=end_time)
+        return course
+
+    def test_interval_index_finds_overlaps_only(self):
+        index = student_interval_index(self.student)
+        self.assertEqual(index.overlapping(0, clock(10), clock(11)).course, self.taken)
+        self.assertEqual(index.overlapping(0, clock(8), clock(12)).course, self.taken)
+        self.assertIsNone(index.overlapping(0, clock(10, 30), clock(11)))
+        self.assertIsNone(index.overlapping(0, clock(8), clock(9)))
+        self.assertIsNone(index.overlapping(1, clock(9), clock(10)))
+
+    def test_enrollment_rejects_a_clashing_course(self):
+        clashing = self.course_at('TT200', (2, clock(14, 30), clock(15, 30)))
+        adjacent = self.course_at('TT300', (0, clock(10, 30), clock(12)))
+        form = EnrollmentForm({'course': clashing.pk}, student=self.student)
+        self.assertFalse(form.is_valid())
+        self.assertIn('clashes with TT100', str(form.errors['course']))
+        self.assertTrue(EnrollmentForm({'course': adjacent.pk}, student=self.student).is_valid())
+
+    def test_catalog_marks_clashing_courses_from_bitmaps(self):
+        clashing = self.course_at('TT200', (0, clock(10), clock(11)))
+        free = self.course_at('TT300', (4, clock(10), clock(11)))
+        busy = busy_bitmap(Schedule.objects.filter(course=self.taken))
+
+        def clash_flags():
+            courses, next_cursor, facets = catalog_page({}, busy=busy, size=10000)
+            return {course['id']: course['clashes'] for course in courses}
+
+        self.assertEqual((clash_flags()[clashing.pk], clash_flags()[free.pk]), (True, False))
+        # Moving a slot drops the cached course masks and catalog.
+        schedule = Schedule.objects.get(course=clashing)
+        schedule.day_of_week = 4
+        schedule.save()
+        self.assertFalse(clash_flags()[clashing.pk])
+
+    def test_course_masks_are_kept_in_the_shared_cache(self):
+        course_masks()
+        self.assertIsNotNone(caches['dashboard'].get(COURSE_MASKS_KEY))
+        self.assertIsNone(caches['default'].get(COURSE_MASKS_KEY))
+        self.course_at('TT500', (3, clock(8), clock(9)))
+        self.assertIsNone(caches['dashboard'].get(COURSE_MASKS_KEY))
+
+    def test_moving_a_slot_to_another_course_refreshes_the_old_students(self):
+        self.assertTrue(get_student_snapshot(self.student.pk)['busy_bitmap'])
+        schedule = Schedule.objects.filter(course=self.taken).first()
+        schedule.course = self.course_at('TT400')
+        schedule.save()
+        snapshot = get_student_snapshot(self.student.pk)
+        self.assertNotIn(schedule.pk, [slot.pk for slot in snapshot['schedules']])
+        self.assertEqual(snapshot['busy_bitmap'], busy_bitmap(Schedule.objects.filter(course=self.taken)))
+
+
+@override_settings(CACHES=TEST_CACHES, SECRET_KEY='test-feed-secret')
+class TimetableFeedTests(TestCase):
+    def setUp(self):
+        self.data = generate_university(scale=0.01, seed=SEED, weeks=1, accounts=False)
+        self.student = self.data['students'][0]
+        self.token = feed_token(self.student.pk)
+        self.schedules = Schedule.objects.filter(course__enrollment__student=self.student)
+
+    def tearDown(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+    def fetch(self, fmt='json', **headers):
+        return self.client.get(reverse(f'timetable_{fmt}', args=[self.token]), headers=headers)
+
+    def test_polls_with_validators_get_304_without_queries(self):
+        response = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        slots = [slot for day in response.json()['days'] for slot in day['slots']]
+        self.assertEqual(len(slots), self.schedules.count())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.fetch(if_none_match=response['ETag']).status_code, 304)
+            self.assertEqual(self.fetch('ics', if_modified_since=response['Last-Modified']).status_code, 304)
+            self.assertEqual(self.fetch().status_code, 200)
+
+    def test_schedule_change_issues_a_new_version(self):
+        etag = self.fetch()['ETag']
+        schedule = self.schedules.first()
+        schedule.start_time = clock(7, 5)
+        schedule.save()
+        response = self.fetch(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('07:05', response.content.decode())
+        etag = response['ETag']
+        Enrollment.objects.filter(student=self.student).first().delete()
+        self.assertNotEqual(self.fetch()['ETag'], etag)
+
+    def test_ics_feed_and_tokens(self):
+        response = self.fetch('ics')
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = response.content.decode()
+        self.assertEqual(body.count('BEGIN:VEVENT'), self.schedules.count())
+        self.assertIn('RRULE:FREQ=WEEKLY;BYDAY=', body)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split('\r\n')))
+        forged = reverse('timetable_ics', args=[f'{self.student.pk + 1}:{self.token.split(":")[1]}'])
+        self.assertEqual(self.client.get(forged).status_code, 404)
+
+    def test_renaming_the_student_issues_a_new_version(self):
+        etag = self.fetch('ics')['ETag']
+        self.student.name = 'Renamed Student'
+        self.student.save()
+        response = self.fetch('ics', if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Timetable - Renamed Student', response.content.decode())
+
+    def test_feeds_are_off_with_a_public_secret_key(self):
+        with override_settings(SECRET_KEY='your-default-secret-key'):
+            self.assertIsNone(feed_token(self.student.pk))
+            self.assertEqual(self.fetch().status_code, 404)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CourseCatalogTests(TestCase):
+    def setUp(self):
+        self.data = generate_university(scale=0.02, seed=SEED, weeks=1, accounts=False)
+        self.student = self.data['students'][0]
+        self.user = User.objects.create_user(self.student.university_email, self.student.university_email, SYNTHETIC_PASSWORD)
+        self.client.force_login(self.user)
+        session = self.client.session
+        session[SESSION_ROLE_KEY] = [STUDENT, self.student.pk]
+        session.save()
+
+    def tearDown(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+    def browse(self, **params):
+        response = self.client.get(reverse('course_catalog'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_cover_the_filtered_catalog_once(self):
+        enrolled = set(Enrollment.objects.filter(student=self.student).values_list('course_id', flat=True))
+        expected = set(Course.objects.filter(faculty='Science', credit_hours=3).exclude(pk__in=enrolled).values_list('pk', flat=True))
+        seen, after = [], ''
+        while True:
+            page = self.browse(faculty='Science', credit_hours=3, after=after)
+            seen += [course['id'] for course in page['courses']]
+            if not page['next']:
+                break
+            after = page['next']
+        self.assertEqual(sorted(seen), sorted(expected))
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(sum(page['facets']['faculty'].values()), Course.objects.count())
+
+    def test_fits_filter_and_cached_pages_skip_the_database(self):
+        self.browse()
+        with CaptureQueriesContext(connection) as queries:
+            courses = self.browse(fits='on')['courses']
+        # Only the session lookups remain once the catalog and the snapshot are cached.
+        self.assertFalse([query['sql'] for query in queries.captured_queries if '"pro_' in query['sql']])
+        self.assertFalse(any(course['clashes'] for course in courses))
+        self.assertEqual(self.client.get(reverse('course_catalog'), {'after': 'not-a-cursor'}).status_code, 400)
+
+    def test_catalog_is_kept_in_the_shared_cache(self):
+        self.browse()
+        self.assertIsNotNone(caches['dashboard'].get(CATALOG_KEY))
+        self.assertIsNone(caches['default'].get(CATALOG_KEY))
+        Course.objects.create(code='SC100', name='Shared', credit_hours=3, instructor=Course.objects.first().instructor)
+        self.assertIsNone(caches['dashboard'].get(CATALOG_KEY))
+
+    def test_free_slot_filter_keeps_courses_inside_the_window(self):
+        instructor = Course.objects.first().instructor
+        inside, overlapping = (Course.objects.create(code=code, name=code, credit_hours=3, instructor=instructor) for code in ('FS100', 'FS200'))
+        Schedule.objects.create(course=inside, day_of_week=4, start_time=clock(9), end_time=clock(10, 30))
+        Schedule.objects.create(course=overlapping, day_of_week=4, start_time=clock(11), end_time=clock(13))
+        ids = [course['id'] for course in self.browse(day=4, start='09:00', end='12:00')['courses']]
+        self.assertIn(inside.pk, ids)
+        self.assertNotIn(overlapping.pk, ids)
+        outside = Schedule.objects.filter(course_id__in=ids).exclude(day_of_week=4, start_time__gte=clock(9), end_time__lte=clock(12))
+        self.assertFalse(outside.exists())
+        self.assertEqual(self.client.get(reverse('course_catalog'), {'start': '12:00', 'end': '09:00'}).status_code, 400)
+
+    def test_enrollment_form_takes_a_course_id_without_rendering_the_catalog(self):
+        Enrollment.objects.filter(student=self.student).delete()
+        course = Course.objects.first()
+        with self.assertNumQueries(0):
+            rendered = str(EnrollmentForm(student=self.student))
+        self.assertIn('type="hidden"', rendered)
+        self.assertTrue(EnrollmentForm({'course': course.pk}, student=self.student).is_valid())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SearchTests(TestCase):
+    def setUp(self):
+        self.data = generate_university(scale=0.02, seed=SEED, weeks=1, accounts=False)
+        self.student = self.data['students'][0]
+        self.course = Enrollment.objects.filter(student=self.student).select_related('course__instructor').first().course
+        self.instructor = self.course.instructor
+
+    def tearDown(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+    def log_in_as_student(self):
+        user = User.objects.create_user(self.student.university_email, self.student.university_email, SYNTHETIC_PASSWORD)
+        self.client.force_login(user)
+        session = self.client.session
+        session[SESSION_ROLE_KEY] = [STUDENT, self.student.pk]
+        session.save()
+
+    def find(self, index, query):
+        return list(ranked(SEARCH_INDEXES[index]['model'].objects.all(), index, query).values_list('pk', flat=True))
+
+    def test_index_follows_orm_writes_that_skip_signals(self):
+        Course.objects.bulk_create([Course(code='ZZQ100', name='Quasicrystal Optics', credit_hours=3, instructor=self.instructor)])
+        course = Course.objects.get(code='ZZQ100')
+        self.assertEqual(self.find('courses', 'quasicr'), [course.pk])
+        Course.objects.filter(pk=course.pk).update(name='Topological Matter')
+        self.assertEqual(self.find('courses', 'quasicr'), [])
+        self.assertEqual(self.find('courses', 'topolog matt'), [course.pk])
+        Course.objects.filter(pk=course.pk).delete()
+        self.assertEqual(self.find('courses', 'topolog'), [])
+        for index in SEARCH_INDEXES:
+            self.assertTrue(check_search_index(index), index)
+        call_command('rebuild_search_index', check=True, stdout=io.StringIO())
+
+    def test_name_matches_rank_above_other_columns(self):
+        by_faculty = Course.objects.create(code='ZZQ201', name='Lattice Theory', faculty='Zymurgy', credit_hours=3, instructor=self.instructor)
+        by_name = Course.objects.create(code='ZZQ202', name='Zymurgy Fundamentals', faculty='Science', credit_hours=3, instructor=self.instructor)
+        self.assertEqual(self.find('courses', 'zym'), [by_name.pk, by_faculty.pk])
+        self.assertEqual(self.find('courses', '"*) (zym:'), [by_name.pk, by_faculty.pk])
+        self.assertEqual(self.find('courses', '  '), [])
+
+    def test_admin_search_uses_the_index(self):
+        superuser = User.objects.create_superuser('search-admin', 'search-admin@uni.edu', SYNTHETIC_PASSWORD)
+        self.client.force_login(superuser)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:pro_student_changelist'), {'q': self.student.name.split()[0]})
+        self.assertContains(response, self.student.student_id)
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertIn('MATCH', sql)
+        self.assertNotIn('LIKE', sql)
+
+    def test_endpoint_only_searches_what_the_user_may_see(self):
+        other = self.data['students'][1]
+        own = SentEmail.objects.create(sender_student=self.student, recipient_email='x@uni.edu', subject='Xylophone practice', message='Room 4')
+        SentEmail.objects.create(sender_student=other, recipient_email='y@uni.edu', subject='Xylophone lessons', message='Room 5')
+        self.log_in_as_student()
+        response = self.client.get(reverse('search'), {'q': 'xylo'})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertNotIn('students', results)
+        self.assertEqual([row['id'] for row in results['messages']], [own.pk])
+        self.assertEqual(self.client.get(reverse('search'), {'q': 'xylo', 'kind': 'students'}).status_code, 404)
+        courses = self.client.get(reverse('search'), {'q': self.course.code, 'kind': 'courses'}).json()['results']['courses']
+        self.assertEqual(courses[0]['id'], self.course.pk)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AnnouncementFanoutTests(TestCase):
+    def setUp(self):
+        self.data = generate_university(scale=0.01, seed=SEED, weeks=1, accounts=False)
+        # An instructor teaching at least two courses, so one student can be in both.
+        instructor_id = Course.objects.values('instructor').annotate(courses=Count('id')).filter(courses__gte=2).values_list('instructor', flat=True)[0]
+        self.instructor = Instructor.objects.get(pk=instructor_id)
+
+    def tearDown(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+    def announce(self, title):
+        return Announcement.objects.create(title=title, content=f'{title} details', instructor=self.instructor, fanout_pending=True)
+
+    def test_each_student_is_notified_once(self):
+        first, second = Course.objects.filter(instructor=self.instructor)[:2]
+        student = self.data['students'][0]
+        for course in (first, second):
+            Enrollment.objects.get_or_create(student=student, course=course, defaults={'instructor': self.instructor})
+        audience = set(Enrollment.objects.filter(instructor=self.instructor).values_list('student_id', flat=True))
+        announcement = self.announce('Exam')
+        self.assertEqual(fan_out_announcement(announcement.pk), len(audience))
+        Announcement.objects.filter(pk=announcement.pk).update(fanout_pending=True)
+        fan_out_announcement(announcement.pk)
+        notifications = Notification.objects.filter(announcement=announcement)
+        self.assertEqual(sorted(notifications.values_list('student_id', flat=True)), sorted(audience))
+        self.assertEqual(fan_out_announcement(announcement.pk), 0)
+
+    def test_command_delivers_pending_announcements(self):
+        pending = [self.announce('Exam'), self.announce('Trip')]
+        call_command('fanout_announcements', stdout=io.StringIO())
+        self.assertFalse(Announcement.objects.filter(fanout_pending=True).exists())
+        for announcement in pending:
+            self.assertTrue(Notification.objects.filter(announcement=announcement).exists())
+
+    def test_notifications_outlive_their_announcement(self):
+        announcement = self.announce('Exam')
+        fan_out_announcement(announcement.pk)
+        notifications = Notification.objects.filter(announcement=announcement)
+        self.assertEqual(set(notifications.values_list('message', flat=True)), {''})
+
+        user = User.objects.create_user(self.instructor.email, self.instructor.email, SYNTHETIC_PASSWORD)
+        self.client.force_login(user)
+        session = self.client.session
+        session[SESSION_ROLE_KEY] = [INSTRUCTOR, self.instructor.pk]
+        session.save()
+        self.client.post(reverse('instructor_dashboard'), {'action': 'delete_announcement', 'announcement_id': announcement.pk})
+        announcement.refresh_from_db()
+        self.assertIsNotNone(announcement.deleted_at)
+        self.assertNotIn(announcement, self.client.get(reverse('instructor_dashboard')).context['announcements'])
+        self.assertEqual({notification.body for notification in notifications.select_related('announcement')}, {'Exam details'})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class NotificationCounterTests(TestCase):
+    def setUp(self):
+        self.data = generate_university(scale=0.02, seed=SEED, weeks=1, accounts=False)
+        self.student = self.data['students'][0]
+        self.instructor = self.data['instructors'][0]
+
+    def tearDown(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+    def unread(self, student):
+        return Notification.objects.filter(student=student, is_read=False).count()
+
+    def assertCountersConsistent(self):
+        call_command('rebuild_notification_counters', check=True, stdout=io.StringIO())
+
+    def test_counters_follow_saves_deletes_and_fan_out(self):
+        notification = Notification.objects.create(student=self.student, subject='Hello')
+        self.assertEqual(NotificationCounter.objects.unread('student', self.student.pk), self.unread(self.student))
+        notification.student = self.data['students'][1]
+        notification.save()
+        notification.is_read = True
+        notification.save()
+        Notification.objects.create(instructor=self.instructor, subject='Hello').delete()
+        self.assertCountersConsistent()
+
+        announcement = Announcement.objects.create(title='Exam', content='Room 4', instructor=self.instructor, fanout_pending=True)
+        fan_out_announcement(announcement.pk)
+        Announcement.objects.filter(pk=announcement.pk).update(fanout_pending=True)
+        fan_out_announcement(announcement.pk)
+        self.assertCountersConsistent()
+
+    def test_mark_all_read_is_one_update(self):
+        self.assertTrue(self.unread(self.student))
+        with CaptureQueriesContext(connection) as queries:
+            mark_notifications_read(self.student)
+        touching = [query['sql'] for query in queries.captured_queries if '"pro_notification"' in query['sql']]
+        self.assertEqual(len(touching), 1)
+        self.assertTrue(touching[0].startswith('UPDATE'))
+        self.assertEqual(self.unread(self.student), 0)
+        self.assertEqual(NotificationCounter.objects.unread('student', self.student.pk), 0)
+
+    def test_bulk_delete_only_touches_the_owners_notifications(self):
+        own = list(Notification.objects.filter(student=self.student).values_list('pk', flat=True))
+        other = Notification.objects.filter(student=self.data['students'][1]).first()
+        self.assertEqual(delete_notifications(self.student, own + [other.pk]), len(own))
+        self.assertTrue(Notification.objects.filter(pk=other.pk).exists())
+        self.assertEqual(NotificationCounter.objects.unread('student', self.student.pk), 0)
+        self.assertCountersConsistent()
+
+    def test_single_notification_actions_are_owner_only(self):
+        user = User.objects.create_user(self.student.university_email, self.student.university_email, SYNTHETIC_PASSWORD)
+        self.client.force_login(user)
+        session = self.client.session
+        session[SESSION_ROLE_KEY] = [STUDENT, self.student.pk]
+        session.save()
+        url = reverse('student_dashboard', args=[self.student.pk])
+        other = Notification.objects.filter(student=self.data['students'][1], is_read=False).first()
+        for action in ('mark_notification_read', 'delete_notification'):
+            with self.subTest(action=action):
+                response = self.client.post(url, {action: '1', 'notification_id': other.pk})
+                self.assertEqual(response.status_code, 404)
+        other.refresh_from_db()
+        self.assertFalse(other.is_read)
+        own = Notification.objects.filter(student=self.student, is_read=False).first()
+        self.assertEqual(self.client.post(url, {'mark_notification_read': '1', 'notification_id': own.pk}).status_code, 302)
+        self.assertCountersConsistent()
+
+    def test_counter_belongs_to_exactly_one_owner(self):
+        NotificationCounter.objects.filter(student=self.student).delete()
+        for owners in ({}, {'student': self.student, 'instructor': self.instructor}):
+            with self.subTest(owners=owners), self.assertRaises(IntegrityError), transaction.atomic():
+                NotificationCounter.objects.create(**owners)
+
+    def test_archive_moves_old_read_notifications_in_batches(self):
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=100))
+        read = Notification.objects.filter(is_read=True).count()
+        unread = Notification.objects.filter(is_read=False).count()
+        self.assertEqual(archive_notifications(90, batch_size=7), read)
+        self.assertEqual(ArchivedNotification.objects.count(), read)
+        self.assertEqual(Notification.objects.count(), unread)
+        self.assertEqual(archive_notifications(90), 0)
+        self.assertCountersConsistent()
+
+    def test_badge_is_one_indexed_read(self):
+        user = User.objects.create_user(self.student.university_email, self.student.university_email, SYNTHETIC_PASSWORD)
+        self.client.force_login(user)
+        session = self.client.session
+        session[SESSION_ROLE_KEY] = [STUDENT, self.student.pk]
+        session.save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('notification_badge'))
+        self.assertEqual(response.json(), {'unread': self.unread(self.student)})
+        app_queries = [query['sql'] for query in queries.captured_queries if '"pro_' in query['sql']]
+        self.assertEqual(len(app_queries), 1)
+        self.assertIn('"pro_notificationcounter"', app_queries[0])
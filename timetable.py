@@ -0,0 +1,123 @@
+from bisect import bisect_left
+from .models import Schedule, shared_cache
+
+
+#########################################################################################################
+                                        #TIMETABLE CLASHES#
+#########################################################################################################
+
+# Slots are half-open [start, end): a class ending at 10:00 does not clash with one starting at 10:00.
+#
+# Enrollment is validated exactly against an IntervalIndex of the student's current slots. The course
+# catalog only needs a hint, so it compares 15-minute bitmaps of the week: the student's busy bitmap
+# (kept in the dashboard snapshot) ANDed with each course's mask (cached for the whole catalog).
+# Masks round outward to whole buckets, so slots off the quarter hour can be flagged without
+# clashing; the catalog only marks such courses and enrollment itself decides. The catalog's
+# free-slot filter keeps courses whose mask lies inside a window mask of the week.
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+COURSE_MASKS_KEY = 'pro:timetable:course-masks'
+COURSE_MASKS_TIMEOUT = 60 * 60
+
+
+def minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def slot_mask(day_of_week, start_time, end_time):
+    """The 15-minute buckets of the week a slot touches, as bits of an int."""
+    first = minutes(start_time) // SLOT_MINUTES
+    last = -(-minutes(end_time) // SLOT_MINUTES)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << (day_of_week * SLOTS_PER_DAY + first)
+
+
+def window_mask(day_of_week=None, start_time=None, end_time=None):
+    """
+    The buckets lying wholly inside a window of the week: `day_of_week` (every day when None) from
+    `start_time` to `end_time` (the start and end of the day when None). None when no bound is given.
+    """
+    if day_of_week is None and start_time is None and end_time is None:
+        return None
+    # Round inward, the opposite of slot_mask, so a slot off the quarter hour is only inside if it fits.
+    first = -(-minutes(start_time) // SLOT_MINUTES) if start_time else 0
+    last = minutes(end_time) // SLOT_MINUTES if end_time else SLOTS_PER_DAY
+    if last <= first:
+        return 0
+    days = [day_of_week] if day_of_week is not None else [day for day, name in Schedule.DAY_OF_WEEK_CHOICES]
+    return sum(((1 << (last - first)) - 1) << (day * SLOTS_PER_DAY + first) for day in days)
+
+
+def busy_bitmap(schedules):
+    """OR of the masks of `schedules` (Schedule rows or (day, start, end) tuples)."""
+    bitmap = 0
+    for schedule in schedules:
+        if isinstance(schedule, Schedule):
+            schedule = (schedule.day_of_week, schedule.start_time, schedule.end_time)
+        bitmap |= slot_mask(*schedule)
+    return bitmap
+
+
+def course_masks():
+    """{course_id: mask} for every course with a schedule, from one query and then the cache."""
+    masks = shared_cache().get(COURSE_MASKS_KEY)
+    if masks is None:
+        masks = {}
+        for course_id, day_of_week, start_time, end_time in Schedule.objects.values_list(
+            'course_id', 'day_of_week', 'start_time', 'end_time',
+        ).order_by().iterator():
+            masks[course_id] = masks.get(course_id, 0) | slot_mask(day_of_week, start_time, end_time)
+        shared_cache().set(COURSE_MASKS_KEY, masks, COURSE_MASKS_TIMEOUT)
+    return masks
+
+
+def invalidate_course_masks():
+    shared_cache().delete(COURSE_MASKS_KEY)
+
+
+class IntervalIndex:
+    """
+    Per-day slots sorted by start time with a running maximum of the end times, so whether
+    [start, end) overlaps anything is one binary search: among the slots starting before
+    `end`, the one that ends latest overlaps if anything does.
+    """
+
+    def __init__(self, schedules):
+        by_day = {}
+        for schedule in schedules:
+            by_day.setdefault(schedule.day_of_week, []).append(
+                (minutes(schedule.start_time), minutes(schedule.end_time), schedule)
+            )
+        self.days = {}
+        for day, slots in by_day.items():
+            slots.sort(key=lambda slot: slot[0])
+            starts, latest = [], []
+            for slot in slots:
+                starts.append(slot[0])
+                latest.append(slot if not latest or slot[1] > latest[-1][1] else latest[-1])
+            self.days[day] = (starts, latest)
+
+    def overlapping(self, day_of_week, start_time, end_time):
+        """A Schedule overlapping the slot, or None."""
+        if day_of_week not in self.days:
+            return None
+        starts, latest = self.days[day_of_week]
+        count = bisect_left(starts, minutes(end_time))
+        if count and latest[count - 1][1] > minutes(start_time):
+            return latest[count - 1][2]
+        return None
+
+    def clashes(self, schedules):
+        """(new slot, existing slot) pairs for each of `schedules` that overlaps the index."""
+        pairs = []
+        for schedule in schedules:
+            existing = self.overlapping(schedule.day_of_week, schedule.start_time, schedule.end_time)
+            if existing is not None:
+                pairs.append((schedule, existing))
+        return pairs
+
+
+def student_interval_index(student):
+    return IntervalIndex(Schedule.objects.filter(course__enrollment__student=student).select_related('course'))
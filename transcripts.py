@@ -0,0 +1,56 @@
+from decimal import Decimal
+from .models import AcademicStanding, Grade, ZERO, grade_points
+
+
+#########################################################################################################
+                                        #TRANSCRIPTS#
+#########################################################################################################
+
+# GPA and credit totals come from AcademicStanding, which signals.py keeps current as grades and
+# course credit hours change. A transcript is two queries however many courses the student took.
+
+
+def transcript_rows(grades):
+    """
+    One row per Grade (with its course loaded) carrying the credit hours, grade points and
+    quality points. Letters outside GRADE_POINTS are listed without points.
+    """
+    points = grade_points()
+    rows = []
+    for grade in grades:
+        letter_points = points.get(grade.grade)
+        counted = letter_points is not None
+        rows.append({
+            'course': grade.course,
+            'grade': grade.grade,
+            'credit_hours': grade.course.credit_hours,
+            'points': Decimal(str(letter_points)).quantize(ZERO) if counted else None,
+            'quality_points': (Decimal(str(letter_points)) * grade.course.credit_hours).quantize(ZERO) if counted else None,
+        })
+    return rows
+
+
+def academic_standing(student):
+    """The stored standing, or an unsaved empty one for a student who has never been graded."""
+    return AcademicStanding.objects.filter(student=student).first() or AcademicStanding(student=student)
+
+
+def transcript(student):
+    """The student's graded courses plus the credit-weighted totals."""
+    standing = academic_standing(student)
+    return {
+        'student': student,
+        'rows': transcript_rows(Grade.objects.filter(student=student).select_related('course').order_by('course__code')),
+        'credits': standing.credits,
+        'quality_points': standing.quality_points,
+        'gpa': standing.gpa,
+    }
+
+
+def honour_roll():
+    return AcademicStanding.objects.honour_roll().select_related('student')
+
+
+def probation():
+    return AcademicStanding.objects.probation().select_related('student')
+
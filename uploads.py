@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+
+def max_upload_size():
+    return getattr(settings, 'MAX_UPLOAD_SIZE', 25 * 1024 * 1024)
+
+
+class SizeLimitedUploadHandler(FileUploadHandler):
+    """
+    Drop a file as soon as more than MAX_UPLOAD_SIZE bytes of it have arrived, before the
+    memory or temporary-file handlers after it have stored the rest. The names of dropped
+    fields are left in `request.oversized_uploads` for the form to report.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > max_upload_size():
+            if not hasattr(self.request, 'oversized_uploads'):
+                self.request.oversized_uploads = set()
+            self.request.oversized_uploads.add(self.field_name)
+            raise SkipFile()
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Let the next handler build the uploaded file object.
+        return None
+
+
+def oversized_uploads(request):
+    """Field names whose uploads were dropped for being too large; parses the body if needed."""
+    request.FILES
+    return getattr(request, 'oversized_uploads', set())
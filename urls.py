@@ -1,13 +1,20 @@
 #app urls.py
 from django.urls import path, include
 from django.contrib import admin
-from django.conf import settings
-from django.conf.urls.static import static
+from pro import views
 
 urlpatterns = [
     path('', include('pro.urls')),  # Include the app's URLs
      path('admin/', admin.site.urls),
-]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    path('instructor/sections/<slug:section>/', views.instructor_dashboard_section, name='instructor_dashboard_section'),
+    path('submissions/<int:submission_id>/download/', views.download_submission, name='download_submission'),
+    path('assignments/<int:assignment_id>/reference/', views.download_reference_document, name='download_reference_document'),
+    path('assignments/<int:assignment_id>/submissions.zip', views.download_assignment_submissions, name='download_assignment_submissions'),
+    path('exports/<slug:dataset>.csv', views.export_csv, name='export_csv'),
+    path('notifications/unread/', views.notification_badge, name='notification_badge'),
+    path('search/', views.search, name='search'),
+    path('catalog/courses/', views.course_catalog, name='course_catalog'),
+    path('timetable/<str:token>.json', views.timetable_feed, {'fmt': 'json'}, name='timetable_json'),
+    path('timetable/<str:token>.ics', views.timetable_feed, {'fmt': 'ics'}, name='timetable_ics'),
+    path('metrics/', views.request_metrics, name='request_metrics'),
+]
\ No newline at end of file
@@ -1,15 +1,37 @@
+import logging
+import os
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.csrf import csrf_protect
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+from django.utils.text import get_valid_filename
 from django.contrib import messages
-from django.core.mail import send_mail
-from .forms import RegistrationForm, CustomLoginForm, AnnouncementForm, SetPasswordForm, EnrollmentForm, PaymentForm, AssignmentForm, AssignmentSubmissionForm, EmailForm, GradeForm, AttendanceForm
-from .models import Instructor, Course, Assignment, Announcement, Student, Enrollment, StudentFee, Payment, Grade, AssignmentSubmission, Notification, SentEmail, Schedule, Attendance
+from django.db import transaction
+from .forms import RegistrationForm, CustomLoginForm, AnnouncementForm, SetPasswordForm, EnrollmentForm, PaymentForm, AssignmentForm, AssignmentSubmissionForm, EmailForm, GradeForm, AttendanceForm, AttendanceSheetForm, ExportFilterForm, CatalogFilterForm
+from .attendance import at_risk_students, course_attendance_rates, recent_sessions, record_attendance
+from .catalog import catalog_page
+from .dashboard import get_student_snapshot
+from .downloads import can_download_reference, can_download_submission, serve_file, stream_submission_archive
+from .exports import EXPORTS, export_queryset, stream_csv
+from .feeds import feed_token, student_for_token, timetable_bodies
+from .metrics import render_prometheus
+from .notifications import delete_notifications, mark_notifications_read, schedule_announcement_fanout, unread_count
+from .outbox import queue_email
+from .pagination import keyset_page
+from .roles import INSTRUCTOR, STUDENT, remember_role, resolve_role, session_role
+from .search import search_results, search_scopes
+from .uploads import oversized_uploads
+from .models import Instructor, Course, Assignment, Announcement, Student, Enrollment, Grade, AssignmentSubmission, Notification, NotificationCounter, SentEmail, Schedule, Attendance
 import uuid
 
+logger = logging.getLogger(__name__)
+
 #########################################################################################################
                                         #REGISTER_OR_LOGIN#
 #########################################################################################################
@@ -60,22 +82,16 @@ def register_or_login(request):
                 user = authenticate(request, username=username, password=password)
                 if user is not None:
                     login(request, user)
-                    if Student.objects.filter(university_email=user.email).exists():
-                        try:
-                            student = Student.objects.get(university_email=user.email)
-                            messages.success(request, 'Logged in successfully.')
-                            return redirect('student_dashboard', student_id=student.id)
-                        except Student.DoesNotExist:
-                            messages.error(request, 'Student not found. Please contact the administrator.')
-                    elif Instructor.objects.filter(email=user.email).exists():
-                        try:
-                            instructor = Instructor.objects.get(email=user.email)
-                            messages.success(request, 'Logged in successfully.')
-                            return redirect('instructor_dashboard')
-                        except Instructor.DoesNotExist:
-                            messages.error(request, 'Instructor not found. Please contact the administrator.')
-                    else:
+                    role = resolve_role(user.email)
+                    if role is None:
                         messages.error(request, 'User type not found. Please contact the administrator.')
+                    else:
+                        remember_role(request, role)
+                        messages.success(request, 'Logged in successfully.')
+                        role_name, profile_id = role
+                        if role_name == STUDENT:
+                            return redirect('student_dashboard', student_id=profile_id)
+                        return redirect('instructor_dashboard')
                 else:
                     messages.error(request, 'Invalid university email or password.')
             else:
@@ -96,32 +112,17 @@ def register_or_login(request):
 @csrf_protect
 @login_required(login_url='/')
 def student_dashboard(request, student_id):
-    print("student_dashboard view called") 
-    student = get_object_or_404(Student, id=student_id)
-    enrollments = Enrollment.objects.filter(student=student)
-    courses = [enrollment.course for enrollment in enrollments]
-    instructors = Instructor.objects.filter(course__in=courses).distinct()
-    schedules = Schedule.objects.filter(course__in=courses)
-
-    student_fee, created = StudentFee.objects.get_or_create(student=student)
-    if not student_fee:
-        raise AttributeError("StudentFee object could not be created or retrieved.")
-
-    payments = Payment.objects.filter(student=student)
-    total_paid = student_fee.total_paid
-    remaining_balance = student_fee.remaining_balance
-    grades = Grade.objects.filter(student=student)
-    assignments = Assignment.objects.filter(course__in=courses).distinct().select_related('instructor')
-    submissions = AssignmentSubmission.objects.filter(student=student)
-    submitted_assignment_ids = submissions.values_list('assignment_id', flat=True)
-    notifications = Notification.objects.filter(student=student).order_by('-created_at')
-    student_sent_emails = SentEmail.objects.filter(sender_student=student).order_by('-sent_at')
+    logger.debug("student_dashboard called for student %s", student_id)
+    role, profile_id = session_role(request)
+    if role == STUDENT and profile_id != student_id:
+        return redirect('student_dashboard', student_id=profile_id)
+    snapshot = get_student_snapshot(student_id)
+    student = snapshot['student']
+    student_fee = snapshot['student_fee']
 
     if request.method == 'POST':
         action = request.POST.get('action')
-        print("POST request received")
-        action = request.POST.get('action')
-        print(f"Action received: {action}")
+        logger.debug("student_dashboard POST with action %r", action)
 
         if action == 'send_email':
             email_form = EmailForm(request.POST)
@@ -130,40 +131,37 @@ def student_dashboard(request, student_id):
                 subject = email_form.cleaned_data['subject']
                 message = email_form.cleaned_data['message']
 
-                try:
-                    send_mail(subject, message, f"{student.name} <{student.university_email}>", [recipient_email])
-                except Exception as e:
-                    messages.error(request, 'Failed to send email.')
-                    return redirect('student_dashboard', student_id=student.id)
-
                 recipient_student = Student.objects.filter(university_email=recipient_email).first()
                 recipient_instructor = Instructor.objects.filter(email=recipient_email).first()
 
-                sent_email = SentEmail.objects.create(
-                    sender_student=student,
-                    recipient_student=recipient_student,
-                    recipient_instructor=recipient_instructor,
-                    recipient_email=recipient_email,
-                    subject=subject,
-                    message=message,
-                    sent_at=timezone.now()
-                )
-
-                if recipient_student:
-                    Notification.objects.create(
-                        student=recipient_student,
-                        subject=f'Email from {student.name}',
-                        message=message,
-                        created_at=timezone.now()
-                    )
-                elif recipient_instructor:
-                    Notification.objects.create(
-                        instructor=recipient_instructor,
-                        subject=f'Email from {student.name}',
+                with transaction.atomic():
+                    sent_email = SentEmail.objects.create(
+                        sender_student=student,
+                        recipient_student=recipient_student,
+                        recipient_instructor=recipient_instructor,
+                        recipient_email=recipient_email,
+                        subject=subject,
                         message=message,
-                        created_at=timezone.now()
+                        sent_at=timezone.now()
                     )
 
+                    if recipient_student:
+                        Notification.objects.create(
+                            student=recipient_student,
+                            subject=f'Email from {student.name}',
+                            message=message,
+                            created_at=timezone.now()
+                        )
+                    elif recipient_instructor:
+                        Notification.objects.create(
+                            instructor=recipient_instructor,
+                            subject=f'Email from {student.name}',
+                            message=message,
+                            created_at=timezone.now()
+                        )
+
+                    queue_email(subject, message, f"{student.name} <{student.university_email}>", recipient_email, sent_email=sent_email)
+
                 messages.success(request, 'Email sent successfully!')
                 return redirect('student_dashboard', student_id=student.id)
             else:
@@ -177,38 +175,42 @@ def student_dashboard(request, student_id):
             return redirect('student_dashboard', student_id=student.id)
 
         elif 'mark_notification_read' in request.POST:
-            notification_id = request.POST.get('notification_id')
-            notification = get_object_or_404(Notification, id=notification_id, student=student)
-            notification.is_read = True
-            notification.save()
+            notification = get_object_or_404(Notification, id=request.POST.get('notification_id'), student=student)
+            mark_notifications_read(student, [notification.pk])
             messages.success(request, 'Notification marked as read.')
             return redirect('student_dashboard', student_id=student.id)
 
+        elif 'mark_all_notifications_read' in request.POST:
+            marked = mark_notifications_read(student)
+            messages.success(request, f'{marked} notifications marked as read.')
+            return redirect('student_dashboard', student_id=student.id)
+
         elif 'delete_notification' in request.POST:
-            notification_id = request.POST.get('notification_id')
-            notification = get_object_or_404(Notification, id=notification_id, student=student)
-            notification.delete()
+            notification = get_object_or_404(Notification, id=request.POST.get('notification_id'), student=student)
+            delete_notifications(student, [notification.pk])
             messages.success(request, 'Notification deleted successfully.')
             return redirect('student_dashboard', student_id=student.id)
 
+        elif 'delete_notifications' in request.POST:
+            deleted = delete_notifications(student, notification_ids(request))
+            messages.success(request, f'{deleted} notifications deleted.')
+            return redirect('student_dashboard', student_id=student.id)
+
         form = EnrollmentForm(request.POST, student=student)
         payment_form = PaymentForm(request.POST, student_fee=student_fee)
-        assignment_form = AssignmentSubmissionForm(request.POST, request.FILES)
+        assignment_form = AssignmentSubmissionForm(request.POST, request.FILES, oversized_uploads=oversized_uploads(request))
         email_form = EmailForm(request.POST)
 
         if 'enroll' in request.POST:
-            print(f"Enrollment form data: {form.data}")
             if form.is_valid():
-                print("Enrollment form is valid.")
                 enrollment = form.save(commit=False)
                 enrollment.student = student
                 enrollment.instructor = enrollment.course.instructor
                 enrollment.save()
-                student_fee.save()  # Update StudentFee after new enrollment
                 messages.success(request, 'Enrollment successful!')
                 return redirect('student_dashboard', student_id=student.id)
             else:
-                print(f"Enrollment form errors: {form.errors}")  # Debugging statement
+                logger.info("Enrollment form for student %s is invalid: %s", student.pk, form.errors.as_json())
                 messages.error(request, 'Enrollment form is not valid.')
             
         elif 'pay' in request.POST:
@@ -217,7 +219,6 @@ def student_dashboard(request, student_id):
                 payment.student = student
                 payment.transaction_id = str(uuid.uuid4())
                 payment.save()
-                student_fee.save()  # Update StudentFee after payment
                 return redirect('student_dashboard', student_id=student.id)
             
         elif 'submit_assignment' in request.POST:
@@ -245,23 +246,12 @@ def student_dashboard(request, student_id):
         email_form = EmailForm()
 
     context = {
-        'student': student,
-        'courses': courses,
-        'instructors': instructors,
-        'total_fee': student_fee.total_fee,
-        'total_paid': total_paid,
-        'remaining_balance': remaining_balance,
+        **snapshot,
         'form': form,
         'payment_form': payment_form,
         'assignment_form': assignment_form,
         'email_form': email_form,
-        'payments': payments,
-        'grades': grades,
-        'assignments': assignments,
-        'submitted_assignment_ids': list(submitted_assignment_ids),  # Convert to list for template use
-        'notifications': notifications,
-        'schedules': schedules,
-        'student_sent_emails': student_sent_emails,  # Include student sent emails in context
+        'timetable_token': feed_token(student.id),
     }
     return render(request, 'pro/student_dashboard.html', context)
 
@@ -272,26 +262,58 @@ def student_dashboard(request, student_id):
 #########################################################################################################
 
 
+def get_instructor_for(request):
+    role, profile_id = session_role(request)
+    if role != INSTRUCTOR:
+        raise Http404("No instructor profile for this account.")
+    return get_object_or_404(Instructor, pk=profile_id)
+
+
+# Sections of the instructor dashboard that grow all semester:
+# slug -> (context name, keyset ordering, queryset for an instructor).
+INSTRUCTOR_SECTIONS = {
+    'attendance': (
+        'attendance_records', ('-date', '-id'),
+        lambda instructor: Attendance.objects.filter(course__instructor=instructor).select_related('student', 'course', 'schedule__course'),
+    ),
+    'grades': (
+        'grades', ('-id',),
+        lambda instructor: Grade.objects.filter(course__instructor=instructor).select_related('student', 'course'),
+    ),
+    'submissions': (
+        'assignment_submissions', ('-submitted_at', '-id'),
+        lambda instructor: AssignmentSubmission.objects.filter(assignment__instructor=instructor).select_related('assignment', 'student'),
+    ),
+    'enrollments': (
+        'enrollments', ('-id',),
+        lambda instructor: Enrollment.objects.filter(course__instructor=instructor).select_related('student', 'course'),
+    ),
+    'notifications': (
+        'notifications', ('-created_at', '-id'),
+        lambda instructor: Notification.objects.filter(instructor=instructor).select_related('announcement'),
+    ),
+    'sent_emails': (
+        'sent_emails', ('-sent_at', '-id'),
+        lambda instructor: SentEmail.objects.filter(sender_instructor=instructor),
+    ),
+}
+
+
 @csrf_protect
 @login_required(login_url='/')
 def instructor_dashboard(request):
-    instructor = get_object_or_404(Instructor, email=request.user.email)
+    instructor = get_instructor_for(request)
     courses = Course.objects.filter(instructor=instructor)
-    schedules = Schedule.objects.filter(course__in=courses)
-    enrollments = Enrollment.objects.filter(course__in=courses).select_related('student', 'course')
+    schedules = Schedule.objects.filter(course__in=courses).select_related('course')
     assignments = Assignment.objects.filter(instructor=instructor)
-    announcements = Announcement.objects.filter(instructor=instructor)
-    sent_emails = SentEmail.objects.filter(sender_instructor=instructor).order_by('-sent_at')
-    notifications = Notification.objects.filter(instructor=instructor).order_by('-created_at').distinct()
-    grades = Grade.objects.filter(course__in=courses).select_related('student', 'course')
-    assignment_submissions = AssignmentSubmission.objects.filter(assignment__in=assignments).select_related('assignment', 'student')
+    announcements = Announcement.objects.filter(instructor=instructor, deleted_at__isnull=True)
 
     assignment_form = AssignmentForm()
     announcement_form = AnnouncementForm()
     email_form = EmailForm()
     grade_form = GradeForm(instructor=instructor)
     attendance_form = AttendanceForm(instructor=instructor)
-    attendance_records = Attendance.objects.filter(course__in=courses).select_related('student', 'course', 'schedule')
+    attendance_sheet_form = AttendanceSheetForm(instructor=instructor)
 
     students = Student.objects.filter(enrollment__course__in=courses).distinct()
 
@@ -304,40 +326,37 @@ def instructor_dashboard(request):
                 subject = email_form.cleaned_data['subject']
                 message = email_form.cleaned_data['message']
 
-                try:
-                    send_mail(subject, message, f"{instructor.full_name} <{instructor.email}>", [recipient_email])
-                except Exception as e:
-                    messages.error(request, f'Failed to send email: {e}')
-                    return redirect('instructor_dashboard')
-
                 recipient_student = Student.objects.filter(university_email=recipient_email).first()
                 recipient_instructor = Instructor.objects.filter(email=recipient_email).first()
 
-                sent_email = SentEmail.objects.create(
-                    sender_instructor=instructor,
-                    recipient_student=recipient_student,
-                    recipient_instructor=recipient_instructor,
-                    recipient_email=recipient_email,
-                    subject=subject,
-                    message=message,
-                    sent_at=timezone.now()
-                )
-
-                if recipient_student:
-                    Notification.objects.create(
-                        student=recipient_student,
-                        subject=f'Email from {instructor.full_name}',
+                with transaction.atomic():
+                    sent_email = SentEmail.objects.create(
+                        sender_instructor=instructor,
+                        recipient_student=recipient_student,
+                        recipient_instructor=recipient_instructor,
+                        recipient_email=recipient_email,
+                        subject=subject,
                         message=message,
-                        created_at=timezone.now()
-                    )
-                elif recipient_instructor:
-                    Notification.objects.create(
-                        instructor=recipient_instructor,
-                        subject=f'Email from {instructor.full_name}',
-                        message=message,
-                        created_at=timezone.now()
+                        sent_at=timezone.now()
                     )
 
+                    if recipient_student:
+                        Notification.objects.create(
+                            student=recipient_student,
+                            subject=f'Email from {instructor.full_name}',
+                            message=message,
+                            created_at=timezone.now()
+                        )
+                    elif recipient_instructor:
+                        Notification.objects.create(
+                            instructor=recipient_instructor,
+                            subject=f'Email from {instructor.full_name}',
+                            message=message,
+                            created_at=timezone.now()
+                        )
+
+                    queue_email(subject, message, f"{instructor.full_name} <{instructor.email}>", recipient_email, sent_email=sent_email)
+
                 messages.success(request, 'Email sent successfully!')
                 return redirect('instructor_dashboard')
             else:
@@ -355,15 +374,9 @@ def instructor_dashboard(request):
             if announcement_form.is_valid():
                 new_announcement = announcement_form.save(commit=False)
                 new_announcement.instructor = instructor
+                new_announcement.fanout_pending = True
                 new_announcement.save()
-
-                for enrollment in enrollments:
-                    Notification.objects.create(
-                        student=enrollment.student,
-                        subject='New Announcement',
-                        message=new_announcement.content,
-                        created_at=timezone.now()
-                    )
+                schedule_announcement_fanout(new_announcement)
 
                 messages.success(request, 'Announcement made successfully!')
                 return redirect('instructor_dashboard')
@@ -372,13 +385,14 @@ def instructor_dashboard(request):
 
         elif action == 'delete_announcement':
             announcement_id = request.POST.get('announcement_id')
-            announcement = get_object_or_404(Announcement, id=announcement_id, instructor=instructor)
-            announcement.delete()
+            announcement = get_object_or_404(Announcement, id=announcement_id, instructor=instructor, deleted_at__isnull=True)
+            # Soft delete: the students' notifications still read their text from it.
+            Announcement.objects.filter(pk=announcement.pk).update(deleted_at=timezone.now(), fanout_pending=False)
             messages.success(request, 'Announcement deleted successfully!')
             return redirect('instructor_dashboard')
 
         elif 'add_assignment' in request.POST:
-            assignment_form = AssignmentForm(request.POST, request.FILES)
+            assignment_form = AssignmentForm(request.POST, request.FILES, oversized_uploads=oversized_uploads(request))
             if assignment_form.is_valid():
                 new_assignment = assignment_form.save(commit=False)
                 new_assignment.instructor = instructor
@@ -423,20 +437,27 @@ def instructor_dashboard(request):
             return redirect('instructor_dashboard')
 
         elif 'mark_notification_read' in request.POST:
-            notification_id = request.POST.get('notification_id')
-            notification = get_object_or_404(Notification, id=notification_id, instructor=instructor)
-            notification.is_read = True
-            notification.save()
+            notification = get_object_or_404(Notification, id=request.POST.get('notification_id'), instructor=instructor)
+            mark_notifications_read(instructor, [notification.pk])
             messages.success(request, 'Notification marked as read!')
             return redirect('instructor_dashboard')
 
+        elif 'mark_all_notifications_read' in request.POST:
+            marked = mark_notifications_read(instructor)
+            messages.success(request, f'{marked} notifications marked as read!')
+            return redirect('instructor_dashboard')
+
         elif 'delete_notification' in request.POST:
-            notification_id = request.POST.get('notification_id')
-            notification = get_object_or_404(Notification, id=notification_id, instructor=instructor)
-            notification.delete()
+            notification = get_object_or_404(Notification, id=request.POST.get('notification_id'), instructor=instructor)
+            delete_notifications(instructor, [notification.pk])
             messages.success(request, 'Notification deleted successfully.')
             return redirect('instructor_dashboard')
 
+        elif 'delete_notifications' in request.POST:
+            deleted = delete_notifications(instructor, notification_ids(request))
+            messages.success(request, f'{deleted} notifications deleted.')
+            return redirect('instructor_dashboard')
+
         elif 'mark_attendance' in request.POST:
             attendance_form = AttendanceForm(request.POST, instructor=instructor)
             if attendance_form.is_valid():
@@ -446,39 +467,48 @@ def instructor_dashboard(request):
                 status = attendance_form.cleaned_data['status']
                 students = attendance_form.cleaned_data['students']
 
-                for student in students:
-                    Attendance.objects.create(
-                        student=student,
-                        course=course,
-                        schedule=schedule,
-                        date=date,
-                        status=status
-                    )
+                record_attendance(course, schedule, date, {student.id: status for student in students})
 
                 messages.success(request, 'Attendance marked successfully!')
                 return redirect('instructor_dashboard')
             else:
                 messages.error(request, 'Error in marking attendance.')
 
+        elif 'mark_attendance_sheet' in request.POST:
+            attendance_sheet_form = AttendanceSheetForm(request.POST, request.FILES, instructor=instructor)
+            if attendance_sheet_form.is_valid():
+                marked = record_attendance(
+                    attendance_sheet_form.cleaned_data['course'],
+                    attendance_sheet_form.cleaned_data['schedule'],
+                    attendance_sheet_form.cleaned_data['date'],
+                    attendance_sheet_form.cleaned_data['statuses'],
+                )
+                messages.success(request, f'Attendance saved for {marked} students.')
+                return redirect('instructor_dashboard')
+            else:
+                messages.error(request, 'Error in marking attendance.')
+
     context = {
         'instructor': instructor,
-        'enrollments': enrollments,
         'courses': courses,
         'assignments': assignments,
         'announcements': announcements,
-        'sent_emails': sent_emails,
         'schedules': schedules,
-        'notifications': notifications,
-        'grades': grades,
-        'assignment_submissions': assignment_submissions,
         'announcement_form': announcement_form,
         'assignment_form': assignment_form,
         'email_form': email_form,
         'grade_form': grade_form,
         'attendance_form': attendance_form,
-        'attendance_records': attendance_records,
+        'attendance_sheet_form': attendance_sheet_form,
         'students': students,
+        'course_attendance': course_attendance_rates(courses),
+        'at_risk_students': at_risk_students(courses),
+        'recent_sessions': recent_sessions(courses),
+        'unread_notifications': unread_count(instructor),
     }
+    # Only the first page of each growing section; the rest comes from instructor_dashboard_section.
+    for context_name, ordering, queryset in INSTRUCTOR_SECTIONS.values():
+        context[context_name], context[f'{context_name}_next'] = keyset_page(queryset(instructor), ordering)
 
     return render(request, 'pro/instructor_dashboard.html', context)
 
@@ -487,3 +517,196 @@ def instructor_dashboard(request):
 
 
 
+
+
+
+@login_required(login_url='/')
+def instructor_dashboard_section(request, section):
+    if section not in INSTRUCTOR_SECTIONS:
+        raise Http404("Unknown dashboard section.")
+    instructor = get_instructor_for(request)
+    context_name, ordering, queryset = INSTRUCTOR_SECTIONS[section]
+    try:
+        rows, next_cursor = keyset_page(queryset(instructor), ordering, request.GET.get('after'))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor.")
+
+    return render(request, f'pro/instructor_sections/{section}.html', {
+        'section': section,
+        'rows': rows,
+        'next_cursor': next_cursor,
+    })
+
+
+#########################################################################################################
+                                        #DOWNLOADS#
+#########################################################################################################
+
+@login_required(login_url='/')
+def download_submission(request, submission_id):
+    submission = get_object_or_404(
+        AssignmentSubmission.objects.select_related('student', 'assignment__course'), pk=submission_id,
+    )
+    if not can_download_submission(request, submission):
+        raise Http404("No such submission.")
+    extension = os.path.splitext(submission.submission_file.name)[1]
+    filename = get_valid_filename(f"{submission.student.student_id}_{submission.assignment.title}{extension}")
+    return serve_file(request, submission.submission_file.storage, submission.submission_file.name, filename)
+
+
+@login_required(login_url='/')
+def download_reference_document(request, assignment_id):
+    assignment = get_object_or_404(Assignment.objects.select_related('course'), pk=assignment_id)
+    if not assignment.reference_document or not can_download_reference(request, assignment):
+        raise Http404("No such document.")
+    extension = os.path.splitext(assignment.reference_document.name)[1]
+    filename = get_valid_filename(f"{assignment.title}{extension}")
+    return serve_file(request, assignment.reference_document.storage, assignment.reference_document.name, filename)
+
+
+@login_required(login_url='/')
+def download_assignment_submissions(request, assignment_id):
+    assignment = get_object_or_404(Assignment.objects.select_related('course'), pk=assignment_id)
+    role, profile_id = session_role(request)
+    if not request.user.is_staff and not (role == INSTRUCTOR and assignment.course.instructor_id == profile_id):
+        raise Http404("No such assignment.")
+    storage = AssignmentSubmission._meta.get_field('submission_file').storage
+    response = StreamingHttpResponse(stream_submission_archive(assignment, storage), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, get_valid_filename(f"{assignment.title}_submissions.zip"))
+    return response
+
+
+#########################################################################################################
+                                        #EXPORTS#
+#########################################################################################################
+
+@staff_member_required
+def export_csv(request, dataset):
+    """Stream grades, attendance, payments or enrollments as CSV, filtered by course, faculty and date range."""
+    if dataset not in EXPORTS:
+        raise Http404("Unknown export.")
+    form = ExportFilterForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    try:
+        rows = export_queryset(
+            dataset,
+            course_id=form.cleaned_data['course'],
+            faculty=form.cleaned_data['faculty'],
+            start=form.cleaned_data['start'],
+            end=form.cleaned_data['end'],
+        )
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    response = StreamingHttpResponse(stream_csv(dataset, rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = content_disposition_header(True, f"{dataset}-{timezone.localdate():%Y%m%d}.csv")
+    return response
+
+
+#########################################################################################################
+                                        #COURSE CATALOG#
+#########################################################################################################
+
+@login_required(login_url='/')
+def course_catalog(request):
+    """
+    A page of the course catalog as JSON, filtered by faculty, instructor department, credit hours,
+    a free slot of the week and (for students) whether the course fits their timetable. Students do
+    not see courses they already take, and each course says whether it clashes with their timetable.
+    """
+    form = CatalogFilterForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    busy, enrolled = 0, ()
+    role, profile_id = session_role(request)
+    if role == STUDENT:
+        snapshot = get_student_snapshot(profile_id)
+        busy, enrolled = snapshot['busy_bitmap'], [course.id for course in snapshot['courses']]
+    try:
+        courses, next_cursor, facets = catalog_page(
+            form.cleaned_data, form.cleaned_data['after'], busy=busy, exclude_ids=enrolled,
+        )
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor.")
+    return JsonResponse({'courses': courses, 'next': next_cursor, 'facets': facets})
+
+
+#########################################################################################################
+                                        #NOTIFICATIONS#
+#########################################################################################################
+
+def notification_ids(request):
+    """The notification ids posted as `notification_ids` for a bulk action; anything not a number is dropped."""
+    return [int(value) for value in request.POST.getlist('notification_ids') if value.isdigit()]
+
+
+@login_required(login_url='/')
+def notification_badge(request):
+    """The unread count for the signed-in student or instructor, from its counter row."""
+    role, profile_id = session_role(request)
+    if role not in (STUDENT, INSTRUCTOR):
+        raise Http404("No profile for this account.")
+    owner = 'student' if role == STUDENT else 'instructor'
+    return JsonResponse({'unread': NotificationCounter.objects.unread(owner, profile_id)})
+
+
+#########################################################################################################
+                                        #SEARCH#
+#########################################################################################################
+
+@login_required(login_url='/')
+def search(request):
+    """
+    Ranked prefix search over what the user may see: students search courses, instructors,
+    announcements of their instructors and their own messages; instructors also their students.
+    `?kind=` narrows the search to one index.
+    """
+    query = request.GET.get('q', '')
+    role, profile_id = session_role(request)
+    scopes = search_scopes(role, profile_id, is_staff=request.user.is_staff)
+    kind = request.GET.get('kind')
+    if kind:
+        if kind not in scopes:
+            raise Http404("Unknown search kind.")
+        scopes = {kind: scopes[kind]}
+    return JsonResponse({'query': query, 'results': search_results(scopes, query)})
+
+
+#########################################################################################################
+                                        #TIMETABLE FEEDS#
+#########################################################################################################
+
+TIMETABLE_FORMATS = {
+    'json': 'application/json',
+    'ics': 'text/calendar; charset=utf-8',
+}
+
+
+def timetable_feed(request, token, fmt):
+    """A student's weekly timetable as JSON or iCalendar; the signed token in the URL is the credential."""
+    student_id = student_for_token(token)
+    if student_id is None or fmt not in TIMETABLE_FORMATS:
+        raise Http404("No such timetable.")
+    version, entry = timetable_bodies(student_id)
+    if entry is None:
+        raise Http404("No such timetable.")
+    etag = f'"{student_id}-{version}"'
+    response = get_conditional_response(request, etag=etag, last_modified=entry['last_modified'])
+    if response is None:
+        response = HttpResponse(entry[fmt], content_type=TIMETABLE_FORMATS[fmt])
+        if fmt == 'ics':
+            response['Content-Disposition'] = content_disposition_header(False, 'timetable.ics')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+#########################################################################################################
+                                        #METRICS#
+#########################################################################################################
+
+@staff_member_required
+def request_metrics(request):
+    """Per-URL request timing percentiles from RequestMetricsMiddleware, in Prometheus text format."""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')